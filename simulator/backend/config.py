@@ -4,6 +4,9 @@ Configuration settings for the Supply Chain Simulator backend.
 
 import os
 from typing import List
+from .suppliers import (
+    DEFAULT_SUPPLIER_LEAD_TIME, SUPPLIER_LEAD_TIMES, SUPPLIER_URL_PATTERNS, SupplierResolver, supplier_resolver
+)
 try:
     from pydantic_settings import BaseSettings
 except ImportError:
@@ -41,43 +44,22 @@ class Settings(BaseSettings):
         return self.allowed_origins if isinstance(self.allowed_origins, list) else []
     
     # Supplier Configuration
-    default_lead_time: int = 7
+    default_lead_time: int = DEFAULT_SUPPLIER_LEAD_TIME
     
-    # Supplier lead time estimates (in days)
-    supplier_lead_times: dict = {
-        'digi-key': 3, 'digikey': 3, 'mouser': 5, 'jlcpcb': 7, 'pcbway': 7,
-        'oshpark': 10, 'adafruit': 5, 'sparkfun': 5, 'arrow': 7, 'avnet': 7,
-        'newark': 5, 'farnell': 5, 'element14': 5, 'rs-components': 5, 'allied': 5,
-        'mcmaster': 2, 'mcmaster-carr': 2, 'stockwell': 7, 'essentra': 5, 'richco': 7,
-        'hammond': 10, 'te connectivity': 7, 'microchip': 14, 'vishay': 10,
-        'samsung': 14, 'lite-on': 10, 'rutronik': 7
-    }
+    @property
+    def supplier_lead_times(self) -> dict:
+        """Supplier lead time estimates (in days), shared with the helpers."""
+        return SUPPLIER_LEAD_TIMES
+    
+    @property
+    def supplier_url_patterns(self) -> dict:
+        """Supplier URL patterns, shared with the helpers."""
+        return SUPPLIER_URL_PATTERNS
     
-    # Supplier URL patterns
-    supplier_url_patterns: dict = {
-        'tme': lambda manufacturer, part_number: f"https://www.tme.com/en/katalog/?search={part_number}",
-        'digi-key': lambda manufacturer, part_number: f"https://www.digikey.com/en/products/search?keywords={part_number}",
-        'digikey': lambda manufacturer, part_number: f"https://www.digikey.com/en/products/search?keywords={part_number}",
-        'mouser': lambda manufacturer, part_number: f"https://www.mouser.com/c/?q={part_number}",
-        'arrow': lambda manufacturer, part_number: f"https://www.arrow.com/en/products/search?q={part_number}",
-        'avnet': lambda manufacturer, part_number: f"https://www.avnet.com/shop/us/search/{part_number}",
-        'newark': lambda manufacturer, part_number: f"https://www.newark.com/search?st={part_number}",
-        'farnell': lambda manufacturer, part_number: f"https://uk.farnell.com/search?st={part_number}",
-        'rs': lambda manufacturer, part_number: f"https://uk.rs-online.com/web/c/search?searchTerm={part_number}",
-        'rs-components': lambda manufacturer, part_number: f"https://uk.rs-online.com/web/c/search?searchTerm={part_number}",
-        'allied': lambda manufacturer, part_number: f"https://www.alliedelec.com/search?keywords={part_number}",
-        'mcmaster': lambda manufacturer, part_number: f"https://www.mcmaster.com/search?query={part_number}",
-        'mcmaster-carr': lambda manufacturer, part_number: f"https://www.mcmaster.com/search?query={part_number}",
-        'element14': lambda manufacturer, part_number: f"https://www.element14.com/community/search?q={part_number}",
-        'future': lambda manufacturer, part_number: f"https://www.futureelectronics.com/search?text={part_number}",
-        'verical': lambda manufacturer, part_number: f"https://www.verical.com/search?q={part_number}",
-        'quest': lambda manufacturer, part_number: f"https://www.questcomp.com/search?query={part_number}",
-        'utmel': lambda manufacturer, part_number: f"https://www.utmel.com/search?keyword={part_number}",
-        'lcsc': lambda manufacturer, part_number: f"https://www.lcsc.com/search?q={part_number}",
-        'chip1stop': lambda manufacturer, part_number: f"https://www.chip1stop.com/search?keyword={part_number}",
-        'onlinecomponents': lambda manufacturer, part_number: f"https://www.onlinecomponents.com/search?keyword={part_number}",
-        'rutronik': lambda manufacturer, part_number: f"https://www.rutronik.com/search/?q={part_number}"
-    }
+    @property
+    def supplier_resolver(self) -> SupplierResolver:
+        """Memoized supplier-name lookup over both tables."""
+        return supplier_resolver
     
     class Config:
         env_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), "ChatGPT.API.env")
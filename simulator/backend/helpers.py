@@ -1,28 +1,60 @@
 import os
 import csv
+import re
 import json
 import requests
 import time
+import asyncio
+import random
 import smtplib
+import threading
+import httpx
+import numpy as np
+import hashlib
+import uuid
+import sqlite3
+import contextvars
+import functools
+import weakref
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
 from markdown import markdown
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Callable
 
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '../ChatGPT.API.env'))
 
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 OPENAI_API_URL = 'https://api.openai.com/v1/chat/completions'
 
+# Connection pool sizing for LLM API calls (shared by all endpoints)
+LLM_POOL_CONNECTIONS = int(os.getenv('LLM_POOL_CONNECTIONS', '4'))
+LLM_POOL_MAXSIZE = int(os.getenv('LLM_POOL_MAXSIZE', '32'))
+
+# httpx-based clients negotiate HTTP/2 when the optional 'h2' package is installed
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+def _llm_httpx_limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=LLM_POOL_MAXSIZE, max_keepalive_connections=LLM_POOL_MAXSIZE)
+
 # Anthropic Claude API Configuration
 try:
-    from anthropic import Anthropic
+    from anthropic import Anthropic, AsyncAnthropic
     ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
     # Only initialize if we have a real API key (not placeholder)
     if ANTHROPIC_API_KEY and ANTHROPIC_API_KEY.strip() and 'your_anthropic_api_key_here' not in ANTHROPIC_API_KEY:
         try:
-            anthropic_client = Anthropic(api_key=ANTHROPIC_API_KEY)
+            # The Anthropic SDK is built on httpx, so give it a pooled keep-alive client
+            anthropic_http_client = httpx.Client(http2=HTTP2_AVAILABLE, limits=_llm_httpx_limits())
+            anthropic_client = Anthropic(api_key=ANTHROPIC_API_KEY, http_client=anthropic_http_client)
         except Exception as e:
             print(f"Warning: Failed to initialize Anthropic client: {e}")
             anthropic_client = None
@@ -30,6 +62,7 @@ try:
         anthropic_client = None
 except ImportError:
     ANTHROPIC_API_KEY = None
+    AsyncAnthropic = None
     anthropic_client = None
     print("Warning: anthropic package not installed. Claude models will not be available.")
 
@@ -42,6 +75,8 @@ MODEL_CONFIGS = {
         'max_retries': 3,  # Increased from 2 to 3 retries
         'token_param': 'max_completion_tokens',
         'token_multiplier': 2.0,  # GPT-5 needs 2x tokens (reasoning + output)
+        'failover_mode': 'comprehensive-claude',  # used on 429/5xx and for hedged requests
+        'rate_limits': {'rpm': 500, 'tpm': 450000, 'concurrency': 8},  # see LLM_RATE_LIMIT_<MODE>
         'description': 'GPT-5 - Deep reasoning and comprehensive analysis'
     },
     'comprehensive-claude': {
@@ -51,6 +86,8 @@ MODEL_CONFIGS = {
         'max_retries': 2,
         'token_param': 'max_tokens',
         'token_multiplier': 1.0,
+        'failover_mode': 'comprehensive',
+        'rate_limits': {'rpm': 50, 'tpm': 40000, 'concurrency': 4},
         'description': 'Claude 3.5 Sonnet - Deep reasoning and comprehensive analysis'
     },
     'fast': {
@@ -60,6 +97,7 @@ MODEL_CONFIGS = {
         'max_retries': 3,
         'token_param': 'max_tokens',
         'token_multiplier': 1.0,  # GPT-4 uses tokens directly
+        'rate_limits': {'rpm': 500, 'tpm': 200000, 'concurrency': 16},
         'description': 'GPT-4o-mini - Quick responses'
     }
 }
@@ -76,41 +114,1496 @@ if not OPENAI_API_KEY:
     print("Warning: OPENAI_API_KEY not found in environment variables.")
     # Don't raise an error, let the application continue and handle it gracefully
 
-# --- Supplier Data ---
-SUPPLIER_LEAD_TIMES = {
-    'tme': 5,
-    'digi-key': 3, 'digikey': 3, 'mouser': 5, 'jlcpcb': 7, 'pcbway': 7,
-    'oshpark': 10, 'adafruit': 5, 'sparkfun': 5, 'arrow': 7, 'avnet': 7,
-    'newark': 5, 'farnell': 5, 'element14': 5, 'rs-components': 5, 'allied': 5,
-    'mcmaster': 2, 'mcmaster-carr': 2, 'stockwell': 7, 'essentra': 5, 'richco': 7,
-    'hammond': 10, 'te connectivity': 7, 'microchip': 14, 'vishay': 10,
-    'samsung': 14, 'lite-on': 10, 'rutronik': 7
+# --- Pooled LLM HTTP Session ---
+# A single keep-alive session is shared by every OpenAI call (and supplier page check) so
+# repeated requests reuse open TCP/TLS connections instead of paying a new handshake each time.
+# requests.Session with a mounted HTTPAdapter is safe to share across worker threads.
+_llm_session: Optional[requests.Session] = None
+_llm_session_lock = threading.Lock()
+
+def get_llm_session() -> requests.Session:
+    """Return the shared, pooled HTTP session used for LLM API calls (created on first use)."""
+    global _llm_session
+    if _llm_session is None:
+        with _llm_session_lock:
+            if _llm_session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=LLM_POOL_CONNECTIONS, pool_maxsize=LLM_POOL_MAXSIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _llm_session = session
+    return _llm_session
+
+def close_llm_session() -> None:
+    """Close pooled LLM connections (called on application shutdown)."""
+    global _llm_session
+    with _llm_session_lock:
+        if _llm_session is not None:
+            _llm_session.close()
+            _llm_session = None
+
+# --- LLM Response Cache ---
+# Identical prompts (same mode, model, prompt text and token budget) are answered from
+# cache. The in-memory tier is an LRU capped at LLM_CACHE_MAX_ENTRIES; setting
+# LLM_CACHE_DB_PATH adds an on-disk SQLite tier that survives restarts.
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '512'))
+LLM_CACHE_DB_PATH = os.getenv('LLM_CACHE_DB_PATH', '')
+LLM_CACHE_DB_MAX_ENTRIES = int(os.getenv('LLM_CACHE_DB_MAX_ENTRIES', '5000'))
+
+# Per-endpoint TTLs in seconds (0 disables caching). Override with LLM_CACHE_TTL_<ENDPOINT>.
+_DEFAULT_LLM_CACHE_TTLS = {
+    'find_supplier': 24 * 3600,
+    'component_info': 7 * 24 * 3600,
+    'evaluate_suppliers': 6 * 3600,
+    'ai_action': 3600,
+    'disruption_analysis': 1800,
+    'disruption_explain': 3600,
+    'article_validation': 3600,
+    'mitigation_plan': 3600,
+    'scenario_probability': 1800,
 }
+LLM_CACHE_TTLS = {
+    endpoint: int(os.getenv(f'LLM_CACHE_TTL_{endpoint.upper()}', str(ttl)))
+    for endpoint, ttl in _DEFAULT_LLM_CACHE_TTLS.items()
+}
+
+class SQLiteTTLStore:
+    """Small thread-safe key/value table in SQLite with per-entry expiry times.
+
+    The database file (and its directory) is only created on first use, not at import.
+    """
+
+    def __init__(self, path: str, table: str, max_entries: int = 0):
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # Callers hold self._lock
+        if self._db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            with conn:
+                conn.execute(
+                    f'CREATE TABLE IF NOT EXISTS {self.table} ('
+                    'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                    'created_at REAL NOT NULL, expires_at REAL NOT NULL)'
+                )
+            self._db = conn
+        return self._db
+
+    def get_entry(self, key: str) -> Optional[tuple]:
+        """Return (value, expires_at) for a live entry, or None if missing or expired."""
+        with self._lock:
+            row = self._conn.execute(
+                f'SELECT value, expires_at FROM {self.table} WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= time.time():
+                with self._conn:
+                    self._conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+                return None
+            return row[0], row[1]
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the stored value, or None if missing or expired."""
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        """Store a value that expires ttl seconds from now, pruning the oldest rows past max_entries."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                f'INSERT OR REPLACE INTO {self.table} (key, value, created_at, expires_at) VALUES (?, ?, ?, ?)',
+                (key, value, now, now + ttl)
+            )
+            if self.max_entries:
+                self._conn.execute(f'DELETE FROM {self.table} WHERE expires_at <= ?', (now,))
+                self._conn.execute(
+                    f'DELETE FROM {self.table} WHERE key IN ('
+                    f'SELECT key FROM {self.table} ORDER BY created_at DESC LIMIT -1 OFFSET ?)',
+                    (self.max_entries,)
+                )
+
+    def delete(self, key: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+
+class LLMResponseCache:
+    """Content-addressed cache of LLM responses with an LRU memory tier and optional SQLite tier."""
+
+    def __init__(self, max_entries: int, db_path: str = '', db_max_entries: int = 0):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk: Optional[SQLiteTTLStore] = None
+        if db_path:
+            try:
+                self._disk = SQLiteTTLStore(db_path, 'llm_responses', db_max_entries)
+            except Exception as e:
+                print(f"Warning: LLM cache database unavailable ({db_path}): {e}")
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        self.endpoint_stats: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def make_key(mode: str, model: str, prompt: str, max_tokens: int) -> str:
+        payload = json.dumps([mode, model, prompt, max_tokens], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _count(self, endpoint: Optional[str], outcome: str) -> None:
+        self.stats[outcome] += 1
+        counters = self.endpoint_stats.setdefault(endpoint or 'unknown', {'hits': 0, 'misses': 0})
+        counters['misses' if outcome == 'misses' else 'hits'] += 1
+
+    def get(self, key: str, endpoint: Optional[str] = None) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._count(endpoint, 'memory_hits')
+                    return value
+                del self._entries[key]
+        if self._disk is not None:
+            try:
+                disk_entry = self._disk.get_entry(key)
+            except Exception as e:
+                print(f"LLM cache disk read failed: {e}")
+                disk_entry = None
+            if disk_entry is not None:
+                value, expires_at = disk_entry
+                with self._lock:
+                    # Promote to the memory tier for the rest of its lifetime
+                    self._store_memory(key, value, expires_at)
+                    self._count(endpoint, 'disk_hits')
+                return value
+        with self._lock:
+            self._count(endpoint, 'misses')
+        return None
+
+    def _store_memory(self, key: str, value: str, expires_at: float) -> None:
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        if ttl <= 0 or not value:
+            return
+        with self._lock:
+            self._store_memory(key, value, time.time() + ttl)
+            self.stats['stores'] += 1
+        if self._disk is not None:
+            try:
+                self._disk.set(key, value, ttl)
+            except Exception as e:
+                print(f"LLM cache disk write failed: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats['memory_hits'] + self.stats['disk_hits'] + self.stats['misses']
+            hits = self.stats['memory_hits'] + self.stats['disk_hits']
+            return {
+                **self.stats,
+                'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+                'memory_entries': len(self._entries),
+                'memory_capacity': self.max_entries,
+                'disk_enabled': self._disk is not None,
+                'endpoints': {name: dict(counts) for name, counts in self.endpoint_stats.items()},
+                'ttls': dict(LLM_CACHE_TTLS)
+            }
+
+llm_response_cache = LLMResponseCache(LLM_CACHE_MAX_ENTRIES, LLM_CACHE_DB_PATH, LLM_CACHE_DB_MAX_ENTRIES)
+
+def get_llm_cache_stats() -> Dict[str, Any]:
+    """Return hit/miss counters and sizing for the LLM response cache."""
+    return llm_response_cache.snapshot()
+
+# --- Request Tracing ---
+# Each API request gets a trace: a request ID plus timed spans for the helper stages it runs
+# (news searches, stages, supplier checks, model calls), nested through context variables.
+# Finished traces are kept in memory for /api/traces and, if TRACE_EXPORT_PATH is set,
+# appended to that file as OpenTelemetry (OTLP/JSON) payloads, one request per line.
+TRACE_ENABLED = os.getenv('TRACE_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+TRACE_BUFFER_SIZE = int(os.getenv('TRACE_BUFFER_SIZE', '200'))
+TRACE_EXPORT_PATH = os.getenv('TRACE_EXPORT_PATH', '')
+TRACE_SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'supply-chain-simulator')
+
+class TraceSpan:
+    """One timed operation within a request trace."""
+    
+    __slots__ = ('trace', 'name', 'span_id', 'parent_id', 'start_ns', 'end_ns', 'attributes', 'status', 'error')
+    
+    def __init__(self, trace: Optional['RequestTrace'], name: str, parent: Optional['TraceSpan'], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = dict(attributes)
+        self.status = 'ok'
+        self.error: Optional[str] = None
+    
+    def set(self, **attributes) -> 'TraceSpan':
+        """Add attributes such as byte or token counts; None values are skipped."""
+        self.attributes.update((key, value) for key, value in attributes.items() if value is not None)
+        return self
+    
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            'traceId': self.trace.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': 1,  # SPAN_KIND_INTERNAL
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns or time.time_ns()),
+            'attributes': [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            'status': {'code': 2, 'message': self.error or ''} if self.status == 'error' else {'code': 1},
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+class _NullSpan:
+    """Stands in for a span when no trace is active, so call sites need no checks."""
+    
+    def set(self, **attributes) -> '_NullSpan':
+        return self
+
+_NULL_SPAN = _NullSpan()
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {'boolValue': value}
+    elif isinstance(value, int):
+        typed = {'intValue': str(value)}
+    elif isinstance(value, float):
+        typed = {'doubleValue': value}
+    else:
+        typed = {'stringValue': str(value)}
+    return {'key': key, 'value': typed}
+
+class RequestTrace:
+    """All spans recorded while handling one request."""
+    
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.trace_id = os.urandom(16).hex()
+        self.started_at = time.time()
+        self.spans: List[TraceSpan] = []
+        self._lock = threading.Lock()
+    
+    def add(self, span: TraceSpan) -> None:
+        with self._lock:
+            self.spans.append(span)
+    
+    def to_otlp(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = [span.to_otlp() for span in self.spans]
+        return {'resourceSpans': [{
+            'resource': {'attributes': [_otlp_attribute('service.name', TRACE_SERVICE_NAME)]},
+            'scopeSpans': [{'scope': {'name': 'backend.helpers'}, 'spans': spans}],
+        }]}
+    
+    def summary(self) -> Dict[str, Any]:
+        """Flat, human-readable view: offsets and durations in milliseconds."""
+        with self._lock:
+            spans = list(self.spans)
+        origin = min((span.start_ns for span in spans), default=0)
+        names = {span.span_id: span.name for span in spans}
+        root = next((span for span in spans if span.parent_id is None), None)
+        return {
+            'request_id': self.request_id,
+            'trace_id': self.trace_id,
+            'name': root.name if root else None,
+            'duration_ms': round(((root.end_ns or time.time_ns()) - root.start_ns) / 1e6, 1) if root else None,
+            'spans': [{
+                'name': span.name,
+                'parent': names.get(span.parent_id),
+                'start_ms': round((span.start_ns - origin) / 1e6, 1),
+                'duration_ms': round(((span.end_ns or time.time_ns()) - span.start_ns) / 1e6, 1),
+                'status': span.status,
+                'error': span.error,
+                'attributes': {key: value for key, value in span.attributes.items() if key != 'request.id'},
+            } for span in sorted(spans, key=lambda span: span.start_ns)],
+        }
+
+class TraceStore:
+    """Recently finished traces, with optional append-only export to a JSON-lines file."""
+    
+    def __init__(self, size: int = TRACE_BUFFER_SIZE, export_path: str = TRACE_EXPORT_PATH):
+        self.size = size
+        self.export_path = export_path
+        self._traces: "OrderedDict[str, RequestTrace]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+    
+    def add(self, trace: RequestTrace) -> None:
+        with self._lock:
+            self._traces[trace.request_id] = trace
+            self._traces.move_to_end(trace.request_id)
+            while len(self._traces) > self.size:
+                self._traces.popitem(last=False)
+        if self.export_path:
+            try:
+                line = json.dumps(trace.to_otlp())
+                with self._export_lock:
+                    directory = os.path.dirname(os.path.abspath(self.export_path))
+                    os.makedirs(directory, exist_ok=True)
+                    with open(self.export_path, 'a', encoding='utf-8') as f:
+                        f.write(line + '\n')
+            except Exception as e:
+                print(f"Warning: could not export trace {trace.request_id}: {e}")
+    
+    def get(self, request_id: str) -> Optional[RequestTrace]:
+        with self._lock:
+            return self._traces.get(request_id)
+    
+    def recent(self, limit: int = 20) -> List[RequestTrace]:
+        with self._lock:
+            return list(self._traces.values())[-limit:][::-1]
+
+trace_store = TraceStore()
+_current_trace: contextvars.ContextVar = contextvars.ContextVar('current_trace', default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar('current_span', default=None)
+
+def current_request_id() -> Optional[str]:
+    """Request ID of the trace active in this thread/task, if any."""
+    trace = _current_trace.get()
+    return trace.request_id if trace is not None else None
+
+def current_span() -> Any:
+    """The innermost active span (a null span outside a trace), for adding attributes."""
+    return _current_span.get() or _NULL_SPAN
+
+@contextmanager
+def trace_span(name: str, bind: bool = True, **attributes):
+    """
+    Time a block as a child of the current span. ``bind=False`` records the span without
+    making it the parent of spans opened inside the block; async generators use it because
+    they may resume in a different context.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield _NULL_SPAN
+        return
+    span = TraceSpan(trace, name, _current_span.get(), attributes)
+    span.attributes['request.id'] = trace.request_id
+    trace.add(span)
+    token = _current_span.set(span) if bind else None
+    try:
+        yield span
+    except BaseException as e:
+        span.status = 'error'
+        span.error = f"{type(e).__name__}: {e}"[:300]
+        raise
+    finally:
+        if token is not None:
+            _current_span.reset(token)
+        span.end_ns = time.time_ns()
+
+@contextmanager
+def request_trace(request_id: str, name: str, **attributes):
+    """Start a trace for one request; yields the root span (or a null span when tracing is off)."""
+    if not TRACE_ENABLED:
+        yield _NULL_SPAN
+        return
+    trace = RequestTrace(request_id)
+    token = _current_trace.set(trace)
+    try:
+        with trace_span(name, **attributes) as root:
+            yield root
+    finally:
+        _current_trace.reset(token)
+        trace_store.add(trace)
+
+def traced(name: Optional[str] = None):
+    """Decorator that wraps every call of a sync or async function in a span."""
+    def decorator(fn):
+        span_name = name or fn.__name__
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with trace_span(span_name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+        
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with trace_span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def submit_in_context(executor: ThreadPoolExecutor, fn: Callable, *args):
+    """executor.submit that carries the caller's context (trace, request ID) into the worker."""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+# --- LLM Call Metrics ---
+# Every model call records endpoint, mode, model, token usage, latency, retries and whether it
+# was a cache hit. Cumulative counters back the Prometheus /metrics endpoint; the last
+# LLM_METRICS_WINDOW calls back the JSON summary. Token counts come from the provider's usage
+# report, or are estimated from text length when the provider did not send one.
+LLM_METRICS_WINDOW = int(os.getenv('LLM_METRICS_WINDOW', '1000'))
+LLM_LATENCY_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+class LLMCallRecord:
+    """Measurements for one make_openai_request / stream_model_response_async call."""
+    
+    __slots__ = ('request_id', 'endpoint', 'mode', 'model', 'provider', 'streamed', 'started_at', 'latency',
+                 'prompt_chars', 'completion_chars', 'prompt_tokens', 'completion_tokens', 'tokens_estimated',
+                 'attempts', 'cache_hit', 'route', 'outcome', 'error')
+    
+    def __init__(self, endpoint: Optional[str], mode: str, prompt: str, streamed: bool = False):
+        config = MODEL_CONFIGS.get(mode, {})
+        self.request_id = current_request_id()
+        self.endpoint = endpoint or 'unknown'
+        self.mode = mode
+        self.model = config.get('model', 'unknown')
+        self.provider = config.get('provider', 'openai')
+        self.streamed = streamed
+        self.started_at = time.time()
+        self.latency = 0.0
+        self.prompt_chars = len(prompt or '')
+        self.completion_chars = 0
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        self.tokens_estimated = False
+        self.attempts = 0
+        self.cache_hit = False
+        self.route = 'primary'  # 'failover' or 'hedge' when the failover mode answered
+        self.outcome = 'ok'
+        self.error: Optional[str] = None
+    
+    @property
+    def retries(self) -> int:
+        return max(self.attempts - 1, 0)
+    
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'request_id': self.request_id, 'endpoint': self.endpoint, 'mode': self.mode,
+            'model': self.model, 'provider': self.provider,
+            'streamed': self.streamed,
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started_at)),
+            'latency_ms': round(self.latency * 1000, 1), 'prompt_chars': self.prompt_chars,
+            'prompt_tokens': self.prompt_tokens, 'completion_tokens': self.completion_tokens,
+            'tokens_estimated': self.tokens_estimated, 'retries': self.retries,
+            'cache_hit': self.cache_hit, 'route': self.route, 'outcome': self.outcome, 'error': self.error,
+        }
+
+# The call being measured in the current thread/task; provider functions report into it
+_active_llm_call: contextvars.ContextVar = contextvars.ContextVar('active_llm_call', default=None)
+
+def _note_llm_attempt(call: Optional[LLMCallRecord] = None) -> None:
+    call = call or _active_llm_call.get()
+    if call is not None:
+        call.attempts += 1
+
+def _note_llm_usage(prompt_tokens: Optional[int], completion_tokens: Optional[int],
+                    call: Optional[LLMCallRecord] = None) -> None:
+    call = call or _active_llm_call.get()
+    if call is not None:
+        call.prompt_tokens = prompt_tokens
+        call.completion_tokens = completion_tokens
+
+class LLMMetrics:
+    """Cumulative Prometheus-style counters plus a rolling window of recent calls."""
+    
+    def __init__(self, window: int = LLM_METRICS_WINDOW):
+        self._recent: "deque[LLMCallRecord]" = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._calls: Dict[tuple, int] = {}
+        self._prompt_tokens: Dict[tuple, int] = {}
+        self._completion_tokens: Dict[tuple, int] = {}
+        self._retries: Dict[tuple, int] = {}
+        self._latency: Dict[tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+    
+    @contextmanager
+    def track(self, endpoint: Optional[str], mode: str, prompt: str, streamed: bool = False):
+        """Measure one call. Sets the active call for provider functions unless streamed."""
+        call = LLMCallRecord(endpoint, mode, prompt, streamed)
+        token = None if streamed else _active_llm_call.set(call)
+        with trace_span(f"llm.{call.endpoint}", bind=not streamed) as span:
+            try:
+                yield call
+            except BaseException as e:
+                call.outcome = 'cancelled' if isinstance(e, (asyncio.CancelledError, GeneratorExit, RequestCancelled)) else 'error'
+                call.error = f"{type(e).__name__}: {e}"[:300]
+                raise
+            finally:
+                if token is not None:
+                    _active_llm_call.reset(token)
+                self.record(call)
+                span.set(**{
+                    'llm.mode': call.mode, 'llm.model': call.model, 'llm.streamed': call.streamed,
+                    'llm.cache_hit': call.cache_hit, 'llm.retries': call.retries, 'llm.route': call.route,
+                    'llm.prompt_chars': call.prompt_chars, 'llm.completion_chars': call.completion_chars,
+                    'llm.prompt_tokens': call.prompt_tokens, 'llm.completion_tokens': call.completion_tokens,
+                    'llm.tokens_estimated': call.tokens_estimated,
+                })
+    
+    def record(self, call: LLMCallRecord) -> None:
+        call.latency = time.time() - call.started_at
+        if not call.cache_hit and (call.prompt_tokens is None or call.completion_tokens is None):
+            # Same four-characters-per-token heuristic as estimate_prompt_tokens
+            if call.prompt_tokens is None:
+                call.prompt_tokens = (call.prompt_chars + 3) // 4
+            if call.completion_tokens is None:
+                call.completion_tokens = (call.completion_chars + 3) // 4
+            call.tokens_estimated = True
+        model_labels = (call.endpoint, call.mode, call.model)
+        call_labels = model_labels + (call.outcome, 'hit' if call.cache_hit else 'miss')
+        latency_labels = (call.endpoint, call.mode, 'hit' if call.cache_hit else 'miss')
+        with self._lock:
+            self._recent.append(call)
+            self._calls[call_labels] = self._calls.get(call_labels, 0) + 1
+            if not call.cache_hit:
+                self._prompt_tokens[model_labels] = self._prompt_tokens.get(model_labels, 0) + (call.prompt_tokens or 0)
+                self._completion_tokens[model_labels] = self._completion_tokens.get(model_labels, 0) + (call.completion_tokens or 0)
+                self._retries[model_labels] = self._retries.get(model_labels, 0) + call.retries
+            histogram = self._latency.setdefault(latency_labels, [0] * len(LLM_LATENCY_BUCKETS) + [0.0, 0])
+            for index, bound in enumerate(LLM_LATENCY_BUCKETS):
+                if call.latency <= bound:
+                    histogram[index] += 1
+            histogram[-2] += call.latency
+            histogram[-1] += 1
+    
+    def summary(self, recent: int = 0) -> Dict[str, Any]:
+        """Per-endpoint totals and latency percentiles over the rolling window."""
+        with self._lock:
+            calls = list(self._recent)
+        by_endpoint: Dict[str, Dict[str, Any]] = {}
+        for call in calls:
+            entry = by_endpoint.setdefault(call.endpoint, {
+                'calls': 0, 'cache_hits': 0, 'errors': 0, 'retries': 0, 'prompt_tokens': 0,
+                'completion_tokens': 0, 'estimated_calls': 0, 'modes': {}, 'routes': {}, '_latencies': []
+            })
+            entry['calls'] += 1
+            entry['modes'][call.mode] = entry['modes'].get(call.mode, 0) + 1
+            entry['routes'][call.route] = entry['routes'].get(call.route, 0) + 1
+            if call.outcome != 'ok':
+                entry['errors'] += 1
+            if call.cache_hit:
+                entry['cache_hits'] += 1
+                continue
+            entry['retries'] += call.retries
+            entry['prompt_tokens'] += call.prompt_tokens or 0
+            entry['completion_tokens'] += call.completion_tokens or 0
+            entry['estimated_calls'] += 1 if call.tokens_estimated else 0
+            entry['_latencies'].append(call.latency)
+        total_tokens = sum(e['prompt_tokens'] + e['completion_tokens'] for e in by_endpoint.values())
+        total_latency = sum(sum(e['_latencies']) for e in by_endpoint.values())
+        for entry in by_endpoint.values():
+            latencies = np.array(entry.pop('_latencies'))
+            model_calls = len(latencies)
+            entry['avg_prompt_tokens'] = round(entry['prompt_tokens'] / model_calls, 1) if model_calls else 0
+            entry['avg_completion_tokens'] = round(entry['completion_tokens'] / model_calls, 1) if model_calls else 0
+            entry['latency_ms'] = {
+                'p50': round(float(np.percentile(latencies, 50)) * 1000, 1),
+                'p95': round(float(np.percentile(latencies, 95)) * 1000, 1),
+                'max': round(float(latencies.max()) * 1000, 1),
+            } if model_calls else None
+            tokens = entry['prompt_tokens'] + entry['completion_tokens']
+            entry['token_share'] = round(tokens / total_tokens, 3) if total_tokens else 0.0
+            entry['latency_share'] = round(float(latencies.sum()) / total_latency, 3) if total_latency else 0.0
+        summary = {'window_calls': len(calls), 'window_size': self._recent.maxlen, 'endpoints': by_endpoint}
+        if recent:
+            summary['recent'] = [call.as_dict() for call in calls[-recent:]]
+        return summary
+    
+    def prometheus_text(self) -> str:
+        """Render the cumulative counters in the Prometheus text exposition format."""
+        def labels(names: tuple, values: tuple, extra: str = '') -> str:
+            pairs = [f'{name}="{_prometheus_label_value(value)}"' for name, value in zip(names, values)]
+            if extra:
+                pairs.append(extra)
+            return '{' + ','.join(pairs) + '}'
+        
+        model_names = ('endpoint', 'mode', 'model')
+        lines = []
+        with self._lock:
+            lines += ['# HELP llm_calls_total Model calls by endpoint, mode, model, outcome and cache result.',
+                      '# TYPE llm_calls_total counter']
+            lines += [f"llm_calls_total{labels(model_names + ('outcome', 'cache'), key)} {value}"
+                      for key, value in sorted(self._calls.items())]
+            for name, series, help_text in (
+                ('llm_prompt_tokens_total', self._prompt_tokens, 'Prompt (input) tokens sent to the model.'),
+                ('llm_completion_tokens_total', self._completion_tokens, 'Completion (output) tokens returned by the model.'),
+                ('llm_retries_total', self._retries, 'Retried provider attempts.'),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                lines += [f"{name}{labels(model_names, key)} {value}" for key, value in sorted(series.items())]
+            lines += ['# HELP llm_call_latency_seconds Wall-clock time per model call, including retries.',
+                      '# TYPE llm_call_latency_seconds histogram']
+            for key, histogram in sorted(self._latency.items()):
+                names = ('endpoint', 'mode', 'cache')
+                for bound, count in zip(LLM_LATENCY_BUCKETS, histogram):
+                    bucket_labels = labels(names, key, f'le="{bound}"')
+                    lines.append(f"llm_call_latency_seconds_bucket{bucket_labels} {count}")
+                bucket_labels = labels(names, key, 'le="+Inf"')
+                lines.append(f"llm_call_latency_seconds_bucket{bucket_labels} {histogram[-1]}")
+                lines.append(f"llm_call_latency_seconds_sum{labels(names, key)} {histogram[-2]:.6f}")
+                lines.append(f"llm_call_latency_seconds_count{labels(names, key)} {histogram[-1]}")
+        return '\n'.join(lines) + '\n'
+
+def _prometheus_label_value(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+llm_metrics = LLMMetrics(LLM_METRICS_WINDOW)
+
+# --- Model Rate Governor ---
+# One process-wide governor per provider/model keeps model calls within their requests per
+# minute (RPM), tokens per minute (TPM) and concurrency limits. Limits come from the mode's
+# 'rate_limits' in MODEL_CONFIGS, or from LLM_RATE_LIMIT_<MODE>=rpm/tpm/concurrency (0 disables
+# a limit). Calls over the limit wait in FIFO order instead of all hitting the provider. The
+# provider's rate-limit headers lower the limits to the account's real quota, and a 429
+# pauses the model for its Retry-After and halves its rate until calls succeed again.
+LLM_RATE_LIMIT_ENABLED = os.getenv('LLM_RATE_LIMIT_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+LLM_RATE_MAX_WAIT = float(os.getenv('LLM_RATE_MAX_WAIT', '120'))  # seconds a call may queue before failing
+LLM_RATE_RETRY_AFTER_MAX = float(os.getenv('LLM_RATE_RETRY_AFTER_MAX', '20'))  # longer waits fail over instead
+LLM_RATE_POLL_INTERVAL = 0.1  # seconds between checks while waiting on concurrency or the queue head
+
+class ModelRateLimitError(Exception):
+    """Raised when a call would queue longer than LLM_RATE_MAX_WAIT; treated like a provider 429."""
+    status_code = 429
+
+def _parse_rate_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After value or an OpenAI reset duration such as '6m0s' or '250ms'."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|s|m|h)', value)
+    if parts:
+        scale = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+        return sum(float(amount) * scale[unit] for amount, unit in parts)
+    try:
+        from email.utils import parsedate_to_datetime
+        from datetime import datetime, timezone
+        reset = datetime.fromisoformat(value.replace('Z', '+00:00')) if 'T' in value else parsedate_to_datetime(value)
+        return max((reset - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+def retry_after_seconds(headers: Any) -> Optional[float]:
+    """Retry-After (or the provider's reset header) from a rate-limited response, in seconds."""
+    if headers is None:
+        return None
+    for name in ('retry-after', 'x-ratelimit-reset-requests', 'anthropic-ratelimit-requests-reset'):
+        seconds = _parse_rate_duration(headers.get(name))
+        if seconds is not None:
+            return seconds
+    return None
+
+class ModelRateLimiter:
+    """Request and token buckets plus an in-flight cap for one provider/model."""
+    
+    def __init__(self, name: str, rpm: int, tpm: int, concurrency: int):
+        self.name = name
+        self.configured = {'rpm': rpm, 'tpm': tpm, 'concurrency': concurrency}
+        self.rpm = rpm
+        self.tpm = tpm
+        self.concurrency = concurrency
+        self.rate_scale = 1.0  # halved on 429, recovers with successful calls
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._waiters: deque = deque()
+        self._lock = threading.Lock()
+        self.stats = {'admitted': 0, 'queued': 0, 'wait_seconds': 0.0, 'rate_limited': 0, 'rejected': 0}
+    
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(float(self.rpm), self._requests + elapsed * self.rpm * self.rate_scale / 60)
+        if self.tpm:
+            self._tokens = min(float(self.tpm), self._tokens + elapsed * self.tpm * self.rate_scale / 60)
+    
+    def _try_admit(self, ticket: object, tokens: int) -> float:
+        """Admit the ticket (returns 0) or return how long to wait before asking again."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._waiters[0] is not ticket:
+                return LLM_RATE_POLL_INTERVAL
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self.concurrency and self._in_flight >= self.concurrency:
+                return LLM_RATE_POLL_INTERVAL
+            if self.rpm and self._requests < 1:
+                return (1 - self._requests) * 60 / (self.rpm * self.rate_scale)
+            needed = min(tokens, self.tpm)  # a call larger than the whole bucket waits for a full bucket
+            if self.tpm and self._tokens < needed:
+                return (needed - self._tokens) * 60 / (self.tpm * self.rate_scale)
+            self._waiters.popleft()
+            self._requests -= 1
+            self._tokens -= needed
+            self._in_flight += 1
+            self.stats['admitted'] += 1
+            return 0.0
+    
+    def _enqueue(self) -> object:
+        ticket = object()
+        with self._lock:
+            self._waiters.append(ticket)
+        return ticket
+    
+    def _abandon(self, ticket: object, waited: float) -> None:
+        with self._lock:
+            if ticket in self._waiters:
+                self._waiters.remove(ticket)
+            self.stats['rejected'] += 1
+        raise ModelRateLimitError(f"{self.name}: rate limit queue wait exceeded {waited:.0f}s")
+    
+    def acquire(self, tokens: int) -> float:
+        """Block the calling thread until the call may start; returns the seconds waited."""
+        ticket, started = self._enqueue(), time.monotonic()
+        try:
+            while True:
+                delay = self._try_admit(ticket, tokens)
+                waited = time.monotonic() - started
+                if delay <= 0:
+                    return self._note_wait(waited)
+                if waited + delay > LLM_RATE_MAX_WAIT:
+                    self._abandon(ticket, waited + delay)
+                token = _cancel_token.get()
+                if token is not None:
+                    token.wait(min(delay, 1.0))
+                else:
+                    time.sleep(min(delay, 1.0))
+        finally:
+            self._discard(ticket)
+    
+    async def acquire_async(self, tokens: int) -> float:
+        """Await until the call may start; cancelling the caller leaves the queue cleanly."""
+        ticket, started = self._enqueue(), time.monotonic()
+        try:
+            while True:
+                delay = self._try_admit(ticket, tokens)
+                waited = time.monotonic() - started
+                if delay <= 0:
+                    return self._note_wait(waited)
+                if waited + delay > LLM_RATE_MAX_WAIT:
+                    self._abandon(ticket, waited + delay)
+                await asyncio.sleep(min(delay, 1.0))
+        finally:
+            self._discard(ticket)
+    
+    def _discard(self, ticket: object) -> None:
+        with self._lock:
+            if ticket in self._waiters:
+                self._waiters.remove(ticket)
+    
+    def _note_wait(self, waited: float) -> float:
+        if waited >= LLM_RATE_POLL_INTERVAL:
+            with self._lock:
+                self.stats['queued'] += 1
+                self.stats['wait_seconds'] += waited
+            print(f"Rate governor {self.name}: call waited {waited:.1f}s for capacity")
+        return waited
+    
+    def release(self, estimated_tokens: int, actual_tokens: Optional[int], ok: bool) -> None:
+        with self._lock:
+            self._in_flight = max(self._in_flight - 1, 0)
+            if self.tpm and actual_tokens is not None:
+                # Return over-estimated tokens (or charge the shortfall) once usage is known
+                self._tokens = min(float(self.tpm), self._tokens + min(estimated_tokens, self.tpm) - actual_tokens)
+            if ok and self.rate_scale < 1.0:
+                self.rate_scale = min(1.0, self.rate_scale + 0.05)
+    
+    def observe_headers(self, headers: Any) -> None:
+        """Adopt the account limits and remaining quota reported by OpenAI or Anthropic headers."""
+        if headers is None:
+            return
+        def number(*names: str) -> Optional[int]:
+            for name in names:
+                try:
+                    return int(float(headers.get(name)))
+                except (TypeError, ValueError):
+                    continue
+            return None
+        limits = {
+            'rpm': (number('x-ratelimit-limit-requests', 'anthropic-ratelimit-requests-limit'),
+                    number('x-ratelimit-remaining-requests', 'anthropic-ratelimit-requests-remaining'),
+                    headers.get('x-ratelimit-reset-requests') or headers.get('anthropic-ratelimit-requests-reset')),
+            'tpm': (number('x-ratelimit-limit-tokens', 'anthropic-ratelimit-tokens-limit'),
+                    number('x-ratelimit-remaining-tokens', 'anthropic-ratelimit-tokens-remaining'),
+                    headers.get('x-ratelimit-reset-tokens') or headers.get('anthropic-ratelimit-tokens-reset')),
+        }
+        with self._lock:
+            self._refill(time.monotonic())
+            for key, (limit, remaining, reset) in limits.items():
+                if limit:
+                    configured = self.configured[key]
+                    if not getattr(self, key):
+                        # First limit seen for an unconfigured bucket: start it full, then apply remaining
+                        if key == 'rpm':
+                            self._requests = float(limit)
+                        else:
+                            self._tokens = float(limit)
+                    setattr(self, key, min(configured, limit) if configured else limit)
+                if remaining is not None and getattr(self, key):
+                    if key == 'rpm':
+                        self._requests = min(self._requests, float(remaining))
+                    else:
+                        self._tokens = min(self._tokens, float(remaining))
+                    reset_seconds = _parse_rate_duration(reset) if remaining == 0 else None
+                    if reset_seconds:
+                        self._paused_until = max(self._paused_until, time.monotonic() + reset_seconds)
+    
+    def throttle(self, retry_after: Optional[float]) -> None:
+        """React to a 429: pause for Retry-After (1s if absent) and halve the request rate."""
+        with self._lock:
+            self.stats['rate_limited'] += 1
+            self.rate_scale = max(0.25, self.rate_scale / 2)
+            self._paused_until = max(self._paused_until, time.monotonic() + (retry_after if retry_after is not None else 1.0))
+        print(f"Rate governor {self.name}: provider returned 429, pausing {retry_after or 1.0:.1f}s "
+              f"and scaling rate to {self.rate_scale:.2f}")
+    
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                'rpm': self.rpm, 'tpm': self.tpm, 'concurrency': self.concurrency,
+                'configured': dict(self.configured), 'rate_scale': round(self.rate_scale, 2),
+                'in_flight': self._in_flight, 'waiting': len(self._waiters),
+                'available_requests': round(self._requests, 1) if self.rpm else None,
+                'available_tokens': int(self._tokens) if self.tpm else None,
+                'paused_for': round(max(self._paused_until - time.monotonic(), 0.0), 1),
+                **{key: round(value, 1) if isinstance(value, float) else value for key, value in self.stats.items()},
+            }
+
+class RateLease:
+    """An admitted call; reports usage and response headers back to its limiter."""
+    
+    def __init__(self, limiter: Optional[ModelRateLimiter], estimated_tokens: int):
+        self.limiter = limiter
+        self.estimated_tokens = estimated_tokens
+        self.actual_tokens: Optional[int] = None
+    
+    def used(self, prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> None:
+        if prompt_tokens is not None or completion_tokens is not None:
+            self.actual_tokens = (prompt_tokens or 0) + (completion_tokens or 0)
+    
+    def observe(self, headers: Any) -> None:
+        if self.limiter is not None:
+            self.limiter.observe_headers(headers)
+    
+    def rate_limited(self, error: BaseException) -> Optional[float]:
+        """If error is a provider 429, throttle the limiter and return the Retry-After seconds (or 0)."""
+        response = getattr(error, 'response', None)
+        status = getattr(error, 'status_code', None) or getattr(response, 'status_code', None)
+        if status != 429 or isinstance(error, ModelRateLimitError):
+            return None
+        retry_after = retry_after_seconds(getattr(response, 'headers', None))
+        if self.limiter is not None:
+            self.limiter.throttle(retry_after)
+        return retry_after or 0.0
 
-SUPPLIER_URL_PATTERNS = {
-    'tme': lambda manufacturer, partNumber: f"https://www.tme.com/en/katalog/?search={partNumber}",
-    'digi-key': lambda manufacturer, partNumber: f"https://www.digikey.com/en/products/search?keywords={partNumber}",
-    'digikey': lambda manufacturer, partNumber: f"https://www.digikey.com/en/products/search?keywords={partNumber}",
-    'mouser': lambda manufacturer, partNumber: f"https://www.mouser.com/c/?q={partNumber}",
-    'arrow': lambda manufacturer, partNumber: f"https://www.arrow.com/en/products/search?q={partNumber}",
-    'avnet': lambda manufacturer, partNumber: f"https://www.avnet.com/shop/us/search/{partNumber}",
-    'newark': lambda manufacturer, partNumber: f"https://www.newark.com/search?st={partNumber}",
-    'farnell': lambda manufacturer, partNumber: f"https://uk.farnell.com/search?st={partNumber}",
-    'rs': lambda manufacturer, partNumber: f"https://uk.rs-online.com/web/c/search?searchTerm={partNumber}",
-    'rs-components': lambda manufacturer, partNumber: f"https://uk.rs-online.com/web/c/search?searchTerm={partNumber}",
-    'allied': lambda manufacturer, partNumber: f"https://www.alliedelec.com/search/products/?keyword={partNumber}",
-    'mcmaster': lambda manufacturer, partNumber: f"https://www.mcmaster.com/search?query={partNumber}",
-    'mcmaster-carr': lambda manufacturer, partNumber: f"https://www.mcmaster.com/search?query={partNumber}",
-    'element14': lambda manufacturer, partNumber: f"https://www.element14.com/community/search?q={partNumber}",
-    'future': lambda manufacturer, partNumber: f"https://www.futureelectronics.com/search?text={partNumber}",
-    'verical': lambda manufacturer, partNumber: f"https://www.verical.com/search?q={partNumber}",
-    'quest': lambda manufacturer, partNumber: f"https://www.questcomp.com/search?query={partNumber}",
-    'utmel': lambda manufacturer, partNumber: f"https://www.utmel.com/search?keyword={partNumber}",
-    'lcsc': lambda manufacturer, partNumber: f"https://www.lcsc.com/search?q={partNumber}",
-    'chip1stop': lambda manufacturer, partNumber: f"https://www.chip1stop.com/search?keyword={partNumber}",
-    'onlinecomponents': lambda manufacturer, partNumber: f"https://www.onlinecomponents.com/search?keyword={partNumber}",
-    'rutronik': lambda manufacturer, partNumber: f"https://www.rutronik.com/search/?q={partNumber}"
+class ModelRateGovernor:
+    """Process-wide ModelRateLimiter registry keyed by provider and model."""
+    
+    def __init__(self):
+        self._limiters: Dict[tuple, ModelRateLimiter] = {}
+        self._lock = threading.Lock()
+    
+    def limiter(self, provider: str, model: str) -> Optional[ModelRateLimiter]:
+        if not LLM_RATE_LIMIT_ENABLED:
+            return None
+        key = (provider, model)
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                rpm, tpm, concurrency = self._configured_limits(provider, model)
+                limiter = ModelRateLimiter(f"{provider}/{model}", rpm, tpm, concurrency)
+                self._limiters[key] = limiter
+        return limiter
+    
+    @staticmethod
+    def _configured_limits(provider: str, model: str) -> tuple:
+        """Limits of the first mode using this provider/model, with its LLM_RATE_LIMIT_<MODE> override."""
+        mode, config = next(((mode, config) for mode, config in MODEL_CONFIGS.items()
+                             if config.get('provider', 'openai') == provider and config['model'] == model), ('', {}))
+        limits = config.get('rate_limits', {})
+        values = [limits.get('rpm', 0), limits.get('tpm', 0), limits.get('concurrency', 0)]
+        override = os.getenv('LLM_RATE_LIMIT_' + re.sub(r'[^A-Z0-9]', '_', mode.upper())) if mode else None
+        if override:
+            for index, part in enumerate(override.split('/')[:3]):
+                if part.strip():
+                    values[index] = int(part)
+        return tuple(values)
+    
+    @staticmethod
+    def _estimate_tokens(prompt: str, max_tokens: int) -> int:
+        # Providers count the requested completion budget against TPM until the call finishes
+        return (len(prompt or '') + 3) // 4 + max_tokens
+    
+    @contextmanager
+    def lease(self, provider: str, model: str, prompt: str, max_tokens: int):
+        """Hold a slot for one blocking provider request."""
+        limiter = self.limiter(provider, model)
+        lease = RateLease(limiter, self._estimate_tokens(prompt, max_tokens))
+        if limiter is None:
+            yield lease
+            return
+        limiter.acquire(lease.estimated_tokens)
+        ok = False
+        try:
+            yield lease
+            ok = True
+        except Exception as e:
+            lease.rate_limited(e)
+            raise
+        finally:
+            limiter.release(lease.estimated_tokens, lease.actual_tokens, ok)
+    
+    @asynccontextmanager
+    async def lease_async(self, provider: str, model: str, prompt: str, max_tokens: int):
+        """Hold a slot for one awaited provider request (or stream)."""
+        limiter = self.limiter(provider, model)
+        lease = RateLease(limiter, self._estimate_tokens(prompt, max_tokens))
+        if limiter is None:
+            yield lease
+            return
+        await limiter.acquire_async(lease.estimated_tokens)
+        ok = False
+        try:
+            yield lease
+            ok = True
+        except Exception as e:
+            lease.rate_limited(e)
+            raise
+        finally:
+            limiter.release(lease.estimated_tokens, lease.actual_tokens, ok)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return {'enabled': LLM_RATE_LIMIT_ENABLED, 'max_wait_seconds': LLM_RATE_MAX_WAIT,
+                'limiters': {limiter.name: limiter.snapshot() for limiter in limiters}}
+
+model_rate_governor = ModelRateGovernor()
+
+def _rate_limit_retry_delay(error: BaseException) -> Optional[float]:
+    """Retry-After of a provider 429 worth waiting out in place (the governor holds the next attempt
+    until then); None for other errors and for long waits, which fail over instead."""
+    if not LLM_RATE_LIMIT_ENABLED:
+        return None
+    response = getattr(error, 'response', None)
+    if getattr(response, 'status_code', None) != 429:
+        return None
+    retry_after = retry_after_seconds(response.headers) or 1.0
+    return retry_after if retry_after <= LLM_RATE_RETRY_AFTER_MAX else None
+
+# --- Retry Scheduling ---
+# Each model call gets one time budget (its mode's timeout x LLM_RETRY_BUDGET_FACTOR) instead of
+# attempt timeouts that keep growing. Every attempt may use up to the mode's timeout, capped by
+# what is left of the budget. Waits between attempts use full-jitter exponential backoff, so
+# retries after a provider hiccup don't all arrive together. Async calls await their backoff.
+# Blocking calls already run on worker threads; they wait on the request's CancelToken, so a
+# cancelled request frees its thread at once instead of sleeping out the delay.
+LLM_RETRY_BASE_DELAY = float(os.getenv('LLM_RETRY_BASE_DELAY', '1'))  # seconds
+LLM_RETRY_MAX_DELAY = float(os.getenv('LLM_RETRY_MAX_DELAY', '20'))  # seconds
+LLM_RETRY_BUDGET_FACTOR = float(os.getenv('LLM_RETRY_BUDGET_FACTOR', '1.5'))
+LLM_RETRY_MIN_ATTEMPT = 10  # seconds; a retry is not started with less budget left than this
+_retry_jitter = random.Random()  # own generator: other helpers reseed the global one
+
+class RequestCancelled(Exception):
+    """Raised inside a helper pipeline once its request has been cancelled."""
+
+class CancelToken:
+    """Thread-safe cancellation flag shared by one request's tasks and worker threads."""
+    
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+    
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+    
+    def cancel(self, reason: str = 'cancelled') -> None:
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+    
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise RequestCancelled(self.reason or 'cancelled')
+    
+    def wait(self, seconds: float) -> None:
+        """Sleep up to seconds, raising RequestCancelled as soon as the token is cancelled."""
+        if self._event.wait(seconds):
+            raise RequestCancelled(self.reason or 'cancelled')
+
+# The cancellation token of the request being served; copied into tasks and (via submit_in_context) threads
+_cancel_token: contextvars.ContextVar = contextvars.ContextVar('cancel_token', default=None)
+
+def current_cancel_token() -> Optional[CancelToken]:
+    return _cancel_token.get()
+
+def raise_if_cancelled() -> None:
+    token = _cancel_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+class RetrySchedule:
+    """Attempt timeouts and jittered backoff for one model call within its total time budget."""
+    
+    def __init__(self, max_retries: int, base_timeout: float, budget: Optional[float] = None):
+        self.max_retries = max_retries
+        self.base_timeout = base_timeout
+        self.budget = budget if budget is not None else base_timeout * LLM_RETRY_BUDGET_FACTOR
+        self.deadline = time.monotonic() + self.budget
+    
+    def remaining(self) -> float:
+        return max(self.deadline - time.monotonic(), 0.0)
+    
+    def start_attempt(self) -> float:
+        """Timeout for the next attempt; raises RequestCancelled if the request was cancelled."""
+        raise_if_cancelled()
+        return max(min(self.base_timeout, self.remaining()), 1.0)
+    
+    def can_retry(self, attempt: int) -> bool:
+        return attempt < self.max_retries and self.remaining() >= min(LLM_RETRY_MIN_ATTEMPT, self.base_timeout)
+    
+    def backoff(self, attempt: int) -> Optional[float]:
+        """Jittered delay before retrying after attempt (0-based), or None when no retry fits the budget."""
+        if attempt >= self.max_retries:
+            return None
+        delay = _retry_jitter.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt))
+        if self.remaining() - delay < min(LLM_RETRY_MIN_ATTEMPT, self.base_timeout):
+            return None
+        return delay
+    
+    def sleep(self, delay: float) -> None:
+        token = _cancel_token.get()
+        if token is not None:
+            token.wait(delay)
+        else:
+            time.sleep(delay)
+    
+    async def sleep_async(self, delay: float) -> None:
+        raise_if_cancelled()
+        await asyncio.sleep(delay)
+        raise_if_cancelled()
+
+# --- Request Cancellation ---
+# When a client disconnects, the endpoint's helper task is cancelled, which aborts its awaited
+# model calls and hedged requests. Its CancelToken is set as well. The token travels with the
+# context into asyncio.to_thread and submit_in_context workers, so blocking stages, retry
+# backoff and rate-governor waits stop at their next checkpoint. A blocking HTTP call that is
+# already running finishes, but nothing further starts.
+DISCONNECT_POLL_INTERVAL = float(os.getenv('DISCONNECT_POLL_INTERVAL', '1'))  # seconds
+
+def bind_cancel_token(token: Optional[CancelToken] = None) -> CancelToken:
+    """Make token (or a new one) the current request's cancellation token and return it."""
+    token = token or CancelToken()
+    _cancel_token.set(token)
+    return token
+
+async def cancel_on_disconnect(work: Any, is_disconnected: Callable[[], Any],
+                               poll_interval: float = DISCONNECT_POLL_INTERVAL) -> Any:
+    """Await a helper coroutine, cancelling it if is_disconnected() turns true first."""
+    token = CancelToken()
+    reset = _cancel_token.set(token)
+    try:
+        task = asyncio.ensure_future(work)  # the task's context carries the token
+    finally:
+        _cancel_token.reset(reset)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await is_disconnected():
+                print(f"Client disconnected; cancelling request {current_request_id() or ''}".rstrip())
+                current_span().set(**{'request.cancelled': True})
+                token.cancel('Client disconnected')
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                raise RequestCancelled('Client disconnected')
+    finally:
+        if not task.done():
+            token.cancel('Request abandoned')
+            task.cancel()
+
+# --- Supplier Data ---
+# The supplier tables live in suppliers.py so config.Settings serves the same objects.
+from .suppliers import (
+    SUPPLIER_LEAD_TIMES, SUPPLIER_URL_PATTERNS, DEFAULT_SUPPLIER_LEAD_TIME, supplier_resolver
+)
+
+# --- Keyword Classification ---
+# Component descriptions and news headlines are bucketed by keyword. Each rule set is compiled
+# once into a single regex, terms only match whole words (so 'ic' no longer matches
+# "plastic" or 'ram' "frame"), and classify_many handles a whole column at a time.
+
+class KeywordClassifier:
+    """
+    Ordered keyword rules compiled into one case-insensitive regex.
+    
+    ``rules`` is a list of (label, terms); the first label with a matching term wins. A term
+    matches as a whole word, optionally followed by a plural/verb ending (s, es, ed, ing, er,
+    ers, or d after a final 'e', so 'trade' matches "traded" but 'ban' does not match "band").
+    A term ending in '*' matches any word that starts with it. Letters are the only word
+    characters, so "IC2" and "10uF-capacitor" still match 'ic' and 'capacitor'.
+    """
+    
+    SUFFIX = r'(?:s|es|ed|ing|er|ers)?'
+    SUFFIX_AFTER_E = r'(?:s|d|es|ed|ing|er|ers)?'
+    
+    def __init__(self, rules: List[tuple], default: Optional[str] = None):
+        self.labels = [label for label, _ in rules]
+        self.default = default
+        groups = []
+        for index, (label, terms) in enumerate(rules):
+            alternatives = []
+            for term in sorted(terms, key=len, reverse=True):
+                if term.endswith('*'):
+                    alternatives.append(re.escape(term[:-1].lower()) + '[a-z]*')
+                else:
+                    suffix = self.SUFFIX_AFTER_E if term.lower().endswith('e') else self.SUFFIX
+                    alternatives.append(re.escape(term.lower()) + suffix)
+            groups.append(f"(?P<r{index}>{'|'.join(alternatives)})")
+        self._regex = re.compile(r'(?<![a-z])(?:' + '|'.join(groups) + r')(?![a-z])', re.IGNORECASE)
+    
+    def classify(self, text: str) -> Optional[str]:
+        best = None
+        for match in self._regex.finditer(text or ''):
+            index = int(match.lastgroup[1:])
+            if best is None or index < best:
+                best = index
+                if best == 0:
+                    break
+        return self.labels[best] if best is not None else self.default
+    
+    def classify_many(self, texts) -> List[Optional[str]]:
+        """Classify a column of texts, classifying each distinct text once."""
+        seen: Dict[str, Optional[str]] = {}
+        results = []
+        for text in texts:
+            text = text or ''
+            label = seen.get(text)
+            if label is None and text not in seen:
+                label = seen[text] = self.classify(text)
+            results.append(label)
+        return results
+    
+    def matches(self, text: str) -> bool:
+        return self._regex.search(text or '') is not None
+
+COMPONENT_TYPE_CLASSIFIER = KeywordClassifier([
+    ("Semiconductors/ICs", ['ic', 'logic', 'microcontroller', 'processor', 'mcu', 'cpu', 'fpga', 'asic']),
+    ("Passive Components", ['resistor', 'capacitor', 'inductor', 'diode', 'transistor']),
+    ("Connectors/Cables", ['connector', 'cable', 'wire', 'harness']),
+    ("Sensors", ['sensor', 'transducer', 'accelerometer', 'gyroscope']),
+    ("Memory/Storage", ['memory', 'flash', 'ram', 'dram', 'sdram', 'sram', 'eeprom', 'storage']),
+    ("Timing Components", ['crystal', 'oscillator', 'clock', 'resonator']),
+    ("Mechanical Parts", ['mechanical', 'housing', 'enclosure', 'bracket', 'screw']),
+], default="Other Components")
+
+DISRUPTION_TYPE_CLASSIFIER = KeywordClassifier([
+    ("Geopolitical/Trade", ['tariff', 'trade', 'sanction', 'ban', 'banned', 'banning']),
+    ("Labor Issues", ['strike', 'striking', 'striker', 'labor', 'labour', 'union', 'worker']),
+    ("Natural Disaster", ['fire', 'wildfire', 'firefighter', 'flood', 'earthquake', 'hurricane', 'disaster']),
+    ("Cybersecurity", ['cyber*', 'hack', 'hacker', 'attack', 'breach']),
+    ("Supply Shortage", ['shortage', 'allocation', 'capacity', 'capacities']),
+    ("Transportation/Logistics", ['port', 'seaport', 'airport', 'shipping', 'logistic*', 'transport*']),
+    ("Quality/Safety", ['recall', 'quality', 'defect', 'safety']),
+    ("Supplier Financial", ['bankruptcy', 'bankrupt', 'closure', 'shutdown', 'shut down', 'financ*']),
+], default="Market/Economic")
+
+# Headlines mentioning any of these are treated as disruption news
+DISRUPTION_KEYWORD_MATCHER = KeywordClassifier([
+    ("disruption", [
+        "shortage", "delay", "disruption", "strike", "closure",
+        "tariff", "ban", "banned", "sanction", "recall", "bankruptcy", "fire", "wildfire",
+        "firefighter", "flood", "earthquake", "cyberattack", "cyber attack", "hack", "outage",
+        "port", "seaport", "airport", "transport*", "shipping", "supply chain", "manufactur*", "factory", "factories", "plant", "facility", "facilities"
+    ])
+])
+
+# --- Parsed BOM ---
+# A BOM arrives as a JSON or CSV string and used to be re-parsed by every helper in the
+# analysis pipeline. ParsedBOM parses it once, resolves column aliases and coerces the
+# numeric columns once; helpers accept either the raw input or a ParsedBOM.
+BOM_COLUMN_ALIASES = {
+    'part_number': ('Manufacturer Part #', 'Part Number'),
+    'description': ('Description',),
+    'manufacturer': ('Manufacturer',),
+    'supplier': ('Supplier',),
+    'category': ('Category',),
+    'quantity': ('Quantity', 'Qty'),
+    'unit_cost': ('Unit Cost (USD)',),
+    'total': ('Total',),
+    'cost': ('Unit Cost (USD)', 'Total'),
+    'lead_time_days': ('Avg Lead Time (days)',),
+    'on_time_delivery': ('On-Time Delivery (%)',),
+    'defect_rate': ('Defect Rate (%)',),
+    'cost_variance': ('Cost Variance (%)',),
 }
+BOM_NUMERIC_FIELDS = ('quantity', 'unit_cost', 'total', 'cost', 'lead_time_days',
+                      'on_time_delivery', 'defect_rate', 'cost_variance')
+
+def _coerce_bom_number(value: Any) -> Optional[float]:
+    """Parse a BOM cell such as '1,250', '$3.20' or '92.5%'; None if blank or not numeric."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip().replace('$', '').replace(',', '').rstrip('%').strip()
+    if not text:
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+class BOMItem:
+    """One BOM row with aliased columns resolved and numeric columns coerced.
+    
+    Text fields hold the raw cell (None if the column is absent); numeric fields hold a
+    float or None. ``row`` keeps the original dict for code that needs other columns.
+    """
+    __slots__ = ('row', '_component_type') + tuple(BOM_COLUMN_ALIASES)
+    
+    def __init__(self, row: Dict[str, Any]):
+        self.row = row
+        self._component_type = None
+        for field, columns in BOM_COLUMN_ALIASES.items():
+            value = next((row[column] for column in columns if column in row), None)
+            setattr(self, field, _coerce_bom_number(value) if field in BOM_NUMERIC_FIELDS else value)
+    
+    @property
+    def cost_text(self) -> Any:
+        """Unit cost (or line total) as it appears in the BOM, for display."""
+        return next((self.row[column] for column in BOM_COLUMN_ALIASES['cost'] if column in self.row), None)
+    
+    @property
+    def quantity_text(self) -> Any:
+        return next((self.row[column] for column in BOM_COLUMN_ALIASES['quantity'] if column in self.row), None)
+    
+    @property
+    def whole_quantity(self) -> int:
+        """Quantity as a whole number of units, 1 when missing or fractional."""
+        if self.quantity is not None and self.quantity >= 0 and float(self.quantity).is_integer():
+            return int(self.quantity)
+        return 1
+    
+    @property
+    def component_type(self) -> str:
+        """categorize_component_type of the description, computed once per item."""
+        if self._component_type is None:
+            self._component_type = categorize_component_type(self.description or '')
+        return self._component_type
+
+class ParsedBOM:
+    """A BOM parsed once from JSON/CSV text (or an already-decoded list) and shared by helpers.
+    
+    Build it with ParsedBOM.from_input(bom), which returns the argument unchanged if it is
+    already parsed. Truthiness follows the raw input, so ``if not bom`` checks keep working.
+    """
+    
+    def __init__(self, raw: Any):
+        self.raw = raw
+        self.source_format = 'object'
+        self.data: Any = raw
+        if isinstance(raw, str):
+            try:
+                self.data = json.loads(raw)
+                self.source_format = 'json'
+            except Exception:
+                try:
+                    self.data = parse_csv_data(raw)
+                except Exception as e:
+                    print('BOM parsing error:', e)
+                    self.data = None
+                self.source_format = 'csv'
+        self.rows: List[Dict[str, Any]] = self.data if isinstance(self.data, list) else []
+        self.items: List[BOMItem] = [BOMItem(row) for row in self.rows if isinstance(row, dict)]
+        self._columns: Dict[tuple, np.ndarray] = {}
+        self._groups: Dict[str, tuple] = {}
+    
+    @classmethod
+    def from_input(cls, bom: Any) -> 'ParsedBOM':
+        return bom if isinstance(bom, cls) else cls(bom)
+    
+    @property
+    def is_list(self) -> bool:
+        return isinstance(self.data, list)
+    
+    def column(self, field: str, default: float) -> np.ndarray:
+        """Numeric BOMItem field as a float array, missing values replaced by ``default``."""
+        key = (field, default)
+        if key not in self._columns:
+            values = (getattr(item, field) for item in self.items)
+            self._columns[key] = np.fromiter((default if v is None else v for v in values), dtype=float, count=len(self.items))
+        return self._columns[key]
+    
+    def group_codes(self, field: str) -> tuple:
+        """(labels, codes) for a text field: distinct non-empty values in first-appearance
+        order, and each item's index into them (-1 for empty values)."""
+        if field not in self._groups:
+            index: Dict[Any, int] = {}
+            codes = np.fromiter((index.setdefault(value, len(index)) if value else -1
+                                 for value in (getattr(item, field) for item in self.items)),
+                                dtype=np.int64, count=len(self.items))
+            self._groups[field] = (list(index), codes)
+        return self._groups[field]
+    
+    def component_types(self) -> List[str]:
+        """component_type of every item, classified as one batch."""
+        pending = [item for item in self.items if item._component_type is None]
+        if pending:
+            labels = COMPONENT_TYPE_CLASSIFIER.classify_many(item.description or '' for item in pending)
+            for item, label in zip(pending, labels):
+                item._component_type = label
+        return [item._component_type for item in self.items]
+    
+    def __bool__(self) -> bool:
+        return bool(self.raw)
+    
+    def __len__(self) -> int:
+        return len(self.rows)
+    
+    def __str__(self) -> str:
+        return str(self.raw)
+
+# --- Prompt Compaction ---
+# Large BOMs used to be inlined row by row into the explanation and mitigation prompts. When
+# the rows do not fit PROMPT_BOM_TOKEN_BUDGET, only the highest-ranked rows (relevance to the
+# scenario first, then cost and supplier risk) are kept verbatim and the rest are summarized
+# per component type. Small BOMs are still sent in full.
+PROMPT_BOM_TOKEN_BUDGET = int(os.getenv('PROMPT_BOM_TOKEN_BUDGET', '2000'))
+PROMPT_BOM_MAX_ROWS = int(os.getenv('PROMPT_BOM_MAX_ROWS', '60'))  # cap on verbatim rows once compacting
+
+def estimate_prompt_tokens(text: str) -> int:
+    """Rough token count for budgeting (about four characters per token)."""
+    return (len(text) + 3) // 4
+
+def rank_bom_items(parsed_bom: 'ParsedBOM', query_text: str = '') -> List[int]:
+    """Item indices ordered by relevance to query_text, then extended cost and supplier risk."""
+    items = parsed_bom.items
+    if not items:
+        return []
+    query_lower = (query_text or '').lower()
+    query_tokens = set(tokenize_search_text(query_text))
+    relevance = np.zeros(len(items))
+    for index, item in enumerate(items):
+        part_number = str(item.part_number or '').strip().lower()
+        if part_number and part_number in query_lower:
+            relevance[index] += 3.0
+        if query_tokens:
+            item_tokens = set(tokenize_search_text(' '.join(
+                str(value) for value in (item.description, item.manufacturer, item.supplier) if value)))
+            relevance[index] += len(item_tokens & query_tokens) / max(len(item_tokens), 1)
+    
+    extended = parsed_bom.column('total', 0.0)
+    extended = np.where(extended > 0, extended,
+                        parsed_bom.column('unit_cost', 0.0) * parsed_bom.column('quantity', 1.0))
+    risk = (parsed_bom.column('defect_rate', 0.0) / 10.0
+            + (100.0 - parsed_bom.column('on_time_delivery', 100.0)) / 100.0
+            + parsed_bom.column('lead_time_days', 0.0) / 90.0)
+    
+    def normalized(values: np.ndarray) -> np.ndarray:
+        peak = float(values.max()) if len(values) else 0.0
+        return values / peak if peak > 0 else np.zeros_like(values)
+    
+    score = 10.0 * relevance + normalized(extended) + 0.5 * normalized(risk)
+    # Stable sort so equally ranked rows keep their BOM order
+    return [int(index) for index in np.argsort(-score, kind='stable')]
+
+def format_bom_for_prompt(bom: Any, format_row: Callable[[Dict[str, Any]], str], heading: str,
+                          query_text: str = '', token_budget: int = PROMPT_BOM_TOKEN_BUDGET,
+                          max_rows: int = PROMPT_BOM_MAX_ROWS) -> str:
+    """
+    Render BOM rows for a prompt as "\n\n<heading>:\n- row..." within a token budget.
+    
+    Every row is included when they fit. Otherwise the top-ranked rows are listed verbatim
+    and the remainder are collapsed into one summary line per component type.
+    """
+    parsed_bom = ParsedBOM.from_input(bom)
+    items = parsed_bom.items
+    if not items:
+        return ''
+    lines = [format_row(item.row) for item in items]
+    full_text = '\n'.join(lines)
+    if estimate_prompt_tokens(full_text) <= token_budget:
+        return f"\n\n{heading}:\n{full_text}"
+    
+    order = rank_bom_items(parsed_bom, query_text)
+    component_types = parsed_bom.component_types()
+    summary_reserve = 40 * len(set(component_types)) + 60
+    kept: List[int] = []
+    kept_set = set()
+    repeats: Dict[str, int] = {}  # identical rows are listed once with a count
+    used = 0
+    for index in order:
+        line = lines[index]
+        if line in repeats:
+            repeats[line] += 1
+            kept_set.add(index)
+            continue
+        cost = estimate_prompt_tokens(line) + 4
+        if len(kept) >= max_rows or used + cost > token_budget - summary_reserve:
+            break
+        kept.append(index)
+        kept_set.add(index)
+        repeats[line] = 1
+        used += cost
+    
+    groups: Dict[str, Dict[str, Any]] = {}
+    for index, item in enumerate(items):
+        if index in kept_set:
+            continue
+        group = groups.setdefault(component_types[index], {'count': 0, 'cost': 0.0, 'lead_time': 0.0, 'suppliers': {}})
+        group['count'] += 1
+        group['cost'] += item.total if item.total else (item.unit_cost or 0) * (item.quantity or 1)
+        group['lead_time'] = max(group['lead_time'], item.lead_time_days or 0)
+        if item.supplier:
+            group['suppliers'][item.supplier] = group['suppliers'].get(item.supplier, 0) + 1
+    
+    summary_lines = []
+    for component_type, group in sorted(groups.items(), key=lambda entry: entry[1]['cost'], reverse=True):
+        top_suppliers = sorted(group['suppliers'].items(), key=lambda entry: entry[1], reverse=True)[:3]
+        supplier_text = ', '.join(name for name, _ in top_suppliers) or 'N/A'
+        line = (f"- {component_type}: {group['count']} more components, total ${group['cost']:,.2f}, "
+                f"{len(group['suppliers'])} suppliers (mainly {supplier_text})")
+        if group['lead_time']:
+            line += f", longest lead time {group['lead_time']:.0f} days"
+        summary_lines.append(line)
+    
+    listed = [lines[index] + (f" (x{repeats[lines[index]]} rows)" if repeats[lines[index]] > 1 else '')
+              for index in kept]
+    text = (f"\n\n{heading} ({len(kept_set)} of {len(items)} shown, ranked by relevance to the scenario, "
+            f"cost and supplier risk):\n" + '\n'.join(listed))
+    if summary_lines:
+        text += f"\n\nRemaining {len(items) - len(kept_set)} BOM components (summarized by type):\n" + '\n'.join(summary_lines)
+    return text
 
 # --- Helper Functions ---
 def parse_csv_data(csv_string: str) -> List[Dict[str, Any]]:
@@ -121,17 +1614,15 @@ def parse_csv_data(csv_string: str) -> List[Dict[str, Any]]:
     reader = csv.DictReader(lines)
     return [row for row in reader]
 
+@traced()
 def calculate_historical_probability(bom_data: Any, kpi_data: Any) -> Dict[str, Any]:
-    """Calculate disruption probabilities based on real historical KPI data."""
+    """Calculate disruption probabilities based on real historical KPI data.
+    
+    Vectorized over the BOM's metric columns. Sums are accumulated in the same order as
+    the original row-by-row loop, so results are bit-for-bit identical to it.
+    """
     try:
-        # Parse BOM data if it's a string
-        if isinstance(bom_data, str):
-            try:
-                bom_array = json.loads(bom_data)
-            except Exception:
-                bom_array = parse_csv_data(bom_data)
-        else:
-            bom_array = bom_data
+        parsed_bom = ParsedBOM.from_input(bom_data)
 
         # Parse KPI data if it's a string
         if isinstance(kpi_data, str):
@@ -142,75 +1633,48 @@ def calculate_historical_probability(bom_data: Any, kpi_data: Any) -> Dict[str,
         else:
             kpi_array = kpi_data
 
-        if not isinstance(bom_array, list) or not isinstance(kpi_array, list):
+        if not parsed_bom.is_list or not isinstance(kpi_array, list):
             return {}
-
-        # Calculate risk factors based on historical data
-        supplier_risks = {}
-        component_risks = {}
-        
-        # Analyze historical KPI data for each component
-        for item in bom_array:
-            supplier = item.get('Supplier', '')
-            component_type = item.get('Category', '')
-            part_number = item.get('Manufacturer Part #', '')
-            
-            # Extract historical metrics from the item itself (if available)
-            on_time_delivery = float(item.get('On-Time Delivery (%)', 95))
-            defect_rate = float(item.get('Defect Rate (%)', 2))
-            cost_variance = abs(float(item.get('Cost Variance (%)', 0)))
-            lead_time = float(item.get('Avg Lead Time (days)', 14))
-            
-            # Calculate risk score based on historical performance
-            # Lower on-time delivery = higher risk
-            delivery_risk = max(0, (100 - on_time_delivery) / 100)
-            
-            # Higher defect rate = higher risk (normalize to 0-1 scale)
-            quality_risk = min(1.0, defect_rate / 10.0)
-            
-            # Higher cost variance = higher risk (normalize to 0-1 scale)
-            cost_risk = min(1.0, cost_variance / 20.0)
-            
-            # Longer lead times = higher risk (normalize based on 30 days max)
-            lead_time_risk = min(1.0, lead_time / 30.0)
-            
-            # Composite risk score (weighted average)
-            composite_risk = (
-                delivery_risk * 0.4 +  # 40% weight on delivery performance
-                quality_risk * 0.2 +   # 20% weight on quality
-                cost_risk * 0.2 +      # 20% weight on cost stability
-                lead_time_risk * 0.2   # 20% weight on lead time
-            )
-            
-            # Store risks by supplier and component type
-            if supplier:
-                if supplier not in supplier_risks:
-                    supplier_risks[supplier] = []
-                supplier_risks[supplier].append(composite_risk)
-            
-            if component_type:
-                if component_type not in component_risks:
-                    component_risks[component_type] = []
-                component_risks[component_type].append(composite_risk)
-
-        # Calculate average risks
-        avg_supplier_risks = {
-            supplier: sum(risks) / len(risks) 
-            for supplier, risks in supplier_risks.items()
-        }
-        
-        avg_component_risks = {
-            comp_type: sum(risks) / len(risks) 
-            for comp_type, risks in component_risks.items()
-        }
+        if not parsed_bom.items:
+            # No components to average over; use the same fallback as a failed calculation
+            return {'overall_risk': 0.3, 'supplier_risks': {}, 'component_risks': {}, 'risk_factors': {}}
+
+        # Extract historical metrics from the items themselves (defaults where missing)
+        on_time_delivery = parsed_bom.column('on_time_delivery', 95)
+        defect_rate = parsed_bom.column('defect_rate', 2)
+        cost_variance = np.abs(parsed_bom.column('cost_variance', 0))
+        lead_time = parsed_bom.column('lead_time_days', 14)
+        
+        # Calculate risk score based on historical performance
+        # Lower on-time delivery = higher risk
+        delivery_risk = np.maximum(0, (100 - on_time_delivery) / 100)
+        # Higher defect rate = higher risk (normalize to 0-1 scale)
+        quality_risk = np.minimum(1.0, defect_rate / 10.0)
+        # Higher cost variance = higher risk (normalize to 0-1 scale)
+        cost_risk = np.minimum(1.0, cost_variance / 20.0)
+        # Longer lead times = higher risk (normalize based on 30 days max)
+        lead_time_risk = np.minimum(1.0, lead_time / 30.0)
+        
+        # Composite risk score (weighted average)
+        composite_risk = (
+            delivery_risk * 0.4 +  # 40% weight on delivery performance
+            quality_risk * 0.2 +   # 20% weight on quality
+            cost_risk * 0.2 +      # 20% weight on cost stability
+            lead_time_risk * 0.2   # 20% weight on lead time
+        )
         
-        # Calculate overall BOM risk
-        all_risks = []
-        for risks in supplier_risks.values():
-            all_risks.extend(risks)
+        # Average risks by supplier and component type (groups in first-appearance order)
+        suppliers, supplier_codes = parsed_bom.group_codes('supplier')
+        categories, category_codes = parsed_bom.group_codes('category')
+        avg_supplier_risks = _group_means(suppliers, supplier_codes, composite_risk)
+        avg_component_risks = _group_means(categories, category_codes, composite_risk)
         
-        overall_risk = sum(all_risks) / len(all_risks) if all_risks else 0.3
+        # Calculate overall BOM risk over supplier-attributed rows, grouped by supplier
+        attributed = np.flatnonzero(supplier_codes >= 0)
+        grouped_rows = attributed[np.argsort(supplier_codes[attributed], kind='stable')]
+        overall_risk = _sequential_sum(composite_risk[grouped_rows]) / len(grouped_rows) if len(grouped_rows) else 0.3
         
+        component_count = len(composite_risk)
         return {
             'overall_risk': overall_risk,
             'supplier_risks': avg_supplier_risks,
@@ -219,9 +1683,9 @@ def calculate_historical_probability(bom_data: Any, kpi_data: Any) -> Dict[str,
                 'high_risk_suppliers': [s for s, r in avg_supplier_risks.items() if r > 0.4],
                 'medium_risk_suppliers': [s for s, r in avg_supplier_risks.items() if 0.2 <= r <= 0.4],
                 'high_risk_components': [c for c, r in avg_component_risks.items() if r > 0.4],
-                'avg_on_time_delivery': sum([float(item.get('On-Time Delivery (%)', 95)) for item in bom_array]) / len(bom_array),
-                'avg_defect_rate': sum([float(item.get('Defect Rate (%)', 2)) for item in bom_array]) / len(bom_array),
-                'avg_lead_time': sum([float(item.get('Avg Lead Time (days)', 14)) for item in bom_array]) / len(bom_array)
+                'avg_on_time_delivery': _sequential_sum(on_time_delivery) / component_count,
+                'avg_defect_rate': _sequential_sum(defect_rate) / component_count,
+                'avg_lead_time': _sequential_sum(lead_time) / component_count
             }
         }
         
@@ -229,6 +1693,19 @@ def calculate_historical_probability(bom_data: Any, kpi_data: Any) -> Dict[str,
         print(f"Error calculating historical probability: {e}")
         return {'overall_risk': 0.3, 'supplier_risks': {}, 'component_risks': {}, 'risk_factors': {}}
 
+def _sequential_sum(values: np.ndarray) -> float:
+    """Left-to-right float sum (np.sum is pairwise and can differ in the last bits)."""
+    return float(np.cumsum(values)[-1]) if len(values) else 0.0
+
+def _group_means(labels: List[Any], codes: np.ndarray, values: np.ndarray) -> Dict[Any, float]:
+    """Mean of values per group code; bincount accumulates in row order like a Python loop."""
+    if not labels:
+        return {}
+    mask = codes >= 0
+    sums = np.bincount(codes[mask], weights=values[mask], minlength=len(labels))
+    counts = np.bincount(codes[mask], minlength=len(labels))
+    return {label: float(total) / int(count) for label, total, count in zip(labels, sums, counts)}
+
 def convert_risk_to_probability(risk_score: float, scenario_type: str = 'general') -> tuple:
     """Convert risk score (0-1) to realistic probability percentage and category."""
     
@@ -292,118 +1769,319 @@ def estimate_lead_time(supplier_name: Optional[str], bom_item: Optional[Dict[str
                 except (ValueError, TypeError):
                     continue
     
-    # Second priority: Use supplier lookup table
-    if not supplier_name:
-        return 7
-    
-    supplier_lower = supplier_name.lower()
-    for supplier, lead_time in SUPPLIER_LEAD_TIMES.items():
-        if supplier in supplier_lower or supplier_lower in supplier:
-            return lead_time
-    
-    # Default fallback
-    return 7
+    # Second priority: Use supplier lookup table (resolved once per distinct supplier name)
+    return supplier_resolver.lead_time(supplier_name)
 
 def generate_supplier_url(supplier: str, manufacturer: str, part_number: str) -> str:
     """Generate a supplier-specific URL for a part."""
-    import urllib.parse
-    
-    # URL encode the part number to handle special characters
-    encoded_part_number = urllib.parse.quote(part_number, safe='')
-    
-    supplier_lower = supplier.lower()
-    print(f"Generating URL for supplier: '{supplier}' (lowercase: '{supplier_lower}'), part: '{part_number}'")
+    return supplier_resolver.build_url(supplier, manufacturer, part_number)
+
+def verify_supplier_has_component(supplier: str, manufacturer: str, part_number: str,
+                                  check_cache: bool = True) -> bool:
+    """Verify if a supplier actually has the component available on their website.
     
-    for pattern, url_generator in SUPPLIER_URL_PATTERNS.items():
-        if pattern in supplier_lower:
-            url = url_generator(manufacturer, encoded_part_number)
-            print(f"Matched pattern '{pattern}' for supplier '{supplier}', generated URL: {url}")
-            return url
+    At most SUPPLIER_VERIFY_PER_HOST checks run against one site at a time. Pass
+    check_cache=False when the caller has already looked the supplier up in the cache.
+    """
+    if check_cache:
+        cached = supplier_availability_cache.get(supplier, part_number)
+        if cached is not None:
+            return cached
+    from urllib.parse import urlparse
+    url = generate_supplier_url(supplier, manufacturer, part_number)
+    with trace_span('supplier.verify', supplier=supplier, url=url) as span:
+        with _host_semaphore(urlparse(url).hostname or ''):
+            outcome = _check_supplier_page(url, supplier, part_number)
+        span.set(outcome=outcome)
+    supplier_availability_cache.record(supplier, part_number, outcome)
+    return outcome != AVAILABILITY_UNAVAILABLE
+
+# --- Page Pattern Scanner ---
+# Supplier search pages are read in chunks and matched against every phrase in one pass over
+# the raw bytes, so the download stops at the first "no results" phrase instead of fetching,
+# decoding and lowercasing the whole page.
+SUPPLIER_SCAN_CHUNK_BYTES = int(os.getenv('SUPPLIER_SCAN_CHUNK_BYTES', '16384'))
+SUPPLIER_SCAN_MAX_BYTES = int(os.getenv('SUPPLIER_SCAN_MAX_BYTES', '4000000'))
+
+# Common patterns that indicate component is not found
+SUPPLIER_NOT_FOUND_PATTERNS = [
+    'no results found',
+    'no products found',
+    'product not found',
+    'part not found',
+    '0 results',
+    'no matching products',
+    'no items found',
+    'search returned no results',
+    'no products match your search',
+    'did not return any results',
+    'no search results',
+    'search did not find any results',
+    'your search returned 0 results',
+    'no items were found',
+    'no results match your search'
+]
+
+# Product listing indicators - these suggest the search found actual products
+SUPPLIER_FOUND_PATTERNS = [
+    'add to cart',
+    'buy now',
+    'in stock',
+    'price',
+    'quantity',
+    'datasheet',
+    'product details',
+    'specifications'
+]
+
+class PagePatternScanner:
+    """Case-insensitive single-pass search of a byte stream for negative and positive phrases.
     
-    fallback_url = f"https://www.digikey.com/en/products/search?keywords={encoded_part_number}"
-    print(f"No pattern matched for supplier '{supplier}', using fallback URL: {fallback_url}")
-    return fallback_url
+    Only a negative phrase is decisive and stops the scan; positive phrases such as 'price' also
+    appear on "no results" pages, so the rest of the stream is still read up to max_bytes.
+    """
+
+    def __init__(self, negative: List[str], positive: List[str], max_bytes: int = SUPPLIER_SCAN_MAX_BYTES):
+        self.negative = {pattern.lower() for pattern in negative}
+        self.positive = {pattern.lower() for pattern in positive}
+        self.max_bytes = max_bytes
+        patterns = list(dict.fromkeys(pattern.lower() for pattern in list(negative) + list(positive)))
+        # Negatives first so they win when two phrases start at the same offset
+        self._regex = re.compile(b'|'.join(re.escape(pattern.encode('utf-8')) for pattern in patterns), re.IGNORECASE)
+        self._overlap = max(len(pattern.encode('utf-8')) for pattern in patterns) - 1
+
+    def scan(self, chunks) -> tuple:
+        """Consume an iterable of byte chunks and return (verdict, pattern, bytes_read).
+        
+        verdict is 'negative', 'positive' or None when neither kind of phrase was found.
+        """
+        bytes_read = 0
+        tail = b''
+        positive_pattern = None
+        for chunk in chunks:
+            if not chunk:
+                continue
+            bytes_read += len(chunk)
+            window = tail + chunk
+            for match in self._regex.finditer(window):
+                pattern = match.group().decode('utf-8').lower()
+                if pattern in self.negative:
+                    return 'negative', pattern, bytes_read
+                if positive_pattern is None:
+                    positive_pattern = pattern
+            if bytes_read >= self.max_bytes:
+                break
+            tail = window[-self._overlap:] if self._overlap else b''
+        if positive_pattern is not None:
+            return 'positive', positive_pattern, bytes_read
+        return None, None, bytes_read
+
+    def scan_text(self, text: str) -> tuple:
+        return self.scan([text.encode('utf-8')])
+
+supplier_page_scanner = PagePatternScanner(SUPPLIER_NOT_FOUND_PATTERNS, SUPPLIER_FOUND_PATTERNS)
 
-def verify_supplier_has_component(supplier: str, manufacturer: str, part_number: str) -> bool:
-    """Verify if a supplier actually has the component available on their website."""
+def _check_supplier_page(url: str, supplier: str, part_number: str) -> str:
+    """Fetch a supplier search page and decide whether it lists the part.
+    
+    Returns AVAILABILITY_AVAILABLE, AVAILABILITY_UNAVAILABLE or AVAILABILITY_UNCERTAIN. Callers
+    treat uncertain as available, but it is cached for much less time.
+    """
     try:
-        url = generate_supplier_url(supplier, manufacturer, part_number)
-        
         # Make a GET request to check if the component is actually available
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
         
-        import requests
-        response = requests.get(url, headers=headers, timeout=10, allow_redirects=True)
-        
-        # Check HTTP status code first
-        if response.status_code == 404:
-            return False
-        elif not (200 <= response.status_code < 300):
-            # For non-2xx status codes (except 404), be conservative and assume available
-            return True
-        
-        # Analyze the response content for common "not found" indicators
-        content = response.text.lower()
-        
-        # Common patterns that indicate component is not found
-        not_found_patterns = [
-            'no results found',
-            'no products found',
-            'product not found',
-            'part not found',
-            '0 results',
-            'no matching products',
-            'no items found',
-            'search returned no results',
-            'no products match your search',
-            'did not return any results',
-            'no search results',
-            'search did not find any results',
-            'your search returned 0 results',
-            'no items were found',
-            'no results match your search'
-        ]
-        
-        # Check if any "not found" patterns are present
-        for pattern in not_found_patterns:
-            if pattern in content:
-                return False
-        
-        # Additional check: look for product listing indicators
-        # These patterns suggest the search found actual products
-        found_patterns = [
-            'add to cart',
-            'buy now',
-            'in stock',
-            'price',
-            'quantity',
-            'datasheet',
-            'product details',
-            'specifications'
-        ]
+        # Shared keep-alive session, so repeated checks against a distributor reuse connections
+        with get_llm_session().get(url, headers=headers, timeout=10, allow_redirects=True, stream=True) as response:
+            current_span().set(status_code=response.status_code)
+            # Check HTTP status code first
+            if response.status_code == 404:
+                return AVAILABILITY_UNAVAILABLE
+            elif not (200 <= response.status_code < 300):
+                # For non-2xx status codes (except 404), be conservative and assume available
+                return AVAILABILITY_UNCERTAIN
+            
+            # Stream the body through the scanner; it stops reading at the first "no results" phrase
+            verdict, pattern, bytes_read = supplier_page_scanner.scan(
+                response.iter_content(chunk_size=SUPPLIER_SCAN_CHUNK_BYTES)
+            )
+            current_span().set(bytes=bytes_read, matched=pattern)
         
-        # If we find positive indicators, component is likely available
-        for pattern in found_patterns:
-            if pattern in content:
-                return True
+        if verdict == 'negative':
+            return AVAILABILITY_UNAVAILABLE
         
-        # If no clear indicators either way, assume available (conservative approach)
-        return True
+        # Positive indicators, or no clear indicators either way: assume available (conservative approach)
+        return AVAILABILITY_AVAILABLE
             
     except requests.exceptions.Timeout:
         # If request times out, assume component is available to avoid false negatives
         print(f"Timeout verifying {supplier} for {part_number} - assuming available")
-        return True
+        return AVAILABILITY_UNCERTAIN
     except requests.exceptions.RequestException as e:
         # If there's a network error, assume the component is available to avoid false negatives
         print(f"Network error verifying {supplier} for {part_number}: {str(e)} - assuming available")
-        return True
+        return AVAILABILITY_UNCERTAIN
     except Exception as e:
         # For any other unexpected errors, assume availability
         print(f"Error verifying {supplier} for {part_number}: {str(e)} - assuming available")
-        return True
+        return AVAILABILITY_UNCERTAIN
+
+# --- Supplier Availability Cache ---
+# Whether a distributor lists a part changes slowly, so verification outcomes are kept per
+# (supplier, part number) in SQLite and survive restarts. Timeouts and errors still count as
+# available but expire quickly so the page is checked again soon.
+AVAILABILITY_AVAILABLE = 'available'
+AVAILABILITY_UNAVAILABLE = 'unavailable'
+AVAILABILITY_UNCERTAIN = 'uncertain'
+SUPPLIER_AVAILABILITY_DB_PATH = os.getenv(
+    'SUPPLIER_AVAILABILITY_DB_PATH', os.path.join(os.path.dirname(__file__), '../cache/supplier_availability.sqlite3')
+)  # empty keeps it in memory
+SUPPLIER_AVAILABILITY_TTLS = {
+    AVAILABILITY_AVAILABLE: int(os.getenv('SUPPLIER_AVAILABILITY_TTL_POSITIVE', '86400')),
+    AVAILABILITY_UNAVAILABLE: int(os.getenv('SUPPLIER_AVAILABILITY_TTL_NEGATIVE', '21600')),
+    AVAILABILITY_UNCERTAIN: int(os.getenv('SUPPLIER_AVAILABILITY_TTL_UNCERTAIN', '600')),
+}
+SUPPLIER_AVAILABILITY_MAX_ENTRIES = int(os.getenv('SUPPLIER_AVAILABILITY_MAX_ENTRIES', '20000'))
+
+class SupplierAvailabilityCache:
+    """(supplier, part number) -> verification outcome, with a TTL per outcome."""
+
+    def __init__(self, db_path: str = '', ttls: Optional[Dict[str, int]] = None, max_entries: int = 0):
+        self.ttls = dict(ttls or SUPPLIER_AVAILABILITY_TTLS)
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk: Optional[SQLiteTTLStore] = None
+        if db_path:
+            try:
+                self._disk = SQLiteTTLStore(db_path, 'supplier_availability', max_entries)
+            except Exception as e:
+                print(f"Warning: supplier availability database unavailable ({db_path}): {e}")
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0}
+        self.outcome_stats = {outcome: 0 for outcome in self.ttls}
+
+    @staticmethod
+    def make_key(supplier: str, part_number: str) -> str:
+        return f"{(supplier or '').strip().lower()}|{(part_number or '').strip().upper()}"
+
+    def get_outcome(self, supplier: str, part_number: str) -> Optional[str]:
+        """Return the cached outcome, or None if there is no live entry."""
+        key = self.make_key(supplier, part_number)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= now:
+                del self._entries[key]
+                entry = None
+        if entry is None and self._disk is not None:
+            try:
+                entry = self._disk.get_entry(key)
+            except Exception as e:
+                print(f"Warning: supplier availability lookup failed: {e}")
+                entry = None
+            if entry is not None:
+                self._remember(key, entry[0], entry[1])
+        with self._lock:
+            self.stats['hits' if entry else 'misses'] += 1
+        return entry[0] if entry else None
+
+    def get(self, supplier: str, part_number: str) -> Optional[bool]:
+        """Return the cached availability, or None if the supplier page has to be checked."""
+        outcome = self.get_outcome(supplier, part_number)
+        if outcome is None:
+            return None
+        return outcome != AVAILABILITY_UNAVAILABLE
+
+    def record(self, supplier: str, part_number: str, outcome: str) -> None:
+        ttl = self.ttls.get(outcome, 0)
+        if ttl <= 0:
+            return
+        key = self.make_key(supplier, part_number)
+        self._remember(key, outcome, time.time() + ttl)
+        if self._disk is not None:
+            try:
+                self._disk.set(key, outcome, ttl)
+            except Exception as e:
+                print(f"Warning: could not persist supplier availability: {e}")
+        with self._lock:
+            self.stats['stores'] += 1
+            self.outcome_stats[outcome] = self.outcome_stats.get(outcome, 0) + 1
+
+    def _remember(self, key: str, outcome: str, expires_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (outcome, expires_at)
+            self._entries.move_to_end(key)
+            while self.max_entries and len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            summary = {
+                **self.stats,
+                'hit_rate': round(self.stats['hits'] / lookups, 3) if lookups else 0.0,
+                'stored_by_outcome': dict(self.outcome_stats),
+                'memory_entries': len(self._entries),
+                'ttls': dict(self.ttls),
+            }
+        summary['persistent'] = self._disk is not None
+        if self._disk is not None:
+            try:
+                summary['disk_entries'] = self._disk.count()
+            except Exception as e:
+                summary['disk_error'] = str(e)
+        return summary
+
+supplier_availability_cache = SupplierAvailabilityCache(
+    SUPPLIER_AVAILABILITY_DB_PATH, SUPPLIER_AVAILABILITY_TTLS, SUPPLIER_AVAILABILITY_MAX_ENTRIES
+)
+
+# --- Concurrent Supplier Verification ---
+# Each verification scrapes a distributor search page (up to 10s). They now run together on
+# a bounded pool, at most SUPPLIER_VERIFY_PER_HOST at a time against any one site.
+SUPPLIER_VERIFY_WORKERS = int(os.getenv('SUPPLIER_VERIFY_WORKERS', '8'))
+SUPPLIER_VERIFY_PER_HOST = int(os.getenv('SUPPLIER_VERIFY_PER_HOST', '2'))
+SUPPLIER_VERIFY_DEADLINE = float(os.getenv('SUPPLIER_VERIFY_DEADLINE', '15'))  # seconds for the whole batch
+_supplier_verify_executor = ThreadPoolExecutor(max_workers=SUPPLIER_VERIFY_WORKERS, thread_name_prefix='supplier-verify')
+_host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+_host_semaphores_lock = threading.Lock()
+
+def _host_semaphore(host: str) -> threading.BoundedSemaphore:
+    with _host_semaphores_lock:
+        semaphore = _host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(SUPPLIER_VERIFY_PER_HOST)
+            _host_semaphores[host] = semaphore
+        return semaphore
+
+def verify_suppliers_concurrently(suppliers: List[str], manufacturer: str, part_number: str,
+                                  deadline: float = SUPPLIER_VERIFY_DEADLINE) -> List[bool]:
+    """Run verify_supplier_has_component for several suppliers at once on a bounded pool.
+    
+    Returns one result per supplier, in the order given. Checks still running when the
+    deadline passes count as available, matching how a single timed-out check is treated.
+    Suppliers with a cached outcome are answered without touching the pool.
+    """
+    cached = [supplier_availability_cache.get(supplier, part_number) for supplier in suppliers]
+    futures = [None if hit is not None else
+               submit_in_context(_supplier_verify_executor, verify_supplier_has_component,
+                                 supplier, manufacturer, part_number, False)
+               for supplier, hit in zip(suppliers, cached)]
+    pending = [future for future in futures if future is not None]
+    if pending:
+        wait(pending, timeout=deadline)
+    results = []
+    for supplier, hit, future in zip(suppliers, cached, futures):
+        if hit is not None:
+            results.append(hit)
+        elif future.done():
+            results.append(future.result())
+        else:
+            print(f"Verification of {supplier} for {part_number} missed the {deadline}s deadline - assuming available")
+            results.append(True)
+    return results
 
 def analyze_bom_data(bom: Any) -> Dict[str, Any]:
     """Analyze BOM data and extract statistics."""
@@ -416,45 +2094,27 @@ def analyze_bom_data(bom: Any) -> Dict[str, Any]:
         'summary': ''
     }
     try:
-        if isinstance(bom, str):
-            try:
-                bom_data = json.loads(bom)
-            except Exception:
-                bom_data = parse_csv_data(bom)
-        else:
-            bom_data = bom
-        if isinstance(bom_data, list) and bom_data:
-            analysis['componentCount'] = len(bom_data)
+        parsed_bom = ParsedBOM.from_input(bom)
+        if parsed_bom.rows:
+            analysis['componentCount'] = len(parsed_bom.rows)
             max_lead_time = 0
-            for item in bom_data:
-                # Calculate total cost per component
-                component_total_cost = 0
-                
+            for item in parsed_bom.items:
                 # First try to use pre-calculated Total column
-                if 'Total' in item and item['Total']:
-                    try:
-                        component_total_cost = float(item['Total'] or 0)
-                    except (ValueError, TypeError):
-                        component_total_cost = 0
+                component_total_cost = item.total or 0
                 
                 # If no Total column, calculate from Unit Cost × Quantity
-                if component_total_cost == 0 and 'Unit Cost (USD)' in item:
-                    try:
-                        unit_cost = float(item.get('Unit Cost (USD)', 0) or 0)
-                        quantity = float(item.get('Quantity', 1) or 1)
-                        component_total_cost = unit_cost * quantity
-                    except (ValueError, TypeError):
-                        component_total_cost = 0
+                if component_total_cost == 0 and item.unit_cost:
+                    component_total_cost = item.unit_cost * (item.quantity or 1)
                 
                 # Add to total BOM cost
                 analysis['totalCost'] += component_total_cost
                 
-                if item.get('Supplier'):
-                    analysis['suppliers'].add(item['Supplier'])
-                    lead_time = estimate_lead_time(item['Supplier'], item)  # Pass the BOM item
+                if item.supplier:
+                    analysis['suppliers'].add(item.supplier)
+                    lead_time = estimate_lead_time(item.supplier, item.row)  # Pass the BOM item
                     max_lead_time = max(max_lead_time, lead_time)
-                if item.get('Manufacturer'):
-                    analysis['manufacturers'].add(item['Manufacturer'])
+                if item.manufacturer:
+                    analysis['manufacturers'].add(item.manufacturer)
             analysis['estimatedLeadTime'] = max_lead_time
             analysis['summary'] = (
                 f"BOM Analysis: {analysis['componentCount']} components, "
@@ -493,11 +2153,10 @@ def extract_lead_time(supplier_info: Any) -> Optional[int]:
 
 def format_bom_as_markdown(bom: Any) -> str:
     """Format BOM data as a markdown table."""
+    parsed_bom = ParsedBOM.from_input(bom)
     try:
-        if isinstance(bom, str):
-            bom_array = json.loads(bom)
-        else:
-            bom_array = bom
+        # CSV input is already tabular text and is passed through unchanged
+        bom_array = parsed_bom.data if parsed_bom.source_format != 'csv' else None
         if isinstance(bom_array, list) and bom_array and isinstance(bom_array[0], dict):
             headers = list(bom_array[0].keys())
             header_row = '| ' + ' | '.join(headers) + ' |'
@@ -506,7 +2165,7 @@ def format_bom_as_markdown(bom: Any) -> str:
             return '\n'.join([header_row, sep_row] + data_rows)
     except Exception as e:
         print('BOM markdown formatting error:', e)
-    return str(bom)
+    return str(parsed_bom.raw)
 
 def markdown_to_html_table(md: str) -> str:
     """Convert markdown to HTML and add target='_blank' to all links."""
@@ -573,24 +2232,32 @@ def make_anthropic_request(prompt: str, max_tokens: int, model: str, max_retries
     print(f"Making Anthropic request with API key: {ANTHROPIC_API_KEY[:20]}..." if ANTHROPIC_API_KEY else "No API key found!")
     print(f"Model: {model} | Max tokens: {max_tokens} | Timeout: {base_timeout}s | Retries: {max_retries}")
     
+    schedule = RetrySchedule(max_retries, base_timeout)
     last_exception = None
     
     for attempt in range(max_retries + 1):
+        current_timeout = schedule.start_attempt()
         try:
-            current_timeout = base_timeout + (attempt * 60)
-            print(f"Anthropic API attempt {attempt + 1}/{max_retries + 1} with timeout: {current_timeout}s")
-            
-            # Anthropic SDK doesn't accept timeout in create() - use client-level timeout via requests
-            # The timeout is handled at the HTTP client level
-            message = anthropic_client.messages.create(
-                model=model,
-                max_tokens=max_tokens,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
+            print(f"Anthropic API attempt {attempt + 1}/{max_retries + 1} with timeout: {current_timeout:.0f}s")
             
-            result = message.content[0].text if message.content else ""
+            with model_rate_governor.lease('anthropic', model, prompt, max_tokens) as lease:
+                _note_llm_attempt()
+                raw = anthropic_client.messages.with_raw_response.create(
+                    model=model,
+                    max_tokens=max_tokens,
+                    messages=[
+                        {"role": "user", "content": prompt}
+                    ],
+                    timeout=current_timeout
+                )
+                lease.observe(raw.headers)
+                message = raw.parse()
+                
+                result = message.content[0].text if message.content else ""
+                usage = getattr(message, 'usage', None)
+                if usage is not None:
+                    _note_llm_usage(getattr(usage, 'input_tokens', None), getattr(usage, 'output_tokens', None))
+                    lease.used(getattr(usage, 'input_tokens', None), getattr(usage, 'output_tokens', None))
             result_len = len(result) if result else 0
             print(f"Anthropic API response received successfully, length: {result_len} characters")
             if not result or result_len == 0:
@@ -603,14 +2270,14 @@ def make_anthropic_request(prompt: str, max_tokens: int, model: str, max_retries
             
             # Check if it's a timeout or connection error (retry-able)
             if "timeout" in error_str.lower() or "connection" in error_str.lower() or "unavailable" in error_str.lower():
-                if attempt < max_retries:
-                    wait_time = 2 ** attempt  # Exponential backoff
+                wait_time = schedule.backoff(attempt)
+                if wait_time is not None:
                     print(f"Anthropic API timeout/connection error (attempt {attempt + 1}): {error_str}")
-                    print(f"Retrying in {wait_time} seconds...")
-                    time.sleep(wait_time)
+                    print(f"Retrying in {wait_time:.1f} seconds...")
+                    schedule.sleep(wait_time)
                     continue
                 else:
-                    print(f"Anthropic API failed after {max_retries + 1} attempts due to timeout/connection issues")
+                    print(f"Anthropic API failed after {attempt + 1} attempts due to timeout/connection issues")
                     break
             else:
                 # Don't retry on other errors (API errors, auth errors, etc.)
@@ -621,7 +2288,7 @@ def make_anthropic_request(prompt: str, max_tokens: int, model: str, max_retries
     print(f"Anthropic API request failed after all retry attempts: {str(last_exception)}")
     raise last_exception
 
-def make_openai_request(prompt: str, max_tokens: int = 500, max_retries: int = None, base_timeout: int = None, mode: str = None) -> str:
+def make_openai_request(prompt: str, max_tokens: int = 500, max_retries: int = None, base_timeout: int = None, mode: str = None, endpoint: str = None) -> str:
     """
     Send a prompt to the AI API (OpenAI or Anthropic) and return the response content.
     Routes to the appropriate provider based on the model configuration.
@@ -633,6 +2300,7 @@ def make_openai_request(prompt: str, max_tokens: int = 500, max_retries: int = N
         max_retries: Maximum number of retry attempts (uses config default if None)
         base_timeout: Base timeout in seconds (uses config default if None)
         mode: 'comprehensive' (GPT-5/Claude), 'comprehensive-claude' (Claude Sonnet 4.5), or 'fast' (GPT-4). Uses DEFAULT_MODE if None.
+        endpoint: Calling endpoint name; selects the response cache TTL from LLM_CACHE_TTLS (no caching if None)
     
     Returns:
         Response content from the AI API
@@ -641,105 +2309,720 @@ def make_openai_request(prompt: str, max_tokens: int = 500, max_retries: int = N
         requests.exceptions.RequestException: If all retry attempts fail (OpenAI)
         Exception: If all retry attempts fail (Anthropic)
     """
+    mode, max_retries, base_timeout = _resolve_model_call(mode, max_retries, base_timeout)
+    
+    with llm_metrics.track(endpoint, mode, prompt) as call:
+        # Serve repeated prompts from the response cache
+        cache_key, cache_ttl, cached = _lookup_cached_response(prompt, max_tokens, mode, endpoint)
+        if cached is not None:
+            call.cache_hit = True
+            return cached
+        
+        result = _request_model_with_failover(prompt, max_tokens, max_retries, base_timeout, mode)
+        call.completion_chars = len(result)
+    if cache_key:
+        llm_response_cache.set(cache_key, result, cache_ttl)
+    return result
+
+def _resolve_model_call(mode: Optional[str], max_retries: Optional[int], base_timeout: Optional[int]) -> tuple:
+    """Resolve the model mode and fill retry/timeout defaults from MODEL_CONFIGS."""
     # Determine which model configuration to use
-    if mode is None:
-        mode = DEFAULT_MODE
-    if mode not in MODEL_CONFIGS:
+    if mode is None or mode not in MODEL_CONFIGS:
         mode = DEFAULT_MODE
-    
     config = MODEL_CONFIGS[mode]
-    model = config['model']
-    provider = config.get('provider', 'openai')
-    token_param = config['token_param']
-    token_multiplier = config['token_multiplier']
     
     # Use configuration defaults if not specified
     if max_retries is None:
         max_retries = config['max_retries']
     if base_timeout is None:
         base_timeout = config['timeout']
-    
+    return mode, max_retries, base_timeout
+
+def _lookup_cached_response(prompt: str, max_tokens: int, mode: str, endpoint: Optional[str]) -> tuple:
+    """Return (cache_key, ttl, cached_response) for a call; cache_key is None when the endpoint is not cached."""
+    cache_ttl = LLM_CACHE_TTLS.get(endpoint, 0) if endpoint else 0
+    if cache_ttl <= 0:
+        return None, 0, None
+    config = MODEL_CONFIGS[mode]
     # Adjust tokens based on model (GPT-5 needs more for reasoning)
+    adjusted_tokens = int(max_tokens * config['token_multiplier'])
+    cache_key = LLMResponseCache.make_key(mode, config['model'], prompt, adjusted_tokens)
+    cached = llm_response_cache.get(cache_key, endpoint)
+    if cached is not None:
+        print(f"LLM cache hit for {endpoint} (mode: {mode}, model: {config['model']}, {len(cached)} characters)")
+    return cache_key, cache_ttl, cached
+
+def _request_model(prompt: str, max_tokens: int, max_retries: int, base_timeout: int, mode: str) -> str:
+    """Send a prompt to the provider configured for a (resolved) mode, with retries but no caching."""
+    config = MODEL_CONFIGS[mode]
+    model = config['model']
+    provider = config.get('provider', 'openai')
+    token_param = config['token_param']
+    token_multiplier = config['token_multiplier']
     adjusted_tokens = int(max_tokens * token_multiplier)
     
     # Route to appropriate provider
     if provider == 'anthropic':
         return make_anthropic_request(prompt, adjusted_tokens, model, max_retries, base_timeout)
     
-    # OpenAI provider (default)
+    # OpenAI provider (default)
+    if not OPENAI_API_KEY:
+        raise Exception("OPENAI_API_KEY not found in environment variables.")
+        
+    print(f"Making OpenAI request with API key: {OPENAI_API_KEY[:20]}..." if OPENAI_API_KEY else "No API key found!")
+    print(f"Mode: {mode} | Model: {model} | Base tokens: {max_tokens} | Multiplier: {token_multiplier} | Adjusted tokens: {adjusted_tokens} | Timeout: {base_timeout}s | Retries: {max_retries}")
+    
+    headers = {
+        'Content-Type': 'application/json',
+        'Authorization': f'Bearer {OPENAI_API_KEY}'
+    }
+    data = {
+        'model': model,
+        'messages': [{'role': 'user', 'content': prompt}]
+    }
+    data[token_param] = adjusted_tokens
+    
+    schedule = RetrySchedule(max_retries, base_timeout)
+    last_exception = None
+    
+    for attempt in range(max_retries + 1):
+        # Attempts share one budget per call rather than each getting a longer timeout
+        current_timeout = schedule.start_attempt()
+        try:
+            print(f"OpenAI API attempt {attempt + 1}/{max_retries + 1} with timeout: {current_timeout:.0f}s")
+            
+            with model_rate_governor.lease('openai', model, prompt, adjusted_tokens) as lease:
+                _note_llm_attempt()
+                resp = get_llm_session().post(OPENAI_API_URL, headers=headers, json=data, timeout=current_timeout)
+                print(f"OpenAI API response status: {resp.status_code}")
+                lease.observe(resp.headers)
+                resp.raise_for_status()
+                
+                body = resp.json()
+                usage = body.get('usage') or {}
+                _note_llm_usage(usage.get('prompt_tokens'), usage.get('completion_tokens'))
+                lease.used(usage.get('prompt_tokens'), usage.get('completion_tokens'))
+            result = body['choices'][0]['message']['content']
+            result_len = len(result) if result else 0
+            print(f"OpenAI API response received successfully, length: {result_len} characters")
+            if not result or result_len == 0:
+                print(f"WARNING: Empty response from OpenAI. Full response: {resp.json()}")
+            return result if result else ""
+            
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            last_exception = e
+            wait_time = schedule.backoff(attempt)
+            if wait_time is not None:
+                print(f"OpenAI API timeout/connection error (attempt {attempt + 1}): {str(e)}")
+                print(f"Retrying in {wait_time:.1f} seconds...")
+                schedule.sleep(wait_time)
+                continue
+            else:
+                print(f"OpenAI API failed after {attempt + 1} attempts due to timeout/connection issues")
+                break
+                
+        except requests.exceptions.HTTPError as e:
+            retry_after = _rate_limit_retry_delay(e)
+            if retry_after is not None and schedule.can_retry(attempt):
+                # Rate limited: the governor holds the next attempt until Retry-After has passed
+                last_exception = e
+                print(f"OpenAI API rate limited (attempt {attempt + 1}); retrying after {retry_after:.1f}s")
+                continue
+            # Don't retry on other HTTP errors (4xx, 5xx) - these are usually permanent
+            print(f"OpenAI API HTTP error: {str(e)}")
+            if hasattr(e, 'response') and e.response is not None:
+                print(f"Response status: {e.response.status_code}")
+                print(f"Response content: {e.response.text}")
+            raise
+            
+        except requests.exceptions.RequestException as e:
+            last_exception = e
+            wait_time = schedule.backoff(attempt)
+            if wait_time is not None:
+                print(f"OpenAI API request error (attempt {attempt + 1}): {str(e)}")
+                print(f"Retrying in {wait_time:.1f} seconds...")
+                schedule.sleep(wait_time)
+                continue
+            else:
+                print(f"OpenAI API failed after {attempt + 1} attempts")
+                break
+    
+    # If we get here, all retries failed
+    print(f"OpenAI API request failed after all retry attempts: {str(last_exception)}")
+    if hasattr(last_exception, 'response') and last_exception.response is not None:
+        print(f"Final response status: {last_exception.response.status_code}")
+        print(f"Final response content: {last_exception.response.text}")
+    raise last_exception
+
+# --- Async LLM Client ---
+# Async endpoints await these instead of the blocking functions above, so a slow model
+# call no longer pins a threadpool worker. httpx clients are bound to the event loop that
+# created them, so one pooled client is kept per running loop. The maps hold the loops weakly,
+# so a client goes away with its loop and is never handed to a new loop that reuses its id.
+_async_llm_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_async_anthropic_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+
+def get_async_llm_client() -> httpx.AsyncClient:
+    """Return the pooled async HTTP client for the current event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_llm_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(http2=HTTP2_AVAILABLE, limits=_llm_httpx_limits())
+        _async_llm_clients[loop] = client
+    return client
+
+def get_async_anthropic_client() -> Any:
+    """Return the async Anthropic client for the current event loop (None if Claude is unavailable)."""
+    if not anthropic_client or AsyncAnthropic is None:
+        return None
+    loop = asyncio.get_running_loop()
+    client = _async_anthropic_clients.get(loop)
+    if client is None:
+        http_client = httpx.AsyncClient(http2=HTTP2_AVAILABLE, limits=_llm_httpx_limits())
+        client = AsyncAnthropic(api_key=ANTHROPIC_API_KEY, http_client=http_client)
+        _async_anthropic_clients[loop] = client
+    return client
+
+async def close_async_llm_clients() -> None:
+    """Close the async clients owned by the current event loop (called on shutdown)."""
+    loop = asyncio.get_running_loop()
+    client = _async_llm_clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
+    anthropic_async = _async_anthropic_clients.pop(loop, None)
+    if anthropic_async is not None:
+        await anthropic_async.close()
+
+async def make_anthropic_request_async(prompt: str, max_tokens: int, model: str, max_retries: int, base_timeout: int) -> str:
+    """Async counterpart of make_anthropic_request with the same retry behaviour."""
+    client = get_async_anthropic_client()
+    if not client:
+        raise Exception("Anthropic API client not initialized. Please install anthropic package and set ANTHROPIC_API_KEY.")
+    
+    print(f"Model: {model} | Max tokens: {max_tokens} | Timeout: {base_timeout}s | Retries: {max_retries} (async)")
+    
+    schedule = RetrySchedule(max_retries, base_timeout)
+    last_exception = None
+    
+    for attempt in range(max_retries + 1):
+        current_timeout = schedule.start_attempt()
+        try:
+            print(f"Anthropic API attempt {attempt + 1}/{max_retries + 1} with timeout: {current_timeout:.0f}s (async)")
+            
+            async with model_rate_governor.lease_async('anthropic', model, prompt, max_tokens) as lease:
+                _note_llm_attempt()
+                raw = await client.messages.with_raw_response.create(
+                    model=model,
+                    max_tokens=max_tokens,
+                    messages=[
+                        {"role": "user", "content": prompt}
+                    ],
+                    timeout=current_timeout
+                )
+                lease.observe(raw.headers)
+                message = raw.parse()
+                
+                result = message.content[0].text if message.content else ""
+                usage = getattr(message, 'usage', None)
+                if usage is not None:
+                    _note_llm_usage(getattr(usage, 'input_tokens', None), getattr(usage, 'output_tokens', None))
+                    lease.used(getattr(usage, 'input_tokens', None), getattr(usage, 'output_tokens', None))
+            print(f"Anthropic API response received successfully, length: {len(result)} characters")
+            if not result:
+                print(f"WARNING: Empty response from Anthropic")
+            return result
+            
+        except Exception as e:
+            last_exception = e
+            error_str = str(e)
+            
+            # Check if it's a timeout or connection error (retry-able)
+            if "timeout" in error_str.lower() or "connection" in error_str.lower() or "unavailable" in error_str.lower():
+                wait_time = schedule.backoff(attempt)
+                if wait_time is not None:
+                    print(f"Anthropic API timeout/connection error (attempt {attempt + 1}): {error_str}")
+                    print(f"Retrying in {wait_time:.1f} seconds...")
+                    await schedule.sleep_async(wait_time)
+                    continue
+                else:
+                    print(f"Anthropic API failed after {attempt + 1} attempts due to timeout/connection issues")
+                    break
+            else:
+                # Don't retry on other errors (API errors, auth errors, etc.)
+                print(f"Anthropic API error: {error_str}")
+                raise
+    
+    print(f"Anthropic API request failed after all retry attempts: {str(last_exception)}")
+    raise last_exception
+
+async def make_openai_request_async(prompt: str, max_tokens: int = 500, max_retries: int = None, base_timeout: int = None, mode: str = None, endpoint: str = None) -> str:
+    """
+    Async counterpart of make_openai_request: same routing, caching and retry rules,
+    but awaits the provider so the calling worker is free while the model runs.
+    """
+    mode, max_retries, base_timeout = _resolve_model_call(mode, max_retries, base_timeout)
+    
+    with llm_metrics.track(endpoint, mode, prompt) as call:
+        cache_key, cache_ttl, cached = _lookup_cached_response(prompt, max_tokens, mode, endpoint)
+        if cached is not None:
+            call.cache_hit = True
+            return cached
+        
+        result = await _request_model_routed_async(prompt, max_tokens, max_retries, base_timeout, mode, endpoint)
+        call.completion_chars = len(result)
+    if cache_key:
+        llm_response_cache.set(cache_key, result, cache_ttl)
+    return result
+
+async def _request_model_async(prompt: str, max_tokens: int, max_retries: int, base_timeout: int, mode: str) -> str:
+    """Async counterpart of _request_model."""
+    config = MODEL_CONFIGS[mode]
+    model = config['model']
+    provider = config.get('provider', 'openai')
+    token_param = config['token_param']
+    adjusted_tokens = int(max_tokens * config['token_multiplier'])
+    
+    if provider == 'anthropic':
+        return await make_anthropic_request_async(prompt, adjusted_tokens, model, max_retries, base_timeout)
+    
+    if not OPENAI_API_KEY:
+        raise Exception("OPENAI_API_KEY not found in environment variables.")
+    
+    print(f"Mode: {mode} | Model: {model} | Adjusted tokens: {adjusted_tokens} | Timeout: {base_timeout}s | Retries: {max_retries} (async)")
+    
+    headers = {
+        'Content-Type': 'application/json',
+        'Authorization': f'Bearer {OPENAI_API_KEY}'
+    }
+    data = {
+        'model': model,
+        'messages': [{'role': 'user', 'content': prompt}]
+    }
+    data[token_param] = adjusted_tokens
+    
+    client = get_async_llm_client()
+    schedule = RetrySchedule(max_retries, base_timeout)
+    last_exception = None
+    
+    for attempt in range(max_retries + 1):
+        current_timeout = schedule.start_attempt()
+        try:
+            print(f"OpenAI API attempt {attempt + 1}/{max_retries + 1} with timeout: {current_timeout:.0f}s (async)")
+            
+            async with model_rate_governor.lease_async('openai', model, prompt, adjusted_tokens) as lease:
+                _note_llm_attempt()
+                resp = await client.post(OPENAI_API_URL, headers=headers, json=data, timeout=current_timeout)
+                print(f"OpenAI API response status: {resp.status_code}")
+                lease.observe(resp.headers)
+                resp.raise_for_status()
+                
+                body = resp.json()
+                usage = body.get('usage') or {}
+                _note_llm_usage(usage.get('prompt_tokens'), usage.get('completion_tokens'))
+                lease.used(usage.get('prompt_tokens'), usage.get('completion_tokens'))
+            result = body['choices'][0]['message']['content']
+            print(f"OpenAI API response received successfully, length: {len(result) if result else 0} characters")
+            if not result:
+                print(f"WARNING: Empty response from OpenAI. Full response: {resp.json()}")
+            return result if result else ""
+            
+        except httpx.HTTPStatusError as e:
+            retry_after = _rate_limit_retry_delay(e)
+            if retry_after is not None and schedule.can_retry(attempt):
+                # Rate limited: the governor holds the next attempt until Retry-After has passed
+                last_exception = e
+                print(f"OpenAI API rate limited (attempt {attempt + 1}); retrying after {retry_after:.1f}s (async)")
+                continue
+            # Don't retry on other HTTP errors (4xx, 5xx) - these are usually permanent
+            print(f"OpenAI API HTTP error: {str(e)}")
+            print(f"Response content: {e.response.text}")
+            raise
+            
+        except httpx.RequestError as e:
+            # Timeouts, connection failures and other transport errors are retried
+            last_exception = e
+            wait_time = schedule.backoff(attempt)
+            if wait_time is not None:
+                print(f"OpenAI API request error (attempt {attempt + 1}): {type(e).__name__}: {str(e)}")
+                print(f"Retrying in {wait_time:.1f} seconds...")
+                await schedule.sleep_async(wait_time)
+                continue
+            print(f"OpenAI API failed after {attempt + 1} attempts")
+            break
+    
+    print(f"OpenAI API request failed after all retry attempts: {str(last_exception)}")
+    raise last_exception
+
+# --- Provider Failover and Hedging ---
+# 'comprehensive' (OpenAI) and 'comprehensive-claude' (Anthropic) name each other as
+# 'failover_mode' in MODEL_CONFIGS. When the provider for the requested mode answers 429 or
+# 5xx, or still cannot be reached after its retries, the call goes to the other provider
+# straight away. Async calls are also hedged: if the first provider has not answered within
+# the LLM_HEDGE_PERCENTILE latency seen for that mode and endpoint, the same prompt goes to
+# the other provider too, the first answer wins and the slower request is cancelled. So
+# only the slowest few percent of calls pay for a second request.
+LLM_FAILOVER_ENABLED = os.getenv('LLM_FAILOVER_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+LLM_HEDGE_ENABLED = os.getenv('LLM_HEDGE_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+LLM_HEDGE_PERCENTILE = float(os.getenv('LLM_HEDGE_PERCENTILE', '95'))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv('LLM_HEDGE_MIN_SAMPLES', '20'))
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv('LLM_HEDGE_DEFAULT_DELAY', '120'))  # seconds, until enough samples exist
+LLM_HEDGE_MIN_DELAY = float(os.getenv('LLM_HEDGE_MIN_DELAY', '10'))  # seconds
+LLM_HEDGE_WINDOW = 200  # latency samples kept per mode and per (mode, endpoint)
+
+def _mode_available(mode: str) -> bool:
+    """Whether the provider behind a mode is configured in this process."""
+    config = MODEL_CONFIGS.get(mode)
+    if not config:
+        return False
+    if config.get('provider', 'openai') == 'anthropic':
+        return anthropic_client is not None
+    return bool(OPENAI_API_KEY)
+
+def failover_mode(mode: str) -> Optional[str]:
+    """The configured, available alternate for a mode, or None."""
+    if not LLM_FAILOVER_ENABLED:
+        return None
+    alternate = MODEL_CONFIGS.get(mode, {}).get('failover_mode')
+    return alternate if alternate and _mode_available(alternate) else None
+
+def _is_failover_error(error: BaseException) -> bool:
+    """429 and 5xx answers and exhausted connection/timeout retries; other 4xx errors are the caller's fault."""
+    status = getattr(error, 'status_code', None)
+    response = getattr(error, 'response', None)
+    if status is None and response is not None:
+        status = getattr(response, 'status_code', None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    if isinstance(error, (httpx.TransportError, requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    error_name = type(error).__name__.lower()
+    return 'timeout' in error_name or 'connection' in error_name
+
+def _note_llm_route(route: str, mode: str, call: Optional[LLMCallRecord] = None) -> None:
+    """Record which mode actually answered a call ('failover' or 'hedge' when it was not the requested one)."""
+    call = call or _active_llm_call.get()
+    if call is not None:
+        config = MODEL_CONFIGS[mode]
+        call.route = route
+        call.model = config['model']
+        call.provider = config.get('provider', 'openai')
+
+class ProviderLatencyTracker:
+    """Recent successful provider latencies, used to pick the hedging delay."""
+    
+    def __init__(self, window: int = LLM_HEDGE_WINDOW):
+        self.window = window
+        self._samples: Dict[tuple, deque] = {}
+        self._lock = threading.Lock()
+    
+    def record(self, mode: str, endpoint: Optional[str], seconds: float) -> None:
+        with self._lock:
+            for key in ((mode, None), (mode, endpoint)):
+                self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+    
+    def hedge_delay(self, mode: str, endpoint: Optional[str], timeout: float) -> float:
+        """LLM_HEDGE_PERCENTILE latency for (mode, endpoint), else for the mode, clamped below the timeout."""
+        with self._lock:
+            samples = self._samples.get((mode, endpoint)) or ()
+            if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+                samples = self._samples.get((mode, None)) or ()
+            samples = list(samples)
+        if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            delay = LLM_HEDGE_DEFAULT_DELAY
+        else:
+            delay = float(np.percentile(samples, LLM_HEDGE_PERCENTILE))
+        return min(max(delay, LLM_HEDGE_MIN_DELAY), timeout)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            items = [(key, list(samples)) for key, samples in self._samples.items()]
+        return {
+            f"{mode}:{endpoint or '*'}": {
+                'samples': len(samples),
+                'p50_ms': round(float(np.percentile(samples, 50)) * 1000, 1),
+                'p95_ms': round(float(np.percentile(samples, 95)) * 1000, 1),
+            }
+            for (mode, endpoint), samples in items if samples
+        }
+
+provider_latency = ProviderLatencyTracker()
+
+def _request_model_with_failover(prompt: str, max_tokens: int, max_retries: int, base_timeout: int, mode: str) -> str:
+    """_request_model, retried once on the failover mode after a 429/5xx or exhausted retries."""
+    try:
+        return _request_model(prompt, max_tokens, max_retries, base_timeout, mode)
+    except Exception as e:
+        alternate = failover_mode(mode)
+        if alternate is None or not _is_failover_error(e):
+            raise
+        print(f"Failing over from {mode} to {alternate} after error: {type(e).__name__}: {e}")
+        _note_llm_route('failover', alternate)
+        alternate, alt_retries, alt_timeout = _resolve_model_call(alternate, None, None)
+        return _request_model(prompt, max_tokens, alt_retries, alt_timeout, alternate)
+
+async def _timed_request_async(prompt: str, max_tokens: int, max_retries: int, base_timeout: int, mode: str,
+                               endpoint: Optional[str]) -> str:
+    started = time.time()
+    result = await _request_model_async(prompt, max_tokens, max_retries, base_timeout, mode)
+    provider_latency.record(mode, endpoint, time.time() - started)
+    return result
+
+async def _request_model_routed_async(prompt: str, max_tokens: int, max_retries: int, base_timeout: int, mode: str,
+                                      endpoint: Optional[str]) -> str:
+    """Async request with immediate failover and, past the hedging delay, a hedged request to the failover mode."""
+    alternate = failover_mode(mode)
+    if alternate is None:
+        return await _timed_request_async(prompt, max_tokens, max_retries, base_timeout, mode, endpoint)
+    _, alt_retries, alt_timeout = _resolve_model_call(alternate, None, None)
+    
+    started = time.time()
+    primary = asyncio.create_task(_timed_request_async(prompt, max_tokens, max_retries, base_timeout, mode, endpoint))
+    pending = {primary}
+    try:
+        delay = provider_latency.hedge_delay(mode, endpoint, base_timeout) if LLM_HEDGE_ENABLED else None
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if primary in done:
+            pending.clear()
+            error = primary.exception()
+            if error is None:
+                return primary.result()
+            if not _is_failover_error(error):
+                raise error
+            print(f"Failing over from {mode} to {alternate} after error: {type(error).__name__}: {error}")
+            _note_llm_route('failover', alternate)
+            return await _timed_request_async(prompt, max_tokens, alt_retries, alt_timeout, alternate, endpoint)
+        
+        print(f"{mode} has not answered after {delay:.1f}s; hedging with {alternate}")
+        hedge = asyncio.create_task(_timed_request_async(prompt, max_tokens, alt_retries, alt_timeout, alternate, endpoint))
+        pending.add(hedge)
+        current_span().set(**{'llm.hedged': True, 'llm.hedge_delay_s': round(delay, 1)})
+        first_error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    winner = mode if task is primary else alternate
+                    print(f"Hedged call answered by {winner} after {time.time() - started:.1f}s")
+                    if task is hedge:
+                        _note_llm_route('hedge', alternate)
+                        # The primary was cut short, so its elapsed time is only a lower bound on its latency
+                        provider_latency.record(mode, endpoint, time.time() - started)
+                    return task.result()
+                first_error = first_error or task.exception()
+        raise first_error
+    finally:
+        for task in pending:
+            task.cancel()
+
+# --- Streaming Responses ---
+# Long completions (disruption analysis, explanations, mitigation plans) can be streamed to
+# the browser over Server-Sent Events instead of waiting minutes for the full response.
+
+async def stream_model_response_async(prompt: str, max_tokens: int, mode: str = None, endpoint: str = None) -> AsyncIterator[str]:
+    """
+    Yield response text chunks as the model produces them.
+    
+    Cached responses are yielded as a single chunk and completed streams are stored in the
+    response cache, so streaming and non-streaming calls share cache entries. Streams are
+    not retried: once tokens have been forwarded a retry would duplicate output. A 429/5xx
+    before the first chunk fails over to the mode's 'failover_mode'.
+    """
+    mode, _, base_timeout = _resolve_model_call(mode, 0, None)
+    
+    cache_key, cache_ttl, cached = _lookup_cached_response(prompt, max_tokens, mode, endpoint)
+    if cached is not None:
+        with llm_metrics.track(endpoint, mode, prompt, streamed=True) as call:
+            call.cache_hit = True
+        yield cached
+        return
+    
+    parts = []
+    with llm_metrics.track(endpoint, mode, prompt, streamed=True) as call:
+        stream_mode, timeout = mode, base_timeout
+        while True:
+            config = MODEL_CONFIGS[stream_mode]
+            adjusted_tokens = int(max_tokens * config['token_multiplier'])
+            _note_llm_attempt(call)
+            if config.get('provider', 'openai') == 'anthropic':
+                chunks = _stream_anthropic_async(prompt, adjusted_tokens, config['model'], timeout, call)
+            else:
+                chunks = _stream_openai_async(prompt, adjusted_tokens, config, timeout, call)
+            
+            try:
+                async for text in chunks:
+                    parts.append(text)
+                    call.completion_chars += len(text)
+                    yield text
+                break
+            except Exception as e:
+                # Fail over only before the first chunk; after that the client already has partial output
+                alternate = failover_mode(stream_mode) if stream_mode == mode else None
+                if parts or alternate is None or not _is_failover_error(e):
+                    raise
+                print(f"Stream failing over from {mode} to {alternate} after error: {type(e).__name__}: {e}")
+                _note_llm_route('failover', alternate, call)
+                stream_mode, timeout = alternate, MODEL_CONFIGS[alternate]['timeout']
+    
+    result = ''.join(parts)
+    print(f"Streamed response complete (mode: {mode}, {len(result)} characters)")
+    if cache_key and result:
+        llm_response_cache.set(cache_key, result, cache_ttl)
+
+async def _stream_openai_async(prompt: str, max_tokens: int, config: Dict[str, Any], timeout: int,
+                               call: Optional[LLMCallRecord] = None) -> AsyncIterator[str]:
+    """Yield content deltas from a streamed OpenAI chat completion."""
     if not OPENAI_API_KEY:
         raise Exception("OPENAI_API_KEY not found in environment variables.")
-        
-    print(f"Making OpenAI request with API key: {OPENAI_API_KEY[:20]}..." if OPENAI_API_KEY else "No API key found!")
-    print(f"Mode: {mode} | Model: {model} | Base tokens: {max_tokens} | Multiplier: {token_multiplier} | Adjusted tokens: {adjusted_tokens} | Timeout: {base_timeout}s | Retries: {max_retries}")
     
     headers = {
         'Content-Type': 'application/json',
         'Authorization': f'Bearer {OPENAI_API_KEY}'
     }
     data = {
-        'model': model,
-        'messages': [{'role': 'user', 'content': prompt}]
+        'model': config['model'],
+        'messages': [{'role': 'user', 'content': prompt}],
+        'stream': True,
+        'stream_options': {'include_usage': True}
     }
-    data[token_param] = adjusted_tokens
-    
-    last_exception = None
+    data[config['token_param']] = max_tokens
     
-    for attempt in range(max_retries + 1):
-        try:
-            # Increase timeout with each retry attempt (GPT-5/GPT-4o needs longer timeouts for comprehensive analysis)
-            current_timeout = base_timeout + (attempt * 120)  # Increased from 60 to 120 seconds per retry
-            print(f"OpenAI API attempt {attempt + 1}/{max_retries + 1} with timeout: {current_timeout}s")
-            
-            resp = requests.post(OPENAI_API_URL, headers=headers, json=data, timeout=current_timeout)
-            print(f"OpenAI API response status: {resp.status_code}")
+    async with model_rate_governor.lease_async('openai', config['model'], prompt, max_tokens) as lease, \
+            get_async_llm_client().stream('POST', OPENAI_API_URL, headers=headers, json=data, timeout=timeout) as resp:
+        print(f"OpenAI API stream status: {resp.status_code}")
+        lease.observe(resp.headers)
+        if resp.status_code >= 400:
+            await resp.aread()
+            print(f"Response content: {resp.text}")
             resp.raise_for_status()
-            
-            result = resp.json()['choices'][0]['message']['content']
-            result_len = len(result) if result else 0
-            print(f"OpenAI API response received successfully, length: {result_len} characters")
-            if not result or result_len == 0:
-                print(f"WARNING: Empty response from OpenAI. Full response: {resp.json()}")
-            return result if result else ""
-            
-        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
-            last_exception = e
-            if attempt < max_retries:
-                wait_time = 2 ** attempt  # Exponential backoff: 1s, 2s, 4s
-                print(f"OpenAI API timeout/connection error (attempt {attempt + 1}): {str(e)}")
-                print(f"Retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
+        async for line in resp.aiter_lines():
+            if not line.startswith('data:'):
                 continue
-            else:
-                print(f"OpenAI API failed after {max_retries + 1} attempts due to timeout/connection issues")
+            payload = line[5:].strip()
+            if payload == '[DONE]':
                 break
-                
-        except requests.exceptions.HTTPError as e:
-            # Don't retry on HTTP errors (4xx, 5xx) - these are usually permanent
-            print(f"OpenAI API HTTP error: {str(e)}")
-            if hasattr(e, 'response') and e.response is not None:
-                print(f"Response status: {e.response.status_code}")
-                print(f"Response content: {e.response.text}")
-            raise
-            
-        except requests.exceptions.RequestException as e:
-            last_exception = e
-            if attempt < max_retries:
-                wait_time = 2 ** attempt
-                print(f"OpenAI API request error (attempt {attempt + 1}): {str(e)}")
-                print(f"Retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
-                continue
-            else:
-                print(f"OpenAI API failed after {max_retries + 1} attempts")
+            chunk = json.loads(payload)
+            usage = chunk.get('usage')
+            if usage:
+                _note_llm_usage(usage.get('prompt_tokens'), usage.get('completion_tokens'), call)
+                lease.used(usage.get('prompt_tokens'), usage.get('completion_tokens'))
+            choices = chunk.get('choices') or []
+            delta = choices[0].get('delta', {}).get('content') if choices else None
+            if delta:
+                yield delta
+
+async def _stream_anthropic_async(prompt: str, max_tokens: int, model: str, timeout: int,
+                                  call: Optional[LLMCallRecord] = None) -> AsyncIterator[str]:
+    """Yield text deltas from a streamed Anthropic message."""
+    client = get_async_anthropic_client()
+    if not client:
+        raise Exception("Anthropic API client not initialized. Please install anthropic package and set ANTHROPIC_API_KEY.")
+    
+    async with model_rate_governor.lease_async('anthropic', model, prompt, max_tokens) as lease, client.messages.stream(
+        model=model,
+        max_tokens=max_tokens,
+        messages=[
+            {"role": "user", "content": prompt}
+        ],
+        timeout=timeout
+    ) as stream:
+        lease.observe(getattr(getattr(stream, 'response', None), 'headers', None))
+        async for text in stream.text_stream:
+            yield text
+        usage = getattr(await stream.get_final_message(), 'usage', None)
+        if usage is not None:
+            _note_llm_usage(getattr(usage, 'input_tokens', None), getattr(usage, 'output_tokens', None), call)
+            lease.used(getattr(usage, 'input_tokens', None), getattr(usage, 'output_tokens', None))
+
+class IncrementalMarkdownRenderer:
+    """
+    Render a markdown stream to HTML as it arrives.
+    
+    Text is committed block by block: everything up to the last blank line outside a fenced
+    code block can no longer change and is rendered once. The unfinished tail is re-rendered
+    up to its last complete line whenever a new line arrives, so table rows show up as soon
+    as each row is complete.
+    """
+    
+    def __init__(self):
+        self._buffer = ''
+        self._last_tail = ''
+    
+    def feed(self, text: str) -> tuple:
+        """Add streamed text; returns (committed_html, pending_html).
+        
+        committed_html is new, final HTML to append (may be empty). pending_html replaces the
+        previously sent pending fragment, or is None when the tail has not changed.
+        """
+        self._buffer += text
+        committed = ''
+        boundary = self._block_boundary()
+        if boundary:
+            committed = markdown_to_html_table(self._buffer[:boundary])
+            self._buffer = self._buffer[boundary:]
+        
+        tail = self._buffer[:self._buffer.rfind('\n') + 1]
+        if tail == self._last_tail and not committed:
+            return committed, None
+        self._last_tail = tail
+        return committed, markdown_to_html_table(tail) if tail.strip() else ''
+    
+    def flush(self) -> str:
+        """Render whatever is left once the stream has ended."""
+        html = markdown_to_html_table(self._buffer) if self._buffer.strip() else ''
+        self._buffer = ''
+        self._last_tail = ''
+        return html
+    
+    def _block_boundary(self) -> int:
+        """Offset just past the last blank line outside a fenced code block (0 if none)."""
+        boundary = 0
+        in_fence = False
+        offset = 0
+        previous_blank = False
+        for line in self._buffer.splitlines(keepends=True):
+            if not line.endswith('\n'):
                 break
+            offset += len(line)
+            stripped = line.strip()
+            if stripped.startswith('```'):
+                in_fence = not in_fence
+            is_blank = not stripped
+            if is_blank and not in_fence and not previous_blank and offset > len(line):
+                boundary = offset
+            previous_blank = is_blank
+        return boundary
+
+async def stream_rendered_markdown(prompt: str, max_tokens: int, mode: str, endpoint: str,
+                                   render_final: Callable[[str], Dict[str, Any]]) -> AsyncIterator[tuple]:
+    """
+    Stream a completion as (event, data) pairs for Server-Sent Events.
     
-    # If we get here, all retries failed
-    print(f"OpenAI API request failed after all retry attempts: {str(last_exception)}")
-    if hasattr(last_exception, 'response') and last_exception.response is not None:
-        print(f"Final response status: {last_exception.response.status_code}")
-        print(f"Final response content: {last_exception.response.text}")
-    raise last_exception
+    Events: 'token' (raw text), 'html' (committed HTML to append), 'partial' (HTML for the
+    unfinished tail, replaces the previous partial), then 'result' with the same payload the
+    non-streaming endpoint returns, or 'error'.
+    """
+    renderer = IncrementalMarkdownRenderer()
+    parts = []
+    try:
+        async for text in stream_model_response_async(prompt, max_tokens, mode=mode, endpoint=endpoint):
+            parts.append(text)
+            yield 'token', {'text': text}
+            committed, pending = renderer.feed(text)
+            if committed:
+                yield 'html', {'html': committed}
+            if pending is not None:
+                yield 'partial', {'html': pending}
+        remainder = renderer.flush()
+        if remainder:
+            yield 'html', {'html': remainder}
+        yield 'result', render_final(''.join(parts))
+    except Exception as e:
+        print(f"Streaming error for {endpoint}: {str(e)}")
+        yield 'error', {'error': str(e)}
+
+def format_sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Serialize one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 def process_supplier_table(table_markdown: str, part_number: str) -> str:
     """Update supplier table markdown with working evaluation links."""
@@ -758,10 +3041,74 @@ def process_supplier_table(table_markdown: str, part_number: str) -> str:
             updated_lines.append(line)
     return '\n'.join(updated_lines)
 
+# --- Stage Scheduler ---
+# Independent, network-bound preparation stages (news, market data) run concurrently
+# before prompt assembly, so time to the first model call is the slowest stage rather
+# than the sum of all stages.
+PIPELINE_STAGE_DEADLINE = float(os.getenv('PIPELINE_STAGE_DEADLINE', '20'))  # seconds
+_stage_executor = ThreadPoolExecutor(max_workers=int(os.getenv('PIPELINE_STAGE_WORKERS', '8')),
+                                     thread_name_prefix='pipeline-stage')
+
+class StageRun:
+    """A set of stages started together and joined under one shared deadline."""
+    
+    def __init__(self, stages: Dict[str, tuple], deadline: float):
+        self._deadline_at = time.monotonic() + deadline
+        self._fallbacks = {name: fallback for name, (_, fallback) in stages.items()}
+        self._futures = {name: submit_in_context(_stage_executor, self._run_stage, name, fn)
+                         for name, (fn, _) in stages.items()}
+    
+    @staticmethod
+    def _run_stage(name: str, fn: Callable) -> Any:
+        raise_if_cancelled()  # skip stages of a request that was cancelled while they were queued
+        with trace_span(f"stage.{name}"):
+            return fn()
+    
+    def join(self) -> Dict[str, Any]:
+        """Wait for all stages until the deadline. Stages still running get their fallback
+        value; an exception raised by a stage propagates as if it had run inline. Raises
+        RequestCancelled as soon as the request is cancelled."""
+        futures = list(self._futures.values())
+        token = current_cancel_token()
+        while True:
+            remaining = max(0.0, self._deadline_at - time.monotonic())
+            _, pending = wait(futures, timeout=min(remaining, 0.5) if token is not None else remaining)
+            if token is not None:
+                token.raise_if_cancelled()
+            if not pending or remaining <= 0.5 or token is None:
+                break
+        results = {}
+        for name, future in self._futures.items():
+            if future.done():
+                results[name] = future.result()
+            else:
+                print(f"Stage '{name}' missed the shared deadline; continuing with its fallback")
+                results[name] = self._fallbacks[name]
+        return results
+
+def start_stages(stages: Dict[str, tuple], deadline: float = PIPELINE_STAGE_DEADLINE) -> StageRun:
+    """Start ``{name: (callable, fallback)}`` stages concurrently; call .join() for results."""
+    return StageRun(stages, deadline)
+
 # --- Endpoint Logic Wrappers ---
 def find_supplier(part_number: str) -> Dict[str, str]:
     """Find suppliers for a given part number using OpenAI."""
-    SUPPLIER_SEARCH_PROMPT = f'''Given the electronic component part number "{part_number}", find ALTERNATIVE electronic component suppliers that ACTUALLY SELL this specific part.
+    try:
+        response = make_openai_request(_build_find_supplier_prompt(part_number), 2000, endpoint='find_supplier')
+        return _render_find_supplier(response, part_number)
+    except Exception as e:
+        return {"error": str(e)}
+
+async def find_supplier_async(part_number: str) -> Dict[str, str]:
+    """Async variant of find_supplier for use from async endpoints."""
+    try:
+        response = await make_openai_request_async(_build_find_supplier_prompt(part_number), 2000, endpoint='find_supplier')
+        return _render_find_supplier(response, part_number)
+    except Exception as e:
+        return {"error": str(e)}
+
+def _build_find_supplier_prompt(part_number: str) -> str:
+    return f'''Given the electronic component part number "{part_number}", find ALTERNATIVE electronic component suppliers that ACTUALLY SELL this specific part.
 
 PART DESCRIPTION:
 [Provide a detailed description of the part, including its type, specifications, and typical applications. This should be 2-3 sentences.]
@@ -797,8 +3144,10 @@ IMPORTANT: All evaluation links should use the same URL pattern to direct users
 **REMEMBER**: Only suggest suppliers that would actually have this specific part number "{part_number}" in their catalog or inventory. Do not suggest generic suppliers that might not carry this exact component.
 
 Respond ONLY with the description and table in this exact format.'''
+
+def _render_find_supplier(response: str, part_number: str) -> Dict[str, str]:
+    """Turn the supplier-search model response into the HTML result payload."""
     try:
-        response = make_openai_request(SUPPLIER_SEARCH_PROMPT, 2000)
         parts = response.split('SUPPLIER TABLE:')
         description = ''
         table_markdown = ''
@@ -827,6 +3176,7 @@ Respond ONLY with the description and table in this exact format.'''
     except Exception as e:
         return {"error": str(e)}
 
+@traced()
 def get_current_real_disruptions() -> List[Dict[str, Any]]:
     """Fetch actual current supply chain disruptions from real news sources."""
     try:
@@ -835,52 +3185,28 @@ def get_current_real_disruptions() -> List[Dict[str, Any]]:
         headlines = news_result.get("headlines", [])
         
         # Extract disruption-related news
-        disruption_keywords = [
-            "shortage", "delay", "disruption", "strike", "closure", "shortage", 
-            "tariff", "ban", "sanction", "recall", "bankruptcy", "fire", "flood",
-            "earthquake", "cyberattack", "hack", "outage", "port", "shipping",
-            "supply chain", "manufacturing", "factory", "plant", "facility"
-        ]
+        disruption_headlines = [item for item in headlines
+                                if DISRUPTION_KEYWORD_MATCHER.matches(item.get("title", ""))][:10]
+        categories = DISRUPTION_TYPE_CLASSIFIER.classify_many(item.get("title", "") for item in disruption_headlines)
         
         real_disruptions = []
-        for item in headlines:
-            title = item.get("title", "").lower()
-            if any(keyword in title for keyword in disruption_keywords):
-                real_disruptions.append({
-                    "title": item.get("title", ""),
-                    "url": item.get("url", ""),
-                    "source": item.get("source", ""),
-                    "publishedAt": item.get("publishedAt", ""),
-                    "category": classify_disruption_type(item.get("title", ""))
-                })
+        for item, category in zip(disruption_headlines, categories):
+            real_disruptions.append({
+                "title": item.get("title", ""),
+                "url": item.get("url", ""),
+                "source": item.get("source", ""),
+                "publishedAt": item.get("publishedAt", ""),
+                "category": category
+            })
         
-        return real_disruptions[:10]  # Limit to top 10 most recent
+        return real_disruptions  # Limited to top 10 most recent
     except Exception as e:
         print(f"Error fetching real disruptions: {e}")
         return []
 
 def classify_disruption_type(title: str) -> str:
     """Classify the type of supply chain disruption based on title."""
-    title_lower = title.lower()
-    
-    if any(word in title_lower for word in ["tariff", "trade", "sanction", "ban"]):
-        return "Geopolitical/Trade"
-    elif any(word in title_lower for word in ["strike", "labor", "union", "worker"]):
-        return "Labor Issues"
-    elif any(word in title_lower for word in ["fire", "flood", "earthquake", "hurricane", "disaster"]):
-        return "Natural Disaster"
-    elif any(word in title_lower for word in ["cyber", "hack", "attack", "breach"]):
-        return "Cybersecurity"
-    elif any(word in title_lower for word in ["shortage", "allocation", "capacity"]):
-        return "Supply Shortage"
-    elif any(word in title_lower for word in ["port", "shipping", "logistics", "transport"]):
-        return "Transportation/Logistics"
-    elif any(word in title_lower for word in ["recall", "quality", "defect", "safety"]):
-        return "Quality/Safety"
-    elif any(word in title_lower for word in ["bankruptcy", "closure", "shutdown", "financial"]):
-        return "Supplier Financial"
-    else:
-        return "Market/Economic"
+    return DISRUPTION_TYPE_CLASSIFIER.classify(title)
 
 def format_real_disruptions_for_analysis(disruptions: List[Dict[str, Any]]) -> str:
     """Format real disruptions for inclusion in analysis prompt."""
@@ -931,6 +3257,50 @@ def disruption_analysis(bom: Any, kpi: Any, open_text: Any, mode: str = None) ->
         open_text: Additional user context
         mode: 'comprehensive' (GPT-5) or 'fast' (GPT-4). Uses DEFAULT_MODE if None.
     """
+    context = _prepare_disruption_analysis(bom, kpi, open_text)
+    try:
+        # Base tokens: 4000. Will be adjusted by model config (GPT-5: 8000, GPT-4: 4000)
+        markdown_table = make_openai_request(context['prompt'], 4000, mode=mode, endpoint='disruption_analysis')
+        return _render_disruption_analysis(context, markdown_table)
+    except Exception as e:
+        return {"error": str(e)}
+
+async def disruption_analysis_async(bom: Any, kpi: Any, open_text: Any, mode: str = None) -> Dict[str, str]:
+    """Async variant of disruption_analysis: context gathering runs in a worker thread, the model call is awaited."""
+    context = await asyncio.to_thread(_prepare_disruption_analysis, bom, kpi, open_text)
+    try:
+        markdown_table = await make_openai_request_async(context['prompt'], 4000, mode=mode, endpoint='disruption_analysis')
+        return _render_disruption_analysis(context, markdown_table)
+    except Exception as e:
+        return {"error": str(e)}
+
+async def disruption_analysis_stream(bom: Any, kpi: Any, open_text: Any, mode: str = None) -> AsyncIterator[tuple]:
+    """Streaming variant of disruption_analysis yielding (event, data) pairs for Server-Sent Events."""
+    yield 'status', {'stage': 'gathering_context'}
+    try:
+        context = await asyncio.to_thread(_prepare_disruption_analysis, bom, kpi, open_text)
+    except Exception as e:
+        yield 'error', {'error': str(e)}
+        return
+    yield 'status', {'stage': 'generating'}
+    async for event in stream_rendered_markdown(context['prompt'], 4000, mode, 'disruption_analysis',
+                                                lambda md: _render_disruption_analysis(context, md)):
+        yield event
+
+@traced()
+def _prepare_disruption_analysis(bom: Any, kpi: Any, open_text: Any) -> Dict[str, Any]:
+    """Gather BOM, KPI, news and market intelligence and build the disruption analysis prompt."""
+    # Parse the BOM once; every helper below reuses it
+    bom = ParsedBOM.from_input(bom)
+    
+    # Network-bound stages run concurrently while the local analyses below are computed
+    stages = start_stages({
+        # Get actual current supply chain disruptions
+        'real_disruptions': (get_current_real_disruptions, []),
+        # Generate current supply chain news context
+        'news_context': (lambda: generate_supply_chain_context(bom), ''),
+    })
+    
     bom_analysis = analyze_bom_data(bom)
     formatted_bom = format_bom_as_markdown(bom)
     
@@ -943,15 +3313,13 @@ def disruption_analysis(bom: Any, kpi: Any, open_text: Any, mode: str = None) ->
     # Extract detailed component and supplier information
     component_intelligence = extract_component_intelligence(bom)
     
-    # Get actual current supply chain disruptions
-    real_disruptions = get_current_real_disruptions()
-    
-    # Generate current supply chain news context
-    news_context = generate_supply_chain_context(bom)
-    
     # Analyze lead times and costs
     cost_lead_time_analysis = analyze_lead_times_and_costs(bom)
     
+    stage_results = stages.join()
+    real_disruptions = stage_results['real_disruptions']
+    news_context = stage_results['news_context']
+    
     # Build user concerns section
     user_concerns_section = ""
     if open_text and open_text.strip():
@@ -1124,73 +3492,78 @@ CRITICAL REQUIREMENTS:
 
 Respond ONLY with the markdown table (no explanations, no text before or after).'''
     
-    try:
-        # Base tokens: 4000. Will be adjusted by model config (GPT-5: 8000, GPT-4: 4000)
-        markdown_table = make_openai_request(COMPREHENSIVE_DISRUPTION_ANALYSIS_PROMPT, 4000, mode=mode)
-        html_table = markdown_to_html_table(markdown_table)
-        
-        # Build comprehensive result with intelligence summary
-        components = []
-        
-        # Add intelligence summary
-        if news_context:
-            components.append(
-                '<div style="font-weight:bold;font-size:1.1em;margin-bottom:1em;background:#e3f2fd;padding:0.8em;border-radius:8px;border-left:4px solid #2196f3;">'
-                f'🌐 Current Supply Chain Intelligence: Recent market conditions and disruption factors have been analyzed</div>'
-            )
-        
-        # Add warning if no BOM data provided
-        if not bom or not formatted_bom:
-            components.append(
-                '<div style="font-weight:bold;font-size:1.1em;margin-bottom:1em;background:#fff3cd;color:#856404;border:1px solid #ffeaa7;padding:0.8em;border-radius:8px;">'
-                '⚠️ <strong>Limited Analysis:</strong> This analysis is based only on the additional information provided, without BOM data. '
-                'For comprehensive disruption analysis including component-specific risks, costs, and supplier intelligence, please upload a BOM file.</div>'
-            )
+    return {
+        'prompt': COMPREHENSIVE_DISRUPTION_ANALYSIS_PROMPT,
+        'bom': bom,
+        'open_text': open_text,
+        'formatted_bom': formatted_bom,
+        'bom_analysis': bom_analysis,
+        'news_context': news_context,
+        'component_intelligence': component_intelligence,
+        'cost_lead_time_analysis': cost_lead_time_analysis
+    }
 
-        # Add BOM analysis summary
-        if bom_analysis['summary']:
-            components.append(
-                '<div style="font-weight:bold;font-size:1.1em;margin-bottom:1em;background:#e8f5e8;padding:0.8em;border-radius:8px;border-left:4px solid #4caf50;">'
-                f'📊 {bom_analysis["summary"]}</div>'
-            )
-        
-        # Add component intelligence summary
-        if component_intelligence:
-            # Count actual components by parsing the BOM data
-            try:
-                if isinstance(bom, str):
-                    try:
-                        bom_data = json.loads(bom)
-                    except Exception:
-                        bom_data = parse_csv_data(bom)
-                else:
-                    bom_data = bom
-                component_count = len(bom_data) if isinstance(bom_data, list) else 0
-            except:
-                component_count = 0
-                
-            components.append(
-                '<div style="font-weight:bold;font-size:1.1em;margin-bottom:1em;background:#fff;padding:0.8em;border-radius:8px;border-left:4px solid #ff9800;">'
-                f'🔧 Component Intelligence: {component_count} components analyzed for supply chain risks</div>'
-            )
-        
-        # Add cost and lead time analysis summary
-        if cost_lead_time_analysis:
-            components.append(
-                '<div style="font-weight:bold;font-size:1.1em;margin-bottom:1em;background:#fff;padding:0.8em;border-radius:8px;border-left:4px solid #9c27b0;">'
-                f'💰 Cost & Lead Time Analysis: BOM cost structure and lead time risks assessed</div>'
-            )
-        
-        # Highlight keywords if open text provided
-        if open_text and isinstance(open_text, str) and open_text.strip():
-            keywords = [w for w in open_text.split() if len(w) > 3]
-            html_table = highlight_table_rows(html_table, keywords)
-        
-        components.append(html_table)
-        return {"result": ''.join(components)}
-        
-    except Exception as e:
-        return {"error": str(e)}
+def _render_disruption_analysis(context: Dict[str, Any], markdown_table: str) -> Dict[str, str]:
+    """Wrap the scenario table returned by the model with the intelligence summary banners."""
+    bom = context['bom']
+    open_text = context['open_text']
+    formatted_bom = context['formatted_bom']
+    bom_analysis = context['bom_analysis']
+    news_context = context['news_context']
+    component_intelligence = context['component_intelligence']
+    cost_lead_time_analysis = context['cost_lead_time_analysis']
+    
+    html_table = markdown_to_html_table(markdown_table)
+
+    # Build comprehensive result with intelligence summary
+    components = []
+
+    # Add intelligence summary
+    if news_context:
+        components.append(
+            '<div style="font-weight:bold;font-size:1.1em;margin-bottom:1em;background:#e3f2fd;padding:0.8em;border-radius:8px;border-left:4px solid #2196f3;">'
+            f'🌐 Current Supply Chain Intelligence: Recent market conditions and disruption factors have been analyzed</div>'
+        )
+
+    # Add warning if no BOM data provided
+    if not bom or not formatted_bom:
+        components.append(
+            '<div style="font-weight:bold;font-size:1.1em;margin-bottom:1em;background:#fff3cd;color:#856404;border:1px solid #ffeaa7;padding:0.8em;border-radius:8px;">'
+            '⚠️ <strong>Limited Analysis:</strong> This analysis is based only on the additional information provided, without BOM data. '
+            'For comprehensive disruption analysis including component-specific risks, costs, and supplier intelligence, please upload a BOM file.</div>'
+        )
+
+    # Add BOM analysis summary
+    if bom_analysis['summary']:
+        components.append(
+            '<div style="font-weight:bold;font-size:1.1em;margin-bottom:1em;background:#e8f5e8;padding:0.8em;border-radius:8px;border-left:4px solid #4caf50;">'
+            f'📊 {bom_analysis["summary"]}</div>'
+        )
+
+    # Add component intelligence summary
+    if component_intelligence:
+        # Count actual components from the parsed BOM data
+        component_count = len(ParsedBOM.from_input(bom))
+
+        components.append(
+            '<div style="font-weight:bold;font-size:1.1em;margin-bottom:1em;background:#fff;padding:0.8em;border-radius:8px;border-left:4px solid #ff9800;">'
+            f'🔧 Component Intelligence: {component_count} components analyzed for supply chain risks</div>'
+        )
+
+    # Add cost and lead time analysis summary
+    if cost_lead_time_analysis:
+        components.append(
+            '<div style="font-weight:bold;font-size:1.1em;margin-bottom:1em;background:#fff;padding:0.8em;border-radius:8px;border-left:4px solid #9c27b0;">'
+            f'💰 Cost & Lead Time Analysis: BOM cost structure and lead time risks assessed</div>'
+        )
+
+    # Highlight keywords if open text provided
+    if open_text and isinstance(open_text, str) and open_text.strip():
+        keywords = [w for w in open_text.split() if len(w) > 3]
+        html_table = highlight_table_rows(html_table, keywords)
+
+    components.append(html_table)
+    return {"result": ''.join(components)}
 
 def extract_component_intelligence(bom: Any) -> str:
     """Extract detailed intelligence about components including types, suppliers, and risk factors."""
@@ -1198,31 +3571,24 @@ def extract_component_intelligence(bom: Any) -> str:
         return "No component data available for intelligence analysis."
     
     try:
-        if isinstance(bom, str):
-            try:
-                bom_data = json.loads(bom)
-            except Exception:
-                bom_data = parse_csv_data(bom)
-        else:
-            bom_data = bom
-            
-        if not isinstance(bom_data, list) or not bom_data:
+        parsed_bom = ParsedBOM.from_input(bom)
+        if not parsed_bom.rows:
             return "Component data format not suitable for intelligence analysis."
         
         intelligence_report = []
         component_categories = {}
         supplier_analysis = {}
-        
-        for item in bom_data:
-            part_number = item.get('Manufacturer Part #', item.get('Part Number', 'N/A'))
-            description = item.get('Description', 'N/A')
-            manufacturer = item.get('Manufacturer', 'N/A')
-            supplier = item.get('Supplier', 'N/A')
-            cost = item.get('Unit Cost (USD)', item.get('Total', 'N/A'))
-            quantity = item.get('Quantity', item.get('Qty', 'N/A'))
+        parsed_bom.component_types()  # classify all descriptions in one batch
+        
+        for item in parsed_bom.items:
+            part_number = item.part_number or 'N/A'
+            manufacturer = item.manufacturer or 'N/A'
+            supplier = item.supplier or 'N/A'
+            cost = item.cost_text if item.cost_text is not None else 'N/A'
+            quantity = item.quantity_text if item.quantity_text is not None else 'N/A'
             
             # Categorize component types
-            component_type = categorize_component_type(description)
+            component_type = item.component_type
             if component_type not in component_categories:
                 component_categories[component_type] = []
             component_categories[component_type].append({
@@ -1242,12 +3608,8 @@ def extract_component_intelligence(bom: Any) -> str:
                     }
                 supplier_analysis[supplier]['components'].append(part_number)
                 supplier_analysis[supplier]['manufacturers'].add(manufacturer)
-                try:
-                    cost_val = float(str(cost).replace('$', '').replace(',', ''))
-                    qty_val = int(str(quantity)) if str(quantity).isdigit() else 1
-                    supplier_analysis[supplier]['total_value'] += cost_val * qty_val
-                except:
-                    pass
+                if item.cost is not None:
+                    supplier_analysis[supplier]['total_value'] += item.cost * item.whole_quantity
         
         # Build intelligence report
         intelligence_report.append("COMPONENT TYPE ANALYSIS:")
@@ -1267,24 +3629,7 @@ def extract_component_intelligence(bom: Any) -> str:
 
 def categorize_component_type(description: str) -> str:
     """Categorize component based on description to assess supply chain risks."""
-    desc_lower = description.lower()
-    
-    if any(term in desc_lower for term in ['ic', 'microcontroller', 'processor', 'mcu', 'cpu', 'fpga', 'asic']):
-        return "Semiconductors/ICs"
-    elif any(term in desc_lower for term in ['resistor', 'capacitor', 'inductor', 'diode', 'transistor']):
-        return "Passive Components"
-    elif any(term in desc_lower for term in ['connector', 'cable', 'wire', 'harness']):
-        return "Connectors/Cables"
-    elif any(term in desc_lower for term in ['sensor', 'transducer', 'accelerometer', 'gyroscope']):
-        return "Sensors"
-    elif any(term in desc_lower for term in ['memory', 'flash', 'ram', 'eeprom', 'storage']):
-        return "Memory/Storage"
-    elif any(term in desc_lower for term in ['crystal', 'oscillator', 'clock', 'resonator']):
-        return "Timing Components"
-    elif any(term in desc_lower for term in ['mechanical', 'housing', 'enclosure', 'bracket', 'screw']):
-        return "Mechanical Parts"
-    else:
-        return "Other Components"
+    return COMPONENT_TYPE_CLASSIFIER.classify(description)
 
 def assess_component_risk(component_type: str, components: list) -> str:
     """Assess supply chain risk level for component category."""
@@ -1310,7 +3655,124 @@ def assess_component_risk(component_type: str, components: list) -> str:
     
     return base_risk
 
+# --- Market Data Snapshot ---
+# Exchange rates, metal prices and World Bank data change hourly to monthly, but used to be
+# fetched on every analysis. A background thread now keeps a timestamped snapshot that
+# request paths read directly; staleness is reported through api_status.
+MARKET_DATA_REFRESH_INTERVAL = int(os.getenv('MARKET_DATA_REFRESH_INTERVAL', '3600'))  # seconds
+MARKET_DATA_SNAPSHOT_PATH = os.getenv('MARKET_DATA_SNAPSHOT_PATH', '')  # optional JSON file, empty disables
+
+class MarketDataSnapshotStore:
+    """
+    Holds the latest fetch_real_market_data snapshot and refreshes it in the background.
+    
+    The snapshot is persisted to ``path`` (if set) so a restart can serve the previous data
+    immediately. Only a cold start with no snapshot at all fetches on the request path.
+    """
+    
+    def __init__(self, fetch, interval: int = MARKET_DATA_REFRESH_INTERVAL, path: str = MARKET_DATA_SNAPSHOT_PATH):
+        self._fetch = fetch
+        self.interval = interval
+        self.path = path
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._fetched_at = 0.0
+        self._origin = 'live'
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self._load()
+    
+    def _load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+            self._snapshot = stored['data']
+            self._fetched_at = float(stored['fetched_at'])
+            self._origin = 'disk'
+            print(f"Loaded market data snapshot from {self.path} ({int(time.time() - self._fetched_at)}s old)")
+        except Exception as e:
+            print(f"Market data snapshot at {self.path} could not be loaded: {e}")
+    
+    def _save(self) -> None:
+        if not self.path:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'fetched_at': self._fetched_at, 'data': self._snapshot}, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Market data snapshot could not be saved to {self.path}: {e}")
+    
+    def refresh(self, force: bool = False) -> None:
+        with self._refresh_lock:
+            # Single-flight: a caller that waited on the lock reuses the fetch it waited for
+            if not force and self._snapshot is not None and time.time() - self._fetched_at < self.interval:
+                return
+            data = self._fetch()
+            self._snapshot, self._fetched_at, self._origin = data, time.time(), 'live'
+            self._save()
+    
+    def start(self) -> None:
+        """Start the background refresher (idempotent)."""
+        with self._thread_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='market-data-refresher', daemon=True)
+            self._thread.start()
+    
+    def stop(self) -> None:
+        self._stop.set()
+    
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            wait_seconds = self._fetched_at + self.interval - time.time()
+            if wait_seconds > 0:
+                self._stop.wait(wait_seconds)
+                continue
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Market data refresh failed: {e}")
+                self._stop.wait(min(self.interval, 60))
+    
+    def get(self) -> Dict[str, Any]:
+        """Return the current snapshot with staleness metadata; fetches only on a cold start."""
+        self.start()
+        if self._snapshot is None:
+            self.refresh()
+        snapshot, fetched_at, origin = self._snapshot, self._fetched_at, self._origin
+        age = time.time() - fetched_at
+        stale = age > 2 * self.interval
+        if stale:
+            status = f"⚠ Stale snapshot - last refreshed {int(age // 60)} min ago"
+        else:
+            status = f"✓ Snapshot - refreshed {int(age // 60)} min ago (every {self.interval // 60} min)"
+        return {
+            **snapshot,
+            "api_status": {**snapshot.get("api_status", {}), "snapshot": status},
+            "snapshot": {
+                "fetched_at": time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime(fetched_at)),
+                "age_seconds": round(age, 1),
+                "refresh_interval_seconds": self.interval,
+                "stale": stale,
+                "origin": origin
+            }
+        }
+
+@traced()
 def fetch_real_market_data() -> Dict[str, Any]:
+    """Return the latest market data snapshot (see _collect_market_data for the sources)."""
+    return market_data_store.get()
+
+def _collect_market_data() -> Dict[str, Any]:
     """Fetch actual real-time market data from public APIs and data sources.
     
     Data Sources (Real-time):
@@ -1450,6 +3912,8 @@ def fetch_real_market_data() -> Dict[str, Any]:
     
     return market_data
 
+market_data_store = MarketDataSnapshotStore(_collect_market_data)
+
 def research_scenario_probability(scenario_description: str, root_cause_category: str, affected_components: str = "", bom: Any = None) -> Dict[str, Any]:
     """Research real-time market information to evaluate the probability of a specific scenario occurring.
     
@@ -1526,7 +3990,7 @@ IMPORTANT:
 '''
         
         # Get AI analysis
-        response = make_openai_request(market_research_prompt, max_tokens=1500)
+        response = make_openai_request(market_research_prompt, max_tokens=1500, endpoint='scenario_probability')
         
         # Parse JSON response
         try:
@@ -1595,19 +4059,7 @@ def generate_supply_chain_context(bom: Any = None) -> str:
         relevant_categories = set()
         if bom:
             try:
-                if isinstance(bom, str):
-                    try:
-                        bom_data = json.loads(bom)
-                    except Exception:
-                        bom_data = parse_csv_data(bom)
-                else:
-                    bom_data = bom
-                    
-                if isinstance(bom_data, list) and bom_data:
-                    for item in bom_data:
-                        description = item.get('Description', '')
-                        component_type = categorize_component_type(description)
-                        relevant_categories.add(component_type)
+                relevant_categories.update(ParsedBOM.from_input(bom).component_types())
             except Exception:
                 pass
         
@@ -1716,15 +4168,8 @@ def analyze_lead_times_and_costs(bom: Any) -> str:
         return "No BOM data available for lead time and cost analysis."
     
     try:
-        if isinstance(bom, str):
-            try:
-                bom_data = json.loads(bom)
-            except Exception:
-                bom_data = parse_csv_data(bom)
-        else:
-            bom_data = bom
-            
-        if not isinstance(bom_data, list) or not bom_data:
+        parsed_bom = ParsedBOM.from_input(bom)
+        if not parsed_bom.rows:
             return "BOM data format not suitable for analysis."
         
         cost_analysis = []
@@ -1732,39 +4177,32 @@ def analyze_lead_times_and_costs(bom: Any) -> str:
         high_cost_components = []
         cost_distribution = {"<$1": 0, "$1-$10": 0, "$10-$100": 0, ">$100": 0}
         
-        for item in bom_data:
-            part_number = item.get('Manufacturer Part #', item.get('Part Number', 'N/A'))
-            cost_str = str(item.get('Unit Cost (USD)', item.get('Total', '0')))
-            quantity = item.get('Quantity', item.get('Qty', 1))
-            
-            try:
-                # Clean and parse cost
-                cost_val = float(cost_str.replace('$', '').replace(',', ''))
-                qty_val = int(str(quantity)) if str(quantity).isdigit() else 1
-                extended_cost = cost_val * qty_val
-                total_bom_cost += extended_cost
-                
-                # Categorize cost
-                if cost_val < 1:
-                    cost_distribution["<$1"] += 1
-                elif cost_val < 10:
-                    cost_distribution["$1-$10"] += 1
-                elif cost_val < 100:
-                    cost_distribution["$10-$100"] += 1
-                else:
-                    cost_distribution[">$100"] += 1
-                
-                # Track high-cost components (>$50 or >10% of total)
-                if cost_val > 50:
-                    high_cost_components.append({
-                        'part': part_number,
-                        'cost': cost_val,
-                        'extended': extended_cost,
-                        'manufacturer': item.get('Manufacturer', 'N/A')
-                    })
-                    
-            except (ValueError, TypeError):
+        for item in parsed_bom.items:
+            # A row without a cost column counts as $0, as before; an unreadable cost is skipped
+            cost_val = item.cost if item.cost_text is not None else 0.0
+            if cost_val is None:
                 continue
+            extended_cost = cost_val * item.whole_quantity
+            total_bom_cost += extended_cost
+            
+            # Categorize cost
+            if cost_val < 1:
+                cost_distribution["<$1"] += 1
+            elif cost_val < 10:
+                cost_distribution["$1-$10"] += 1
+            elif cost_val < 100:
+                cost_distribution["$10-$100"] += 1
+            else:
+                cost_distribution[">$100"] += 1
+            
+            # Track high-cost components (>$50 or >10% of total)
+            if cost_val > 50:
+                high_cost_components.append({
+                    'part': item.part_number or 'N/A',
+                    'cost': cost_val,
+                    'extended': extended_cost,
+                    'manufacturer': item.manufacturer or 'N/A'
+                })
         
         # Build analysis report
         analysis_report = []
@@ -1782,11 +4220,7 @@ def analyze_lead_times_and_costs(bom: Any) -> str:
         analysis_report.append("\nLEAD TIME RISK ASSESSMENT:")
         
         # Analyze actual component types in the BOM
-        component_types_found = set()
-        for item in bom_data:
-            description = item.get('Description', '')
-            component_type = categorize_component_type(description)
-            component_types_found.add(component_type)
+        component_types_found = set(parsed_bom.component_types())
         
         # Only include lead time estimates for component types actually in the BOM
         lead_time_map = {
@@ -1816,33 +4250,239 @@ def disruption_explain(scenario_id: str, bom: Any, kpi: Any, open_text: Any, sce
                       affected_components: Optional[str] = None, possible_delay: Optional[str] = None, 
                       probability: Optional[str] = None, explainable_details: Optional[str] = None, mode: str = None) -> Dict[str, str]:
     """Generate a detailed, topic-based explanation for a disruption scenario."""
+    context = _prepare_disruption_explain(scenario_description, bom, kpi, affected_components)
+    validation_response = None
+    if context['validation_prompt']:
+        try:
+            validation_response = make_openai_request(context['validation_prompt'], max_tokens=1000, endpoint='article_validation')
+        except Exception as e:
+            print(f'Error in AI article validation: {e}')
+    EXPLANATION_PROMPT = _build_disruption_explanation_prompt(context, validation_response, scenario_id, scenario_description,
+                                                              affected_components, possible_delay, probability,
+                                                              explainable_details, open_text)
+    try:
+        # Base tokens: 5000. Will be adjusted by model config (GPT-5: 10000, GPT-4: 5000)
+        # Increased from 3000 to ensure GPT-5 has enough tokens after reasoning
+        detailed_result = make_openai_request(EXPLANATION_PROMPT, 5000, mode=mode, endpoint='disruption_explain')
+        return _render_disruption_explain(detailed_result)
+    except Exception as e:
+        return {"error": str(e)}
+
+async def disruption_explain_async(scenario_id: str, bom: Any, kpi: Any, open_text: Any, scenario_description: str, 
+                                  affected_components: Optional[str] = None, possible_delay: Optional[str] = None, 
+                                  probability: Optional[str] = None, explainable_details: Optional[str] = None, mode: str = None) -> Dict[str, str]:
+    """Async variant of disruption_explain: news gathering runs in a worker thread, model calls are awaited."""
+    context = await asyncio.to_thread(_prepare_disruption_explain, scenario_description, bom, kpi, affected_components)
+    validation_response = None
+    if context['validation_prompt']:
+        try:
+            validation_response = await make_openai_request_async(context['validation_prompt'], max_tokens=1000, endpoint='article_validation')
+        except Exception as e:
+            print(f'Error in AI article validation: {e}')
+    explanation_prompt = _build_disruption_explanation_prompt(context, validation_response, scenario_id, scenario_description,
+                                                              affected_components, possible_delay, probability,
+                                                              explainable_details, open_text)
+    try:
+        detailed_result = await make_openai_request_async(explanation_prompt, 5000, mode=mode, endpoint='disruption_explain')
+        return _render_disruption_explain(detailed_result)
+    except Exception as e:
+        return {"error": str(e)}
+
+async def disruption_explain_stream(scenario_id: str, bom: Any, kpi: Any, open_text: Any, scenario_description: str, 
+                                    affected_components: Optional[str] = None, possible_delay: Optional[str] = None, 
+                                    probability: Optional[str] = None, explainable_details: Optional[str] = None, mode: str = None) -> AsyncIterator[tuple]:
+    """Streaming variant of disruption_explain; article validation completes before the explanation streams."""
+    yield 'status', {'stage': 'gathering_context'}
+    try:
+        context = await asyncio.to_thread(_prepare_disruption_explain, scenario_description, bom, kpi, affected_components)
+    except Exception as e:
+        yield 'error', {'error': str(e)}
+        return
+    validation_response = None
+    if context['validation_prompt']:
+        yield 'status', {'stage': 'validating_articles'}
+        try:
+            validation_response = await make_openai_request_async(context['validation_prompt'], max_tokens=1000, endpoint='article_validation')
+        except Exception as e:
+            print(f'Error in AI article validation: {e}')
+    explanation_prompt = _build_disruption_explanation_prompt(context, validation_response, scenario_id, scenario_description,
+                                                              affected_components, possible_delay, probability,
+                                                              explainable_details, open_text)
+    yield 'status', {'stage': 'generating'}
+    async for event in stream_rendered_markdown(explanation_prompt, 5000, mode, 'disruption_explain', _render_disruption_explain):
+        yield event
+
+# --- Batch Disruption Explanations ---
+# Explaining every scenario of one analysis shares the work that does not depend on the
+# scenario. The BOM is parsed once, analyze_kpi_data and get_current_real_disruptions run
+# once, and one article validation call covers the pooled headlines of all scenarios. The
+# per-scenario explanation calls then run concurrently, paced by the rate governor.
+EXPLAIN_BATCH_MAX_SCENARIOS = int(os.getenv('EXPLAIN_BATCH_MAX_SCENARIOS', '20'))
+EXPLAIN_BATCH_MAX_ARTICLES = int(os.getenv('EXPLAIN_BATCH_MAX_ARTICLES', '80'))
+
+@traced()
+def _prepare_disruption_explain_batch(scenarios: List[Dict[str, Any]], bom: Any, kpi: Any) -> List[Dict[str, Any]]:
+    """One _prepare_disruption_explain context per scenario, sharing the BOM, KPI and disruption inputs."""
+    parsed_bom = ParsedBOM.from_input(bom) if bom else bom
+    stages = start_stages({
+        'kpi_analysis': (lambda: analyze_kpi_data(kpi), None),
+        'current_disruptions': (get_current_real_disruptions, []),
+    }).join()
+    kpi_analysis = stages['kpi_analysis'] or analyze_kpi_data(None)
+    return [
+        _prepare_disruption_explain(scenario.get('scenarioDescription') or '', parsed_bom, kpi,
+                                    scenario.get('affectedComponents'), kpi_analysis=kpi_analysis,
+                                    current_disruptions=stages['current_disruptions'])
+        for scenario in scenarios
+    ]
+
+def _pool_batch_headlines(contexts: List[Dict[str, Any]], limit: int = EXPLAIN_BATCH_MAX_ARTICLES) -> List[Dict[str, Any]]:
+    """Merge the scenarios' headlines by URL, taking them round-robin so every scenario's best matches make the cut."""
+    pooled, seen_urls = [], set()
+    candidates = [context['unique_headlines'] for context in contexts]
+    for rank in range(max((len(headlines) for headlines in candidates), default=0)):
+        for headlines in candidates:
+            if rank < len(headlines) and headlines[rank].get('url') not in seen_urls:
+                seen_urls.add(headlines[rank].get('url'))
+                pooled.append(headlines[rank])
+                if len(pooled) >= limit:
+                    return pooled
+    return pooled
+
+def _build_batch_validation_prompt(scenarios: List[Dict[str, Any]], contexts: List[Dict[str, Any]],
+                                   articles: List[Dict[str, Any]]) -> str:
+    """One relevance validation prompt covering every scenario against the pooled articles."""
+    scenario_lines = []
+    for index, (scenario, context) in enumerate(zip(scenarios, contexts), 1):
+        scenario_lines.append(
+            f'S{index}. "{scenario.get("scenarioDescription") or ""}"\n'
+            f'    Affected components: {scenario.get("affectedComponents") or "Not specified"}\n'
+            f'    Key entities: {", ".join(context["key_entities"]) if context["key_entities"] else "None identified"}'
+        )
+    return f'''You are a supply chain research analyst conducting deep validation. Your task is to identify, for EACH of several supply chain disruption scenarios, which news articles are DIRECTLY RELEVANT to it.
+
+SCENARIOS TO MATCH:
+{chr(10).join(scenario_lines)}
+
+NEWS ARTICLES TO EVALUATE:
+{chr(10).join([f"{i+1}. {h.get('title', 'N/A')}" for i, h in enumerate(articles)])}
+
+TASK:
+For each scenario separately, an article is directly relevant ONLY if it meets ALL of the following criteria:
+1. It discusses the SAME type of disruption as the scenario
+2. It mentions the SAME suppliers, manufacturers, or companies (if any are specified in the scenario)
+3. It discusses the SAME component types or industries (if any are specified in the scenario)
+4. It describes the SAME geographic regions or markets (if any are specified in the scenario)
+5. It addresses the SAME root cause
+
+EXCLUDE articles that are only tangentially related, about different disruption types, about unrelated industries, or too generic to validate the specific scenario. An article may be relevant to several scenarios or to none.
+
+QUALITY OVER QUANTITY: It is better to return an empty array for a scenario than to include articles that are not directly relevant.
+
+RESPOND WITH ONLY a JSON object mapping every scenario label to an array of article numbers (1-based):
+{{"S1": [1, 3], "S2": [], ...}}
+'''
+
+def _parse_batch_validation(response: Optional[str], scenario_count: int) -> Dict[int, List[int]]:
+    """{scenario index: article numbers} from the combined validation answer; missing scenarios are left out."""
+    if not response:
+        return {}
+    match = re.search(r'\{.*\}', response, re.S)
+    if not match:
+        return {}
+    try:
+        parsed = json.loads(match.group(0))
+    except ValueError:
+        return {}
+    selections = {}
+    for index in range(scenario_count):
+        numbers = parsed.get(f"S{index + 1}")
+        if isinstance(numbers, list):
+            selections[index] = [n for n in numbers if isinstance(n, int)]
+    return selections
+
+async def disruption_explain_batch_async(scenarios: List[Dict[str, Any]], bom: Any, kpi: Any, open_text: Any,
+                                         mode: str = None) -> Dict[str, Any]:
+    """Explain several scenarios of one analysis with shared context gathering and one validation call.
+    
+    Each scenario dict uses the /api/disruption-explain field names (scenarioId,
+    scenarioDescription, affectedComponents, possibleDelay, probability, explainableDetails).
+    Returns {"results": [{"scenarioId": ..., "result" or "error": ...}, ...]} in input order.
+    """
+    if not scenarios:
+        return {"error": "No scenarios to explain"}
+    if len(scenarios) > EXPLAIN_BATCH_MAX_SCENARIOS:
+        return {"error": f"Too many scenarios ({len(scenarios)}); the limit is {EXPLAIN_BATCH_MAX_SCENARIOS} per batch"}
+    
+    contexts = await asyncio.to_thread(_prepare_disruption_explain_batch, scenarios, bom, kpi)
+    articles = _pool_batch_headlines(contexts)
+    selections: Dict[int, List[int]] = {}
+    if articles:
+        prompt = _build_batch_validation_prompt(scenarios, contexts, articles)
+        try:
+            response = await make_openai_request_async(prompt, max_tokens=500 + 100 * len(scenarios),
+                                                       endpoint='article_validation')
+            selections = _parse_batch_validation(response, len(scenarios))
+        except Exception as e:
+            print(f'Error in batch AI article validation: {e}')
+        print(f"Batch validation: {len(articles)} pooled articles, {len(selections)}/{len(scenarios)} scenarios answered")
+    
+    async def explain(index: int, scenario: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
+        validation_response = None
+        if index in selections:
+            # Express this scenario's picks as the single-scenario validation answer over the pooled list
+            context = {**context, 'articles_for_validation': articles}
+            validation_response = json.dumps(selections[index])
+        explanation_prompt = _build_disruption_explanation_prompt(
+            context, validation_response, scenario.get('scenarioId'), scenario.get('scenarioDescription') or '',
+            scenario.get('affectedComponents'), scenario.get('possibleDelay'), scenario.get('probability'),
+            scenario.get('explainableDetails'), open_text)
+        try:
+            detailed_result = await make_openai_request_async(explanation_prompt, 5000, mode=mode, endpoint='disruption_explain')
+            return {"scenarioId": scenario.get('scenarioId'), **_render_disruption_explain(detailed_result)}
+        except Exception as e:
+            return {"scenarioId": scenario.get('scenarioId'), "error": str(e)}
+    
+    results = await asyncio.gather(*[explain(index, scenario, context)
+                                     for index, (scenario, context) in enumerate(zip(scenarios, contexts))])
+    return {"results": list(results)}
+
+@traced()
+def _prepare_disruption_explain(scenario_description: str, bom: Any, kpi: Any, affected_components: Optional[str],
+                                kpi_analysis: Optional[Dict[str, Any]] = None,
+                                current_disruptions: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Parse BOM/KPI inputs, run targeted news searches and build the article validation prompt.
+    
+    Batch callers pass a ParsedBOM plus precomputed kpi_analysis and current_disruptions so
+    that work is done once for all scenarios."""
     bom_details = ''
     try:
         if bom:
-            if isinstance(bom, str):
-                try:
-                    bom_data = json.loads(bom)
-                except Exception:
-                    bom_data = parse_csv_data(bom)
-            else:
-                bom_data = bom
-            if isinstance(bom_data, list) and bom_data:
-                component_list = [
-                    f"- {item.get('Manufacturer Part #', item.get('Part Number', 'N/A'))} "
-                    f"({item.get('Description', 'N/A')}) from {item.get('Manufacturer', 'N/A')}, "
-                    f"Cost: ${item.get('Unit Cost (USD)', item.get('Total', 'N/A'))}"
-                    for item in bom_data
-                ]
-                bom_details = "\n\nAvailable BOM Components:\n" + '\n'.join(component_list)
+            bom_details = format_bom_for_prompt(
+                bom,
+                lambda item: (f"- {item.get('Manufacturer Part #', item.get('Part Number', 'N/A'))} "
+                              f"({item.get('Description', 'N/A')}) from {item.get('Manufacturer', 'N/A')}, "
+                              f"Cost: ${item.get('Unit Cost (USD)', item.get('Total', 'N/A'))}"),
+                "Available BOM Components",
+                query_text=f"{affected_components or ''} {scenario_description or ''}",
+            )
     except Exception as e:
         print('BOM parsing error in explanation:', e)
     
     # Parse and analyze KPI data for better correlation
-    kpi_analysis = analyze_kpi_data(kpi)
+    if kpi_analysis is None:
+        kpi_analysis = analyze_kpi_data(kpi)
     
     # Gather real-world news and market information from multiple sources with deep relevance validation
-    real_world_links = []
-    cross_referenced_events = {}  # Group articles by event/topic
+    context = {
+        'bom_details': bom_details,
+        'kpi_analysis': kpi_analysis,
+        'key_entities': [],
+        'search_terms': None,
+        'unique_headlines': [],
+        'articles_for_validation': [],
+        'validation_prompt': None,
+    }
     
     try:
         # Extract key entities from scenario for targeted search
@@ -1915,12 +4555,12 @@ def disruption_explain(scenario_id: str, bom: Any, kpi: Any, open_text: Any, sce
         # Remove duplicates and empty terms
         search_terms = list(dict.fromkeys([t.strip() for t in search_terms if t.strip()]))
         
-        # Get news articles from comprehensive targeted searches
+        # Get news articles from comprehensive targeted searches (served from the local headline index)
         all_headlines = []
         for term in search_terms[:10]:  # Use up to 10 search terms for comprehensive coverage
             if term.strip():
                 try:
-                    news_result = generate_supply_chain_news(term)
+                    news_result = search_supply_chain_news(term)
                     headlines = news_result.get("headlines", [])
                     all_headlines.extend(headlines)
                 except Exception as e:
@@ -1928,7 +4568,8 @@ def disruption_explain(scenario_id: str, bom: Any, kpi: Any, open_text: Any, sce
                     continue
         
         # Get current disruptions
-        current_disruptions = get_current_real_disruptions()
+        if current_disruptions is None:
+            current_disruptions = get_current_real_disruptions()
         all_headlines.extend([d for d in current_disruptions if d.get('url')])
         
         # Remove duplicates based on URL
@@ -1941,6 +4582,7 @@ def disruption_explain(scenario_id: str, bom: Any, kpi: Any, open_text: Any, sce
                 unique_headlines.append(h)
         
         # Use AI to validate article relevance to the specific scenario
+        validation_prompt = None
         articles_for_validation = []
         if unique_headlines:
             # Prepare articles for AI validation - use more articles for comprehensive validation
@@ -1983,38 +4625,63 @@ RESPOND WITH ONLY A JSON array of article numbers (1-based) that are DIRECTLY RE
 If NO articles are directly relevant, respond with: []
 '''
             
+        context.update(
+            key_entities=key_entities,
+            search_terms=search_terms,
+            unique_headlines=unique_headlines,
+            articles_for_validation=articles_for_validation,
+            validation_prompt=validation_prompt,
+        )
+    except Exception as e:
+        print(f'Error gathering real-world links: {e}')
+    
+    return context
+
+def _select_relevant_articles(validation_response: Optional[str], articles_for_validation: List[Dict[str, Any]], scenario_description: str) -> List[Dict[str, Any]]:
+    """Pick the articles flagged by the validation call, falling back to stricter keyword matching."""
+    if not articles_for_validation:
+        return []
+    if validation_response:
+        # Parse JSON response
+        import re
+        json_match = re.search(r'\[[\d,\s]*\]', validation_response)
+        if json_match:
             try:
-                validation_response = make_openai_request(validation_prompt, max_tokens=1000)
-                # Parse JSON response
-                import re
-                json_match = re.search(r'\[[\d,\s]*\]', validation_response)
-                if json_match:
-                    relevant_indices = json.loads(json_match.group(0))
-                    # Filter to only relevant articles (convert to 0-based indexing)
-                    relevant_articles = [articles_for_validation[i-1] for i in relevant_indices 
-                                       if 1 <= i <= len(articles_for_validation)]
-                else:
-                    # Fallback: use stricter keyword matching
-                    relevant_articles = []
-                    scenario_keywords = [w.lower() for w in scenario_description.split() if len(w) > 5]
-                    for headline in articles_for_validation:
-                        title = headline.get('title', '').lower()
-                        # Require at least 2 significant keyword matches
-                        matches = sum(1 for keyword in scenario_keywords if keyword in title)
-                        if matches >= 2:
-                            relevant_articles.append(headline)
-            except Exception as e:
-                print(f'Error in AI article validation: {e}')
-                # Fallback to stricter keyword matching
-                relevant_articles = []
-                scenario_keywords = [w.lower() for w in scenario_description.split() if len(w) > 5]
-                for headline in articles_for_validation:
-                    title = headline.get('title', '').lower()
-                    matches = sum(1 for keyword in scenario_keywords if keyword in title)
-                    if matches >= 2:
-                        relevant_articles.append(headline)
-        else:
-            relevant_articles = []
+                relevant_indices = json.loads(json_match.group(0))
+                # Filter to only relevant articles (convert to 0-based indexing)
+                return [articles_for_validation[i-1] for i in relevant_indices 
+                        if 1 <= i <= len(articles_for_validation)]
+            except ValueError:
+                pass
+    
+    # Fallback: use stricter keyword matching
+    relevant_articles = []
+    scenario_keywords = [w.lower() for w in scenario_description.split() if len(w) > 5]
+    for headline in articles_for_validation:
+        title = headline.get('title', '').lower()
+        # Require at least 2 significant keyword matches
+        matches = sum(1 for keyword in scenario_keywords if keyword in title)
+        if matches >= 2:
+            relevant_articles.append(headline)
+    return relevant_articles
+
+def _build_disruption_explanation_prompt(context: Dict[str, Any], validation_response: Optional[str], scenario_id: str,
+                                         scenario_description: str, affected_components: Optional[str],
+                                         possible_delay: Optional[str], probability: Optional[str],
+                                         explainable_details: Optional[str], open_text: Any) -> str:
+    """Cross-reference validated articles and assemble the scenario explanation prompt."""
+    bom_details = context['bom_details']
+    kpi_analysis = context['kpi_analysis']
+    key_entities = context['key_entities']
+    search_terms = context['search_terms']
+    unique_headlines = context['unique_headlines']
+    articles_for_validation = context['articles_for_validation']
+    
+    real_world_links = []
+    cross_referenced_events = {}  # Group articles by event/topic
+    
+    try:
+        relevant_articles = _select_relevant_articles(validation_response, articles_for_validation, scenario_description)
         
         # Process validated articles
         for headline in relevant_articles:
@@ -2062,8 +4729,8 @@ If NO articles are directly relevant, respond with: []
     if real_world_links:
         real_world_section = "\n\nREAL-WORLD SUPPORTING INFORMATION (VALIDATED FROM MULTIPLE SOURCES):\n"
         real_world_section += "The following news articles have been validated through deep research across multiple sources to ensure they DIRECTLY relate to this specific scenario.\n"
-        validation_count = len(articles_for_validation) if articles_for_validation else len(unique_headlines) if 'unique_headlines' in locals() else 0
-        real_world_section += f"Validation process: Searched {len(search_terms) if 'search_terms' in locals() else 'multiple'} targeted queries across 10+ RSS feeds, validated {validation_count} articles, found {len(real_world_links)} directly relevant articles.\n"
+        validation_count = len(articles_for_validation) if articles_for_validation else len(unique_headlines)
+        real_world_section += f"Validation process: Searched {len(search_terms) if search_terms is not None else 'multiple'} targeted queries across 10+ RSS feeds, validated {validation_count} articles, found {len(real_world_links)} directly relevant articles.\n"
         real_world_section += "Articles are grouped by event/topic to show cross-referencing across different news sources.\n\n"
         
         # Show cross-referenced events first (events reported by multiple sources)
@@ -2186,17 +4853,51 @@ You MUST ALWAYS include the following sections, even if some sections have no da
 REMEMBER: This explanation must be specifically about scenario "{scenario_id}: {scenario_description}" - not general supply chain advice. The "Real-World Evidence" section is MANDATORY and must include clickable links to supporting information.
 
 Respond ONLY with the markdown-formatted explanation, no extra text before or after.'''
+    return EXPLANATION_PROMPT
+
+def _render_disruption_explain(detailed_result: str) -> Dict[str, str]:
+    presentable = f"<div>{markdown_to_html_table(detailed_result)}</div>"
+    return {"result": presentable}
+
+def mitigation_plan(scenario_id: str, recommendation: str, bom: Any = None, kpi: Any = None, open_text: Any = None, scenario_description: Optional[str] = None, affected_components: Optional[str] = None, possible_delay: Optional[str] = None, probability: Optional[str] = None, explainable_details: Optional[str] = None, scenario_explanation: Optional[str] = None, user_input: Optional[Dict[str, Any]] = None, mode: str = None) -> Dict[str, str]:
+    """Generate a detailed, step-by-step action plan for a mitigation recommendation with full context."""
+    ENHANCED_PLAN_PROMPT = _build_mitigation_plan_prompt(scenario_id, recommendation, bom, kpi, open_text, scenario_description,
+                                        affected_components, possible_delay, probability, explainable_details,
+                                        scenario_explanation, user_input)
     try:
-        # Base tokens: 5000. Will be adjusted by model config (GPT-5: 10000, GPT-4: 5000)
-        # Increased from 3000 to ensure GPT-5 has enough tokens after reasoning
-        detailed_result = make_openai_request(EXPLANATION_PROMPT, 5000, mode=mode)
-        presentable = f"<div>{markdown_to_html_table(detailed_result)}</div>"
-        return {"result": presentable}
+        # Base tokens: 8000. Will be adjusted by model config (GPT-5: 16000, GPT-4: 8000)
+        # Increased from 5000 to ensure GPT-5 has enough tokens after reasoning for comprehensive plans
+        plan_result = make_openai_request(ENHANCED_PLAN_PROMPT, 8000, mode=mode, endpoint='mitigation_plan')
+        return _render_mitigation_plan(plan_result)
     except Exception as e:
         return {"error": str(e)}
 
-def mitigation_plan(scenario_id: str, recommendation: str, bom: Any = None, kpi: Any = None, open_text: Any = None, scenario_description: Optional[str] = None, affected_components: Optional[str] = None, possible_delay: Optional[str] = None, probability: Optional[str] = None, explainable_details: Optional[str] = None, scenario_explanation: Optional[str] = None, user_input: Optional[Dict[str, Any]] = None, mode: str = None) -> Dict[str, str]:
-    """Generate a detailed, step-by-step action plan for a mitigation recommendation with full context."""
+async def mitigation_plan_async(scenario_id: str, recommendation: str, bom: Any = None, kpi: Any = None, open_text: Any = None, scenario_description: Optional[str] = None, affected_components: Optional[str] = None, possible_delay: Optional[str] = None, probability: Optional[str] = None, explainable_details: Optional[str] = None, scenario_explanation: Optional[str] = None, user_input: Optional[Dict[str, Any]] = None, mode: str = None) -> Dict[str, str]:
+    """Async variant of mitigation_plan for use from async endpoints."""
+    plan_prompt = _build_mitigation_plan_prompt(scenario_id, recommendation, bom, kpi, open_text, scenario_description,
+                                        affected_components, possible_delay, probability, explainable_details,
+                                        scenario_explanation, user_input)
+    try:
+        plan_result = await make_openai_request_async(plan_prompt, 8000, mode=mode, endpoint='mitigation_plan')
+        return _render_mitigation_plan(plan_result)
+    except Exception as e:
+        return {"error": str(e)}
+
+async def mitigation_plan_stream(scenario_id: str, recommendation: str, bom: Any = None, kpi: Any = None, open_text: Any = None, scenario_description: Optional[str] = None, affected_components: Optional[str] = None, possible_delay: Optional[str] = None, probability: Optional[str] = None, explainable_details: Optional[str] = None, scenario_explanation: Optional[str] = None, user_input: Optional[Dict[str, Any]] = None, mode: str = None) -> AsyncIterator[tuple]:
+    """Streaming variant of mitigation_plan yielding (event, data) pairs for Server-Sent Events."""
+    try:
+        plan_prompt = _build_mitigation_plan_prompt(scenario_id, recommendation, bom, kpi, open_text, scenario_description,
+                                        affected_components, possible_delay, probability, explainable_details,
+                                        scenario_explanation, user_input)
+    except Exception as e:
+        yield 'error', {'error': str(e)}
+        return
+    yield 'status', {'stage': 'generating'}
+    async for event in stream_rendered_markdown(plan_prompt, 8000, mode, 'mitigation_plan', _render_mitigation_plan):
+        yield event
+
+def _build_mitigation_plan_prompt(scenario_id: str, recommendation: str, bom: Any = None, kpi: Any = None, open_text: Any = None, scenario_description: Optional[str] = None, affected_components: Optional[str] = None, possible_delay: Optional[str] = None, probability: Optional[str] = None, explainable_details: Optional[str] = None, scenario_explanation: Optional[str] = None, user_input: Optional[Dict[str, Any]] = None) -> str:
+    """Assemble the mitigation plan prompt from BOM, KPI, scenario and user planning context."""
     
     # Parse BOM data to extract specific component details
     bom_details = ''
@@ -2205,14 +4906,9 @@ def mitigation_plan(scenario_id: str, recommendation: str, bom: Any = None, kpi:
     
     try:
         if bom:
-            if isinstance(bom, str):
-                try:
-                    bom_data = json.loads(bom)
-                except Exception:
-                    bom_data = parse_csv_data(bom)
-            else:
-                bom_data = bom
-            if isinstance(bom_data, list) and bom_data:
+            parsed_bom = ParsedBOM.from_input(bom)
+            bom_data = parsed_bom.rows
+            if bom_data:
                 component_list = [
                     {
                         'part_number': item.get('Manufacturer Part #', item.get('Part Number', 'N/A')),
@@ -2224,11 +4920,16 @@ def mitigation_plan(scenario_id: str, recommendation: str, bom: Any = None, kpi:
                     }
                     for item in bom_data
                 ]
-                bom_details = "\n\nComplete BOM Components:\n" + '\n'.join([
-                    f"- {comp['part_number']} ({comp['description']}) from {comp['manufacturer']}, "
-                    f"Supplier: {comp['supplier']}, Cost: ${comp['cost']}, Qty: {comp['quantity']}"
-                    for comp in component_list
-                ])
+                bom_details = format_bom_for_prompt(
+                    parsed_bom,
+                    lambda item: (f"- {item.get('Manufacturer Part #', item.get('Part Number', 'N/A'))} "
+                                  f"({item.get('Description', 'N/A')}) from {item.get('Manufacturer', 'N/A')}, "
+                                  f"Supplier: {item.get('Supplier', 'N/A')}, "
+                                  f"Cost: ${item.get('Unit Cost (USD)', item.get('Total', 'N/A'))}, "
+                                  f"Qty: {item.get('Quantity', item.get('Qty', 'N/A'))}"),
+                    "Complete BOM Components",
+                    query_text=f"{affected_components or ''} {scenario_description or ''}",
+                )
                 
                 # Extract specific details for affected components
                 if affected_components:
@@ -2415,29 +5116,360 @@ The table must have these exact columns:
 This checklist table enables effective tracking and ensures nothing is missed during implementation.
 
 Respond ONLY with the markdown-formatted plan using exclusively provided data and avoiding all fictional information.'''
+    return ENHANCED_PLAN_PROMPT
+
+def _render_mitigation_plan(plan_result: str) -> Dict[str, str]:
+    # Debug: Check if content is being truncated
+    if len(plan_result) > 8000:
+        print(f"Mitigation plan length: {len(plan_result)} characters")
+    presentable = f"<div>{markdown_to_html_table(plan_result)}</div>"
+    return {"result": presentable}
+
+# --- RSS Feed Store ---
+# Every news lookup used to download and parse all feeds; a single disruption_explain made
+# 100+ fetches. Feeds are now parsed once into a shared store refreshed on a TTL, and query
+# calls filter the cached items.
+NEWS_RSS_FEEDS = [
+    "https://www.supplychainbrain.com/rss/articles",
+    "https://www.freightwaves.com/news/feed",
+    "https://feeds.feedburner.com/SupplyChainDive",
+    "https://www.inboundlogistics.com/feed/",
+    "https://www.logisticsmgmt.com/rss.xml",
+    "https://www.scmr.com/rss.xml",
+    "https://www.dcvelocity.com/rss.xml",
+    "https://www.mhlnews.com/rss.xml",
+    "https://www.manufacturing.net/rss.xml",
+    "https://www.industryweek.com/rss.xml",
+]
+NEWS_FEED_TTL = int(os.getenv('NEWS_FEED_TTL', '900'))  # seconds between feed refreshes
+NEWS_FEED_TIMEOUT = int(os.getenv('NEWS_FEED_TIMEOUT', '10'))  # per-feed HTTP timeout
+NEWS_FEED_DEADLINE = float(os.getenv('NEWS_FEED_DEADLINE', '12'))  # overall refresh deadline
+NEWS_FEED_WORKERS = int(os.getenv('NEWS_FEED_WORKERS', '10'))
+NEWS_FEED_BREAKER_THRESHOLD = int(os.getenv('NEWS_FEED_BREAKER_THRESHOLD', '3'))  # consecutive failures
+NEWS_FEED_BREAKER_COOLDOWN = int(os.getenv('NEWS_FEED_BREAKER_COOLDOWN', '600'))  # seconds a tripped feed is skipped
+
+def parse_rss_items(content: bytes, feed_url: str) -> List[Dict[str, Any]]:
+    """Parse an RSS document into items with title, url, source, publishedAt and a parsed pubDate."""
+    import xml.etree.ElementTree as ET
+    from dateutil import parser
+    from urllib.parse import urlparse
     
-    try:
-        # Base tokens: 8000. Will be adjusted by model config (GPT-5: 16000, GPT-4: 8000)
-        # Increased from 5000 to ensure GPT-5 has enough tokens after reasoning for comprehensive plans
-        plan_result = make_openai_request(ENHANCED_PLAN_PROMPT, 8000, mode=mode)
-        # Debug: Check if content is being truncated
-        if len(plan_result) > 8000:
-            print(f"Mitigation plan length: {len(plan_result)} characters")
-        presentable = f"<div>{markdown_to_html_table(plan_result)}</div>"
-        return {"result": presentable}
-    except Exception as e:
-        return {"error": str(e)}
+    root = ET.fromstring(content)
+    items = []
+    for item in root.findall('.//item'):
+        title_elem = item.find('title')
+        link_elem = item.find('link')
+        pub_date_elem = item.find('pubDate')
+        
+        title = title_elem.text.strip() if title_elem is not None and title_elem.text else None
+        url = link_elem.text.strip() if link_elem is not None and link_elem.text else None
+        
+        if not title or len(title) <= 20:
+            continue
+        
+        pub_date = None
+        if pub_date_elem is not None and pub_date_elem.text:
+            try:
+                pub_date = parser.parse(pub_date_elem.text)
+            except Exception:
+                pub_date = None
+        
+        source = None
+        try:
+            parsed = urlparse(url) if url else urlparse(feed_url)
+            source = parsed.hostname
+        except Exception:
+            source = None
+        
+        items.append({
+            "title": title,
+            "url": url or feed_url,
+            "source": source or "unknown",
+            "publishedAt": pub_date.isoformat() if pub_date else "",
+            "pubDate": pub_date
+        })
+    return items
+
+class RSSFeedStore:
+    """
+    Shared cache of parsed RSS feed items, refreshed when older than ``ttl`` seconds.
+    
+    Refreshes are single-flight: concurrent callers that find the store stale wait for the
+    one in-progress refresh instead of starting their own. Feeds are fetched concurrently
+    with conditional GET (ETag / Last-Modified); a refresh returns once all feeds answer or
+    ``deadline`` seconds pass, and late feeds still land in the store when they finish.
+    A feed that fails keeps its last good items, and a feed that fails ``breaker_threshold``
+    times in a row is skipped for ``breaker_cooldown`` seconds before being tried again.
+    """
+    
+    def __init__(self, feeds: List[str], ttl: int = NEWS_FEED_TTL, deadline: float = NEWS_FEED_DEADLINE,
+                 breaker_threshold: int = NEWS_FEED_BREAKER_THRESHOLD, breaker_cooldown: int = NEWS_FEED_BREAKER_COOLDOWN):
+        self.feeds = list(feeds)
+        self.ttl = ttl
+        self.deadline = deadline
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._breakers: Dict[str, Dict[str, float]] = {}
+        self._in_flight: set = set()
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refreshed_at = 0.0
+        self.version = 0  # bumped whenever cached items change
+        self._executor = ThreadPoolExecutor(max_workers=NEWS_FEED_WORKERS, thread_name_prefix='rss-feed')
+        self.stats = {'refreshes': 0, 'fetches': 0, 'not_modified': 0, 'failures': 0,
+                      'skipped_open_circuit': 0, 'deadline_exceeded': 0}
+    
+    def is_stale(self) -> bool:
+        return time.time() - self._refreshed_at >= self.ttl
+    
+    def get_feed_items(self) -> List[List[Dict[str, Any]]]:
+        """Return cached items per feed (in feed order), refreshing first if the store is stale."""
+        if self.is_stale():
+            self.refresh()
+        with self._lock:
+            return [list(self._entries.get(url, {}).get('items', [])) for url in self.feeds]
+    
+    def refresh(self, force: bool = False) -> None:
+        with self._refresh_lock:
+            # Another caller may have refreshed while we waited for the lock
+            if not force and not self.is_stale():
+                return
+            feeds = [feed_url for feed_url in self.feeds if self._circuit_allows(feed_url)]
+            with self._lock:
+                self._in_flight.update(feeds)
+            futures = [submit_in_context(self._executor, self._refresh_feed, feed_url) for feed_url in feeds]
+            _, pending = wait(futures, timeout=self.deadline)
+            if pending:
+                print(f"RSS refresh deadline ({self.deadline}s) reached with {len(pending)} feed(s) still loading")
+                self._count('deadline_exceeded', len(pending))
+            self._refreshed_at = time.time()
+            self._count('refreshes')
+    
+    def _count(self, stat: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[stat] += amount
+    
+    def _circuit_allows(self, feed_url: str) -> bool:
+        """False while a feed is still loading from an earlier refresh or its breaker is open."""
+        with self._lock:
+            if feed_url in self._in_flight:
+                return False
+            breaker = self._breakers.get(feed_url)
+            if not breaker or breaker['open_until'] <= time.time():
+                return True
+            self.stats['skipped_open_circuit'] += 1
+            return False
+    
+    def _record_result(self, feed_url: str, ok: bool) -> None:
+        with self._lock:
+            if ok:
+                self._breakers.pop(feed_url, None)
+                return
+            self.stats['failures'] += 1
+            breaker = self._breakers.setdefault(feed_url, {'failures': 0, 'open_until': 0.0})
+            breaker['failures'] += 1
+            if breaker['failures'] >= self.breaker_threshold:
+                breaker['open_until'] = time.time() + self.breaker_cooldown
+                print(f"RSS feed {feed_url} failed {int(breaker['failures'])} times in a row; skipping for {self.breaker_cooldown}s")
+    
+    def _refresh_feed(self, feed_url: str) -> None:
+        try:
+            self._fetch_feed(feed_url)
+        finally:
+            with self._lock:
+                self._in_flight.discard(feed_url)
+    
+    def _fetch_feed(self, feed_url: str) -> None:
+        with self._lock:
+            entry = self._entries.get(feed_url)
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        
+        with trace_span('rss.fetch', feed=feed_url) as span:
+            try:
+                self._count('fetches')
+                response = requests.get(feed_url, headers=headers, timeout=NEWS_FEED_TIMEOUT)
+                span.set(status_code=response.status_code, bytes=len(response.content))
+                if response.status_code == 304 and entry:
+                    self._count('not_modified')
+                    self._record_result(feed_url, True)
+                    return
+                if response.status_code != 200:
+                    self._record_result(feed_url, False)
+                    return
+                items = parse_rss_items(response.content, feed_url)
+                span.set(items=len(items))
+            except Exception as e:
+                print(f"RSS feed {feed_url} failed: {e}")
+                span.set(error=str(e)[:200])
+                self._record_result(feed_url, False)
+                return
+        
+        self._record_result(feed_url, True)
+        with self._lock:
+            self._entries[feed_url] = {
+                'items': items,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'fetched_at': time.time()
+            }
+            self.version += 1
+    
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            cached_items = sum(len(entry['items']) for entry in self._entries.values())
+            feeds_cached = len(self._entries)
+            stats = dict(self.stats)
+            open_circuits = [url for url, breaker in self._breakers.items() if breaker['open_until'] > time.time()]
+        return {
+            **stats,
+            'feeds': len(self.feeds),
+            'feeds_cached': feeds_cached,
+            'open_circuits': open_circuits,
+            'items_cached': cached_items,
+            'age_seconds': round(time.time() - self._refreshed_at, 1) if self._refreshed_at else None,
+            'ttl_seconds': self.ttl
+        }
 
+news_feed_store = RSSFeedStore(NEWS_RSS_FEEDS)
+
+# --- Headline Search Index ---
+# In-process BM25 index over every item in the feed store, so keyword searches (e.g. the
+# scenario search terms in disruption_explain) retrieve matching headlines without any
+# network round-trips. Scores are boosted for recent items.
+NEWS_SEARCH_WINDOW_DAYS = 7
+NEWS_SEARCH_RECENCY_HALF_LIFE_DAYS = float(os.getenv('NEWS_SEARCH_RECENCY_HALF_LIFE_DAYS', '3'))
+NEWS_SEARCH_RECENCY_WEIGHT = float(os.getenv('NEWS_SEARCH_RECENCY_WEIGHT', '0.5'))
+_SEARCH_STOP_WORDS = {'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it',
+                      'of', 'on', 'or', 'the', 'to', 'with'}
+
+def tokenize_search_text(text: str) -> List[str]:
+    import re
+    return [token for token in re.findall(r'[a-z0-9]+', (text or '').lower()) if token not in _SEARCH_STOP_WORDS]
+
+class HeadlineSearchIndex:
+    """
+    BM25 inverted index over the headlines held by an RSSFeedStore.
+    
+    The index is rebuilt lazily whenever the store's contents change; searches run against
+    an immutable snapshot, so they never block on a rebuild in progress.
+    """
+    
+    def __init__(self, store: RSSFeedStore, k1: float = 1.5, b: float = 0.75):
+        self.store = store
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._version = None
+        self._snapshot = ([], {}, [], 0.0)  # (items, postings, doc_lengths, avg_doc_length)
+    
+    def _current_snapshot(self) -> tuple:
+        # Read the version before the items, so a refresh in between only causes an extra rebuild
+        version = self.store.version
+        if self._version != version:
+            feed_items = self.store.get_feed_items()
+            with self._lock:
+                if self._version != version:
+                    self._snapshot = self._build(feed_items)
+                    self._version = version
+        return self._snapshot
+    
+    @staticmethod
+    def _build(feed_items: List[List[Dict[str, Any]]]) -> tuple:
+        items: List[Dict[str, Any]] = []
+        postings: Dict[str, List[tuple]] = {}
+        doc_lengths: List[int] = []
+        seen_urls = set()
+        for entries in feed_items:
+            for item in entries:
+                if item['url'] in seen_urls:
+                    continue
+                seen_urls.add(item['url'])
+                tokens = tokenize_search_text(item['title'])
+                doc_id = len(items)
+                items.append(item)
+                doc_lengths.append(len(tokens))
+                term_counts: Dict[str, int] = {}
+                for token in tokens:
+                    term_counts[token] = term_counts.get(token, 0) + 1
+                for token, count in term_counts.items():
+                    postings.setdefault(token, []).append((doc_id, count))
+        avg_doc_length = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+        return items, postings, doc_lengths, avg_doc_length
+    
+    def search(self, query: str, limit: int = 10, window_days: int = NEWS_SEARCH_WINDOW_DAYS) -> List[Dict[str, Any]]:
+        """Return up to ``limit`` items within the recency window, ranked by BM25 and recency."""
+        import math
+        from datetime import datetime, timezone
+        
+        items, postings, doc_lengths, avg_doc_length = self._current_snapshot()
+        terms = set(tokenize_search_text(query))
+        if not items or not terms:
+            return []
+        
+        doc_count = len(items)
+        scores: Dict[int, float] = {}
+        for term in terms:
+            term_postings = postings.get(term)
+            if not term_postings:
+                continue
+            idf = math.log(1 + (doc_count - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+            for doc_id, tf in term_postings:
+                norm = self.k1 * (1 - self.b + self.b * doc_lengths[doc_id] / avg_doc_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        
+        now = datetime.now(timezone.utc)
+        ranked = []
+        for doc_id, score in scores.items():
+            pub_date = items[doc_id].get('pubDate')
+            try:
+                age_days = (now - pub_date).total_seconds() / 86400
+            except Exception:
+                # Undated items and naive timestamps (which can't be compared with the aware UTC
+                # 'now') are excluded; generate_supply_chain_news also compares against aware UTC
+                continue
+            if age_days > window_days:
+                continue
+            recency = 0.5 ** (max(age_days, 0.0) / NEWS_SEARCH_RECENCY_HALF_LIFE_DAYS)
+            ranked.append((score * (1 + NEWS_SEARCH_RECENCY_WEIGHT * recency), doc_id))
+        ranked.sort(key=lambda pair: pair[0], reverse=True)
+        return [items[doc_id] for _, doc_id in ranked[:limit]]
+
+headline_search_index = HeadlineSearchIndex(news_feed_store)
+
+def search_supply_chain_news(query: str, limit: int = 10) -> Dict[str, Any]:
+    """Search cached RSS headlines for a query; same item shape as generate_supply_chain_news."""
+    with trace_span('search_supply_chain_news', query=query[:200]) as span:
+        try:
+            matches = headline_search_index.search(query, limit=limit)
+        except Exception as e:
+            print(f"Headline search failed for '{query}': {e}")
+            return {"headlines": []}
+        span.set(results=len(matches))
+    return {"headlines": [
+        {
+            "title": item["title"],
+            "url": item["url"],
+            "source": item["source"],
+            "publishedAt": item["publishedAt"]
+        }
+        for item in matches
+    ]}
+
+@traced()
 def generate_supply_chain_news(prompt: str) -> Dict[str, Any]:
     """Fetch ONLY real supply chain news headlines from RSS within the last 7 days.
 
     Returns a JSON-serializable dict: {"headlines": [{"title", "url", "source", "publishedAt"}, ...]}
     If none are found, returns an empty list (no AI or generic fallbacks).
+    Items come from the shared news_feed_store; only a stale store touches the network.
     """
-    import requests
     from datetime import datetime, timedelta
-    from dateutil import parser
-    from urllib.parse import urlparse
 
     today = datetime.now()
     one_week_ago = today - timedelta(days=7)
@@ -2451,75 +5483,28 @@ def generate_supply_chain_news(prompt: str) -> Dict[str, Any]:
     results: List[Dict[str, Any]] = []
 
     try:
-        rss_feeds = [
-            "https://www.supplychainbrain.com/rss/articles",
-            "https://www.freightwaves.com/news/feed",
-            "https://feeds.feedburner.com/SupplyChainDive",
-            "https://www.inboundlogistics.com/feed/",
-            "https://www.logisticsmgmt.com/rss.xml",
-            "https://www.scmr.com/rss.xml",
-            "https://www.dcvelocity.com/rss.xml",
-            "https://www.mhlnews.com/rss.xml",
-            "https://www.manufacturing.net/rss.xml",
-            "https://www.industryweek.com/rss.xml",
-        ]
-
-        import xml.etree.ElementTree as ET
-
-        for feed_url in rss_feeds:
-            try:
-                response = requests.get(feed_url, timeout=10)
-                if response.status_code != 200:
-                    continue
-                root = ET.fromstring(response.content)
-
-                for item in root.findall('.//item'):
-                    title_elem = item.find('title')
-                    link_elem = item.find('link')
-                    pub_date_elem = item.find('pubDate')
-
-                    title = title_elem.text.strip() if title_elem is not None and title_elem.text else None
-                    url = link_elem.text.strip() if link_elem is not None and link_elem.text else None
-
-                    if not title or len(title) <= 20:
-                        continue
-
+        for feed_items in news_feed_store.get_feed_items():
+            for item in feed_items:
+                pub_date = item.get("pubDate")
+                try:
+                    is_recent = pub_date is not None and pub_date >= one_week_ago
+                except Exception:
                     is_recent = False
-                    published_at_str = None
-                    if pub_date_elem is not None and pub_date_elem.text:
-                        try:
-                            pub_date = parser.parse(pub_date_elem.text)
-                            is_recent = pub_date >= one_week_ago
-                            published_at_str = pub_date.isoformat()
-                        except Exception:
-                            is_recent = False
-
-                    if not is_recent:
-                        continue
+                if not is_recent:
+                    continue
 
-                    source = None
-                    try:
-                        parsed = urlparse(url) if url else urlparse(feed_url)
-                        source = parsed.hostname
-                    except Exception:
-                        source = None
-
-                    results.append({
-                        "title": title,
-                        "url": url or feed_url,
-                        "source": source or "unknown",
-                        "publishedAt": published_at_str or ""
-                    })
-
-                    if len(results) >= 20:
-                        break
+                results.append({
+                    "title": item["title"],
+                    "url": item["url"],
+                    "source": item["source"],
+                    "publishedAt": item["publishedAt"]
+                })
 
                 if len(results) >= 20:
                     break
 
-            except Exception as e:
-                print(f"RSS feed {feed_url} failed: {e}")
-                continue
+            if len(results) >= 20:
+                break
 
         # De-duplicate by (title, source) to keep same headlines from different outlets
         seen_titles = set()
@@ -2585,10 +5570,6 @@ def generate_supply_chain_news(prompt: str) -> Dict[str, Any]:
         # Real-news-only: return empty list on failure
         return {"headlines": []}
 
-
-
-
-
 def get_fallback_recent_news() -> List[str]:
     """Provide fallback supply chain news when APIs fail - these are example headlines."""
     from datetime import datetime
@@ -2609,6 +5590,41 @@ def get_fallback_recent_news() -> List[str]:
 
 def evaluate_suppliers(part_number: str, supplier_data: str, selected_suppliers: list = None, mode: str = None) -> Dict[str, Any]:
     """Evaluate and compare suppliers for a given part number with component-specific analysis."""
+    context = _prepare_supplier_evaluation(part_number, supplier_data, selected_suppliers)
+    if 'error' in context:
+        return context
+    
+    try:
+        print(f"Evaluating suppliers for component: {part_number}")
+        # Base tokens: 3000. Will be adjusted by model config
+        response = make_openai_request(context['prompt'], 3000, mode=mode, endpoint='evaluate_suppliers')
+        print(f"AI Response length: {len(response)} characters")
+        return _render_supplier_evaluation(context, response, part_number)
+    except Exception as e:
+        print(f"Error in supplier evaluation for {part_number}: {str(e)}")
+        return create_component_specific_fallback(part_number, context['component_analysis'])
+
+async def evaluate_suppliers_async(part_number: str, supplier_data: str, selected_suppliers: list = None, mode: str = None) -> Dict[str, Any]:
+    """Async variant of evaluate_suppliers: supplier verification runs in a worker thread, the model call is awaited."""
+    context = await asyncio.to_thread(_prepare_supplier_evaluation, part_number, supplier_data, selected_suppliers)
+    if 'error' in context:
+        return context
+    
+    try:
+        print(f"Evaluating suppliers for component: {part_number}")
+        response = await make_openai_request_async(context['prompt'], 3000, mode=mode, endpoint='evaluate_suppliers')
+        print(f"AI Response length: {len(response)} characters")
+        return _render_supplier_evaluation(context, response, part_number)
+    except Exception as e:
+        print(f"Error in supplier evaluation for {part_number}: {str(e)}")
+        return create_component_specific_fallback(part_number, context['component_analysis'])
+
+@traced()
+def _prepare_supplier_evaluation(part_number: str, supplier_data: str, selected_suppliers: list = None) -> Dict[str, Any]:
+    """Resolve, verify and top up the supplier list and build the evaluation prompt.
+    
+    Returns an ``{"error": ...}`` dict when there is nothing to evaluate.
+    """
     
     # Analyze the component to get specific characteristics
     component_analysis = analyze_component_characteristics(part_number)
@@ -2660,9 +5676,10 @@ def evaluate_suppliers(part_number: str, supplier_data: str, selected_suppliers:
         # Get manufacturer from component analysis for verification
         manufacturer = component_analysis.get('manufacturer', 'Unknown')
         
-        for supplier in selected_suppliers:
-            print(f"Verifying {supplier} has component {part_number}...")
-            if verify_supplier_has_component(supplier, manufacturer, part_number):
+        print(f"Verifying {', '.join(selected_suppliers)} have component {part_number}...")
+        verification_results = verify_suppliers_concurrently(selected_suppliers, manufacturer, part_number)
+        for supplier, available in zip(selected_suppliers, verification_results):
+            if available:
                 verified_predetermined.append(supplier)
                 print(f"✓ {supplier} verified - has component available")
             else:
@@ -2854,80 +5871,83 @@ CRITICAL REQUIREMENTS:
 - The system will automatically rank and show the top 8 suppliers by overall score
 '''
     
+    return {
+        'prompt': ENHANCED_EVALUATION_PROMPT,
+        'component_analysis': component_analysis,
+        'final_suppliers': final_suppliers,
+        'research_added_suppliers': research_added_suppliers,
+    }
+
+def _render_supplier_evaluation(context: Dict[str, Any], response: str, part_number: str) -> Dict[str, Any]:
+    """Parse, rank and decorate the model's supplier comparison, falling back on unparseable output."""
+    component_analysis = context['component_analysis']
+    final_suppliers = context['final_suppliers']
+    research_added_suppliers = context['research_added_suppliers']
+    
+    # Try to parse JSON response
+    import json
     try:
-        print(f"Evaluating suppliers for component: {part_number}")
-        # Base tokens: 3000. Will be adjusted by model config
-        response = make_openai_request(ENHANCED_EVALUATION_PROMPT, 3000, mode=mode)
-        print(f"AI Response length: {len(response)} characters")
-        
-        # Try to parse JSON response
-        import json
-        try:
-            # Clean the response to ensure it's valid JSON
-            response_cleaned = response.strip()
-            if response_cleaned.startswith('```json'):
-                response_cleaned = response_cleaned[7:]
-            if response_cleaned.endswith('```'):
-                response_cleaned = response_cleaned[:-3]
-            response_cleaned = response_cleaned.strip()
+        # Clean the response to ensure it's valid JSON
+        response_cleaned = response.strip()
+        if response_cleaned.startswith('```json'):
+            response_cleaned = response_cleaned[7:]
+        if response_cleaned.endswith('```'):
+            response_cleaned = response_cleaned[:-3]
+        response_cleaned = response_cleaned.strip()
+        
+        evaluation_data = json.loads(response_cleaned)
+        print(f"Successfully parsed JSON response for {part_number}")
+        
+        # Sort suppliers by overall score and limit to top 8
+        if 'comparison' in evaluation_data and evaluation_data['comparison']:
+            # Sort suppliers by overall score (highest first)
+            sorted_suppliers = sorted(
+                evaluation_data['comparison'], 
+                key=lambda x: x.get('overallScore', 0), 
+                reverse=True
+            )
             
-            evaluation_data = json.loads(response_cleaned)
-            print(f"Successfully parsed JSON response for {part_number}")
+            # Take only the top 8 suppliers
+            top_suppliers = sorted_suppliers[:8]
+            evaluation_data['comparison'] = top_suppliers
             
-            # Sort suppliers by overall score and limit to top 8
-            if 'comparison' in evaluation_data and evaluation_data['comparison']:
-                # Sort suppliers by overall score (highest first)
-                sorted_suppliers = sorted(
-                    evaluation_data['comparison'], 
-                    key=lambda x: x.get('overallScore', 0), 
-                    reverse=True
-                )
-                
-                # Take only the top 8 suppliers
-                top_suppliers = sorted_suppliers[:8]
-                evaluation_data['comparison'] = top_suppliers
+            # Reset all recommendations and set only the highest scoring one
+            for supplier in top_suppliers:
+                supplier['recommended'] = False
+            
+            if top_suppliers:
+                best_supplier = top_suppliers[0]  # First in sorted list is highest scoring
+                best_supplier['recommended'] = True
+                highest_score = best_supplier.get('overallScore', 0)
+                evaluation_data['recommendedSupplier'] = best_supplier.get('name', 'Unknown')
                 
-                # Reset all recommendations and set only the highest scoring one
-                for supplier in top_suppliers:
-                    supplier['recommended'] = False
+                # Update recommendation reason to mention the highest score
+                current_reason = evaluation_data.get('recommendationReason', '')
+                evaluation_data['recommendationReason'] = f"{best_supplier.get('name')} achieved the highest overall score ({highest_score}) among {len(top_suppliers)} evaluated suppliers. {current_reason}"
+        
+        # Add order links to each supplier in the comparison
+        if 'comparison' in evaluation_data:
+            for supplier in evaluation_data['comparison']:
+                supplier_name = supplier.get('name', '')
+                manufacturer = supplier.get('manufacturer', component_analysis['manufacturer'])
                 
-                if top_suppliers:
-                    best_supplier = top_suppliers[0]  # First in sorted list is highest scoring
-                    best_supplier['recommended'] = True
-                    highest_score = best_supplier.get('overallScore', 0)
-                    evaluation_data['recommendedSupplier'] = best_supplier.get('name', 'Unknown')
-                    
-                    # Update recommendation reason to mention the highest score
-                    current_reason = evaluation_data.get('recommendationReason', '')
-                    evaluation_data['recommendationReason'] = f"{best_supplier.get('name')} achieved the highest overall score ({highest_score}) among {len(top_suppliers)} evaluated suppliers. {current_reason}"
-            
-            # Add order links to each supplier in the comparison
-            if 'comparison' in evaluation_data:
-                for supplier in evaluation_data['comparison']:
-                    supplier_name = supplier.get('name', '')
-                    manufacturer = supplier.get('manufacturer', component_analysis['manufacturer'])
-                    
-                    # Generate order link using existing function
-                    order_link = generate_supplier_url(supplier_name, manufacturer, part_number)
-                    supplier['orderLink'] = order_link
-            
-            # Add research-added suppliers info to response
-            if research_added_suppliers:
-                evaluation_data['researchAddedSuppliers'] = research_added_suppliers
-                evaluation_data['researchReason'] = f"Added specialized suppliers for {component_analysis.get('type', 'this component')} to ensure comprehensive evaluation"
-            
-            return evaluation_data
-            
-        except json.JSONDecodeError as e:
-            print(f"JSON parsing failed for {part_number}: {str(e)}")
-            print(f"Response content: {response[:200]}...")
-            
-            # Create a truly component-specific fallback
-            return create_component_specific_fallback(part_number, component_analysis, final_suppliers)
-            
-    except Exception as e:
-        print(f"Error in supplier evaluation for {part_number}: {str(e)}")
-        return create_component_specific_fallback(part_number, component_analysis)
+                # Generate order link using existing function
+                order_link = generate_supplier_url(supplier_name, manufacturer, part_number)
+                supplier['orderLink'] = order_link
+        
+        # Add research-added suppliers info to response
+        if research_added_suppliers:
+            evaluation_data['researchAddedSuppliers'] = research_added_suppliers
+            evaluation_data['researchReason'] = f"Added specialized suppliers for {component_analysis.get('type', 'this component')} to ensure comprehensive evaluation"
+        
+        return evaluation_data
+        
+    except json.JSONDecodeError as e:
+        print(f"JSON parsing failed for {part_number}: {str(e)}")
+        print(f"Response content: {response[:200]}...")
+        
+        # Create a truly component-specific fallback
+        return create_component_specific_fallback(part_number, component_analysis, final_suppliers)
 
 def analyze_component_characteristics(part_number: str) -> Dict[str, Any]:
     """Analyze component characteristics to inform supplier evaluation."""
@@ -3186,8 +6206,29 @@ def create_component_specific_fallback(part_number: str, component_analysis: Dic
 
 def get_component_info(part_number: str) -> Dict[str, Any]:
     """Get detailed component description and image using AI analysis."""
-    
-    COMPONENT_INFO_PROMPT = f'''
+    try:
+        # Get component description from AI
+        description = make_openai_request(_build_component_info_prompt(part_number), 2000, endpoint='component_info')
+        
+        # Try to find component image (this would typically integrate with component databases)
+        # For now, we'll use a placeholder approach
+        image_url = find_component_image(part_number)
+        return _render_component_info(part_number, description, image_url)
+        
+    except Exception as e:
+        return _component_info_fallback(part_number, e)
+
+async def get_component_info_async(part_number: str) -> Dict[str, Any]:
+    """Async variant of get_component_info: the image lookup runs in a worker thread."""
+    try:
+        description = await make_openai_request_async(_build_component_info_prompt(part_number), 2000, endpoint='component_info')
+        image_url = await asyncio.to_thread(find_component_image, part_number)
+        return _render_component_info(part_number, description, image_url)
+    except Exception as e:
+        return _component_info_fallback(part_number, e)
+
+def _build_component_info_prompt(part_number: str) -> str:
+    return f'''
 Provide a concise, visually appealing summary for the electronic component: {part_number}
 
 Format as exactly 6 lines or less, using this structure:
@@ -3201,37 +6242,31 @@ Format as exactly 6 lines or less, using this structure:
 Keep it professional, concise, and easy to scan. Use bullet points and bold text for key information.
 Focus on the most essential information an engineer would need for component selection.
 '''
+
+def _render_component_info(part_number: str, description: str, image_url: str) -> Dict[str, Any]:
+    print(f"✓ Component info for {part_number}:")
+    print(f"  - Description length: {len(description) if description else 0}")
+    print(f"  - Image URL: {image_url[:100] if image_url else 'None'}...")
+    print(f"  - Image URL type: {type(image_url)}")
     
-    try:
-        # Get component description from AI
-        description = make_openai_request(COMPONENT_INFO_PROMPT, 2000)
-        
-        # Try to find component image (this would typically integrate with component databases)
-        # For now, we'll use a placeholder approach
-        image_url = find_component_image(part_number)
-        
-        print(f"✓ Component info for {part_number}:")
-        print(f"  - Description length: {len(description) if description else 0}")
-        print(f"  - Image URL: {image_url[:100] if image_url else 'None'}...")
-        print(f"  - Image URL type: {type(image_url)}")
-        
-        return {
-            "description": description,
-            "imageUrl": image_url,
-            "partNumber": part_number
-        }
-        
-    except Exception as e:
-        print(f"✗ Error in get_component_info for {part_number}: {str(e)}")
-        # Even on error, return a placeholder image
-        fallback_image = get_enhanced_placeholder_image(part_number)
-        return {
-            "description": f"Unable to retrieve detailed information for component {part_number}. Please refer to the manufacturer's datasheet for complete specifications.",
-            "imageUrl": fallback_image,
-            "partNumber": part_number,
-            "error": str(e)
-        }
+    return {
+        "description": description,
+        "imageUrl": image_url,
+        "partNumber": part_number
+    }
+
+def _component_info_fallback(part_number: str, e: Exception) -> Dict[str, Any]:
+    print(f"✗ Error in get_component_info for {part_number}: {str(e)}")
+    # Even on error, return a placeholder image
+    fallback_image = get_enhanced_placeholder_image(part_number)
+    return {
+        "description": f"Unable to retrieve detailed information for component {part_number}. Please refer to the manufacturer's datasheet for complete specifications.",
+        "imageUrl": fallback_image,
+        "partNumber": part_number,
+        "error": str(e)
+    }
 
+@traced()
 def find_component_image(part_number: str) -> str:
     """
     Find component image URL from curated sources and realistic image generators.
@@ -3621,20 +6656,34 @@ def get_enhanced_placeholder_image(part_number: str) -> str:
 
 def generate_ai_action(action_type: str, action_description: str, scenario_id: str = None, scenario_description: str = None, affected_components: str = None, bom_data: str = None, user_context: str = None, mode: str = None) -> Dict[str, str]:
     """Generate AI-assisted action content based on the action type and context."""
+    AI_ACTION_PROMPT = _build_ai_action_prompt(action_type, action_description, scenario_id, scenario_description,
+                                            affected_components, bom_data, user_context)
+    try:
+        # Base tokens: 4000. Will be adjusted by model config
+        ai_content = make_openai_request(AI_ACTION_PROMPT, 4000, mode=mode, endpoint='ai_action')
+        return {"result": ai_content}
+    except Exception as e:
+        return {"error": f"Failed to generate AI action content: {str(e)}"}
+
+async def generate_ai_action_async(action_type: str, action_description: str, scenario_id: str = None, scenario_description: str = None, affected_components: str = None, bom_data: str = None, user_context: str = None, mode: str = None) -> Dict[str, str]:
+    """Async variant of generate_ai_action for use from async endpoints."""
+    action_prompt = _build_ai_action_prompt(action_type, action_description, scenario_id, scenario_description,
+                                            affected_components, bom_data, user_context)
+    try:
+        ai_content = await make_openai_request_async(action_prompt, 4000, mode=mode, endpoint='ai_action')
+        return {"result": ai_content}
+    except Exception as e:
+        return {"error": f"Failed to generate AI action content: {str(e)}"}
+
+def _build_ai_action_prompt(action_type: str, action_description: str, scenario_id: str = None, scenario_description: str = None, affected_components: str = None, bom_data: str = None, user_context: str = None) -> str:
+    """Build the AI action prompt from the action request, scenario and BOM context."""
     
     # Parse BOM data if provided
     component_details = ""
     if bom_data:
         try:
-            if isinstance(bom_data, str):
-                try:
-                    parsed_bom = json.loads(bom_data)
-                except Exception:
-                    parsed_bom = parse_csv_data(bom_data)
-            else:
-                parsed_bom = bom_data
-                
-            if isinstance(parsed_bom, list) and parsed_bom:
+            parsed_bom = ParsedBOM.from_input(bom_data).rows
+            if parsed_bom:
                 component_details = "\n\nRelevant Component Details:\n" + '\n'.join([
                     f"- {item.get('Manufacturer Part #', item.get('Part Number', 'N/A'))}: {item.get('Description', 'N/A')} "
                     f"from {item.get('Manufacturer', 'N/A')}, Supplier: {item.get('Supplier', 'N/A')}, "
@@ -3712,14 +6761,9 @@ REQUIREMENTS:
 
 Generate comprehensive, professional content that can be immediately used by the supply chain team.
 '''
-    
-    try:
-        # Base tokens: 4000. Will be adjusted by model config
-        ai_content = make_openai_request(AI_ACTION_PROMPT, 4000, mode=mode)
-        return {"result": ai_content}
-    except Exception as e:
-        return {"error": f"Failed to generate AI action content: {str(e)}"}
+    return AI_ACTION_PROMPT
 
+@traced()
 def analyze_kpi_data(kpi: Any) -> Dict[str, Any]:
     """Analyze KPI data and extract key insights for disruption analysis."""
     if not kpi:
@@ -3901,4 +6945,291 @@ This message was sent through the website contact form.
         
     except Exception as e:
         print(f"Error handling contact form: {str(e)}")
-        return {"error": "An error occurred while processing your request. Please try again."}
\ No newline at end of file
+        return {"error": "An error occurred while processing your request. Please try again."}
+
+# --- Analysis Job Queue ---
+# Disruption analyses, explanations and mitigation plans can run for minutes. Submitted as
+# jobs they return a job ID at once; clients poll or stream the status and fetch the result
+# later, so a dropped connection no longer throws away a finished model run. Jobs run on
+# JOB_WORKERS worker tasks, each user may have JOB_MAX_ACTIVE_PER_USER jobs queued or running,
+# and jobs are kept in SQLite for JOB_RESULT_RETENTION seconds.
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+JOB_MAX_ACTIVE_PER_USER = int(os.getenv('JOB_MAX_ACTIVE_PER_USER', '3'))
+JOB_RESULT_RETENTION = int(os.getenv('JOB_RESULT_RETENTION', '86400'))  # seconds
+JOB_DB_PATH = os.getenv(
+    'JOB_DB_PATH', os.path.join(os.path.dirname(__file__), '../cache/analysis_jobs.sqlite3')
+)  # empty keeps jobs in memory only
+JOB_EVENT_HEARTBEAT = 15  # seconds between status events while a streamed job runs
+
+JOB_HANDLERS = {
+    'disruption_analysis': disruption_analysis_async,
+    'disruption_explain': disruption_explain_async,
+    'mitigation_plan': mitigation_plan_async,
+}
+
+JOB_ACTIVE_STATES = ('queued', 'running')
+
+class JobLimitError(Exception):
+    """Raised when a user already has the maximum number of active jobs."""
+
+class AnalysisJob:
+    """One submitted analysis and, once finished, its result."""
+    
+    def __init__(self, job_id: str, kind: str, user: str, fingerprint: str, params: Optional[Dict[str, Any]] = None):
+        self.job_id = job_id
+        self.kind = kind
+        self.user = user
+        self.fingerprint = fingerprint
+        self.params = params
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.done = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.cancel_token = CancelToken()
+    
+    @property
+    def finished(self) -> bool:
+        return self.status not in JOB_ACTIVE_STATES
+    
+    def to_dict(self, include_result: bool = False) -> Dict[str, Any]:
+        data = {
+            'jobId': self.job_id,
+            'kind': self.kind,
+            'status': self.status,
+            'createdAt': self.created_at,
+            'startedAt': self.started_at,
+            'finishedAt': self.finished_at,
+            'error': self.error,
+        }
+        if self.started_at:
+            data['elapsedSeconds'] = round((self.finished_at or time.time()) - self.started_at, 1)
+        if include_result:
+            data['result'] = self.result
+        return data
+    
+    def to_record(self) -> str:
+        return json.dumps({**self.to_dict(include_result=True), 'user': self.user, 'fingerprint': self.fingerprint})
+    
+    @classmethod
+    def from_record(cls, record: str) -> 'AnalysisJob':
+        data = json.loads(record)
+        job = cls(data['jobId'], data['kind'], data.get('user', ''), data.get('fingerprint', ''))
+        job.status = data['status']
+        job.created_at = data['createdAt']
+        job.started_at = data.get('startedAt')
+        job.finished_at = data.get('finishedAt')
+        job.result = data.get('result')
+        job.error = data.get('error')
+        if job.status in JOB_ACTIVE_STATES:
+            # Still marked active on disk but not running here: the server restarted mid-job
+            job.status = 'interrupted'
+            job.error = 'The server restarted before this job finished; please resubmit.'
+        job.done.set()
+        return job
+
+class AnalysisJobQueue:
+    """Bounded pool of asyncio workers running JOB_HANDLERS, with per-user caps and persistence."""
+    
+    def __init__(self, handlers: Dict[str, Callable], workers: int = JOB_WORKERS,
+                 max_active_per_user: int = JOB_MAX_ACTIVE_PER_USER,
+                 retention: int = JOB_RESULT_RETENTION, db_path: str = JOB_DB_PATH):
+        self.handlers = handlers
+        self.workers = workers
+        self.max_active_per_user = max_active_per_user
+        self.retention = retention
+        self._jobs: "OrderedDict[str, AnalysisJob]" = OrderedDict()
+        self._by_fingerprint: Dict[str, str] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._stopping = False
+        self._disk: Optional[SQLiteTTLStore] = None
+        if db_path:
+            try:
+                self._disk = SQLiteTTLStore(db_path, 'analysis_jobs')
+            except Exception as e:
+                print(f"Warning: job database unavailable ({db_path}): {e}")
+        self.stats = {'submitted': 0, 'deduplicated': 0, 'rejected': 0, 'succeeded': 0, 'failed': 0, 'cancelled': 0}
+    
+    async def start(self) -> None:
+        """Start the worker tasks on the running event loop (no-op if already running)."""
+        if self._worker_tasks:
+            return
+        self._stopping = False
+        self._queue = asyncio.Queue()
+        self._worker_tasks = [asyncio.create_task(self._worker(index)) for index in range(self.workers)]
+        print(f"Analysis job queue started with {self.workers} workers")
+    
+    async def stop(self) -> None:
+        # Running jobs stay active on disk, so they report 'interrupted' after a restart
+        self._stopping = True
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        self._queue = None
+    
+    async def submit(self, kind: str, params: Dict[str, Any], user: str) -> tuple:
+        """Queue a job; returns (job, created). An identical active or retained job from the same
+        user is returned instead of starting a new run."""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job type: {kind}")
+        await self.start()
+        self._prune()
+        fingerprint = hashlib.sha256(
+            json.dumps([kind, user, params], sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()
+        existing = self._find_by_fingerprint(fingerprint)
+        if existing is not None and existing.status in JOB_ACTIVE_STATES + ('succeeded',):
+            self.stats['deduplicated'] += 1
+            return existing, False
+        
+        active = sum(1 for job in self._jobs.values() if job.user == user and job.status in JOB_ACTIVE_STATES)
+        if active >= self.max_active_per_user:
+            self.stats['rejected'] += 1
+            raise JobLimitError(f"Too many active jobs ({active}); wait for one to finish before submitting another.")
+        
+        job = AnalysisJob(uuid.uuid4().hex, kind, user, fingerprint, params)
+        self._jobs[job.job_id] = job
+        self._by_fingerprint[fingerprint] = job.job_id
+        self._persist(job)
+        self.stats['submitted'] += 1
+        self._queue.put_nowait(job)
+        return job, True
+    
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        job = self._jobs.get(job_id)
+        if job is None and self._disk is not None:
+            try:
+                record = self._disk.get(f"job:{job_id}")
+                if record:
+                    job = AnalysisJob.from_record(record)
+            except Exception as e:
+                print(f"Warning: could not load job {job_id}: {e}")
+        return job
+    
+    def cancel(self, job_id: str) -> Optional[AnalysisJob]:
+        """Cancel a job. Call from the queue's event loop: it cancels tasks and sets asyncio events."""
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return job
+        if job.task is not None:
+            job.cancel_token.cancel('Job cancelled')
+            job.task.cancel()  # the worker records the cancellation
+        else:
+            self._finish(job, 'cancelled', None, 'Cancelled before it started')
+        return job
+    
+    async def events(self, job_id: str) -> AsyncIterator[tuple]:
+        """(event, data) pairs for Server-Sent Events: status updates, then result or error."""
+        job = self.get(job_id)
+        if job is None:
+            yield 'error', {'error': f"Unknown job {job_id}"}
+            return
+        while not job.finished:
+            yield 'status', job.to_dict()
+            try:
+                await asyncio.wait_for(job.done.wait(), timeout=JOB_EVENT_HEARTBEAT)
+            except asyncio.TimeoutError:
+                pass
+        if job.status == 'succeeded':
+            yield 'result', job.result or {}
+        else:
+            yield 'error', {**job.to_dict(), 'error': job.error or (job.result or {}).get('error')}
+    
+    def snapshot(self) -> Dict[str, Any]:
+        states: Dict[str, int] = {}
+        for job in self._jobs.values():
+            states[job.status] = states.get(job.status, 0) + 1
+        return {
+            **self.stats,
+            'workers': self.workers,
+            'workers_running': len(self._worker_tasks),
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'jobs_in_memory': states,
+            'max_active_per_user': self.max_active_per_user,
+            'retention_seconds': self.retention,
+            'persistent': self._disk is not None,
+        }
+    
+    async def _worker(self, index: int) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.status != 'queued':
+                    continue
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+    
+    async def _run(self, job: AnalysisJob) -> None:
+        job.status = 'running'
+        job.started_at = time.time()
+        self._persist(job)
+        params, job.params = job.params or {}, None
+        with request_trace(f"job-{job.job_id}", f"job {job.kind}", **{'job.id': job.job_id, 'job.kind': job.kind}):
+            reset = _cancel_token.set(job.cancel_token)
+            try:
+                job.task = asyncio.create_task(self.handlers[job.kind](**params))
+            finally:
+                _cancel_token.reset(reset)
+            try:
+                result = await job.task
+            except asyncio.CancelledError:
+                # Cancelling the worker also cancels job.task, so only cancel() marks a user cancellation
+                if self._stopping or not job.cancel_token.cancelled:
+                    raise  # the worker itself is being stopped
+                self._finish(job, 'cancelled', None, 'Cancelled while running')
+                return
+            except RequestCancelled:
+                self._finish(job, 'cancelled', None, 'Cancelled while running')
+                return
+            except Exception as e:
+                self._finish(job, 'failed', None, str(e))
+                return
+            finally:
+                job.task = None
+        failed = isinstance(result, dict) and 'error' in result and len(result) == 1
+        self._finish(job, 'failed' if failed else 'succeeded', result, result.get('error') if failed else None)
+    
+    def _finish(self, job: AnalysisJob, status: str, result: Optional[Dict[str, Any]], error: Optional[str]) -> None:
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        job.params = None
+        self.stats[status] = self.stats.get(status, 0) + 1
+        self._persist(job)
+        job.done.set()
+        print(f"Job {job.job_id} ({job.kind}) {status}")
+    
+    def _persist(self, job: AnalysisJob) -> None:
+        if self._disk is None:
+            return
+        try:
+            self._disk.set(f"job:{job.job_id}", job.to_record(), self.retention)
+            self._disk.set(f"fingerprint:{job.fingerprint}", job.job_id, self.retention)
+        except Exception as e:
+            print(f"Warning: could not persist job {job.job_id}: {e}")
+    
+    def _find_by_fingerprint(self, fingerprint: str) -> Optional[AnalysisJob]:
+        job_id = self._by_fingerprint.get(fingerprint)
+        if job_id is None and self._disk is not None:
+            try:
+                job_id = self._disk.get(f"fingerprint:{fingerprint}")
+            except Exception:
+                job_id = None
+        return self.get(job_id) if job_id else None
+    
+    def _prune(self) -> None:
+        """Drop finished jobs past the retention period from memory (SQLite expires its own copies)."""
+        cutoff = time.time() - self.retention
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished and (job.finished_at or 0) < cutoff]:
+            job = self._jobs.pop(job_id)
+            if self._by_fingerprint.get(job.fingerprint) == job_id:
+                del self._by_fingerprint[job.fingerprint]
+
+job_queue = AnalysisJobQueue(JOB_HANDLERS)
@@ -1,9 +1,12 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
+from typing import List
 import os
+import re
+import uuid
 from . import helpers
 
 app = FastAPI()
@@ -24,6 +27,38 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class RequestTraceMiddleware:
+    """Give every /api request a request ID (X-Request-ID, echoed back) and a helpers trace.
+    
+    Written as plain ASGI middleware so streamed responses are traced until the last byte.
+    """
+    
+    UNTRACED_PREFIXES = ('/api/traces', '/metrics')
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        path = scope.get('path', '')
+        if scope['type'] != 'http' or not path.startswith('/api/') or path.startswith(self.UNTRACED_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        
+        incoming = dict(scope.get('headers') or []).get(b'x-request-id', b'').decode('latin-1')
+        request_id = incoming if re.fullmatch(r'[A-Za-z0-9._-]{1,64}', incoming) else uuid.uuid4().hex
+        
+        with helpers.request_trace(request_id, f"{scope['method']} {path}",
+                                   **{'http.method': scope['method'], 'http.route': path}) as root:
+            async def send_with_request_id(message):
+                if message['type'] == 'http.response.start':
+                    message['headers'] = list(message.get('headers', [])) + [(b'x-request-id', request_id.encode())]
+                    root.set(**{'http.status_code': message['status']})
+                await send(message)
+            
+            await self.app(scope, receive, send_with_request_id)
+
+app.add_middleware(RequestTraceMiddleware)
+
 # Serve static files from the frontend directory
 app.mount("/static", StaticFiles(directory=os.path.join(os.path.dirname(__file__), '../frontend'), html=True), name="static")
 
@@ -51,6 +86,21 @@ class DisruptionExplainRequest(BaseModel):
     openText: str = None
     mode: str = None  # 'comprehensive' or 'fast'
 
+class ScenarioToExplain(BaseModel):
+    scenarioId: str
+    scenarioDescription: str
+    affectedComponents: str = None
+    possibleDelay: str = None
+    probability: str = None
+    explainableDetails: str = None
+
+class DisruptionExplainBatchRequest(BaseModel):
+    scenarios: List[ScenarioToExplain]
+    bom: str = None
+    kpi: str = None
+    openText: str = None
+    mode: str = None  # 'comprehensive' or 'fast'
+
 class MitigationPlanRequest(BaseModel):
     scenarioId: str
     recommendation: str
@@ -96,6 +146,20 @@ class ContactRequest(BaseModel):
     subject: str
     message: str
 
+@app.on_event("startup")
+async def start_background_refreshers():
+    """Keep the market data snapshot warm so requests never wait on market APIs, and start the job workers."""
+    helpers.market_data_store.start()
+    await helpers.job_queue.start()
+
+@app.on_event("shutdown")
+async def close_llm_connections():
+    """Release pooled LLM API connections when the server stops."""
+    helpers.market_data_store.stop()
+    await helpers.job_queue.stop()
+    helpers.close_llm_session()
+    await helpers.close_async_llm_clients()
+
 @app.get("/api/model-modes")
 def get_model_modes():
     """API endpoint to get available AI model modes."""
@@ -104,27 +168,76 @@ def get_model_modes():
         "default": helpers.DEFAULT_MODE
     }
 
+@app.get("/api/llm-cache/stats")
+def llm_cache_stats():
+    """API endpoint reporting LLM response cache hit/miss counters."""
+    return helpers.get_llm_cache_stats()
+
+@app.get("/api/llm-metrics")
+def llm_metrics_summary(recent: int = 0):
+    """Per-endpoint token usage and latency over the most recent model calls, plus the latencies used for hedging."""
+    summary = helpers.llm_metrics.summary(recent=min(max(recent, 0), 200))
+    summary["provider_latency"] = helpers.provider_latency.snapshot()
+    return summary
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Model call counters and latency histograms in the Prometheus text format."""
+    return PlainTextResponse(helpers.llm_metrics.prometheus_text(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/llm-rate-limits")
+def llm_rate_limits():
+    """Current limits, queue depth and 429 counters of the model rate governor."""
+    return helpers.model_rate_governor.snapshot()
+
+@app.get("/api/traces")
+def recent_traces(limit: int = 20):
+    """Timing breakdowns of the most recent API requests."""
+    return {"traces": [trace.summary() for trace in helpers.trace_store.recent(min(max(limit, 1), 200))]}
+
+@app.get("/api/traces/{request_id}")
+def get_trace(request_id: str, format: str = "summary"):
+    """One request's spans, as a summary or as OpenTelemetry OTLP/JSON (format=otlp)."""
+    trace = helpers.trace_store.get(request_id)
+    if trace is None:
+        return {"error": f"No trace recorded for request {request_id}"}
+    return trace.to_otlp() if format == "otlp" else trace.summary()
+
+@app.get("/api/news-feed/stats")
+def news_feed_stats():
+    """Refresh counters and freshness of the shared RSS feed store."""
+    return helpers.news_feed_store.snapshot()
+
+@app.get("/api/supplier-availability/stats")
+def supplier_availability_stats():
+    """Hit/miss counters for the cached supplier website verification results."""
+    return helpers.supplier_availability_cache.snapshot()
+
+async def until_disconnect(request: Request, work):
+    """Await a helper coroutine, cancelling it (model calls, stages and retries included) if the client goes away."""
+    return await helpers.cancel_on_disconnect(work, request.is_disconnected)
+
 @app.post("/api/find-supplier")
-def find_supplier(req: FindSupplierRequest):
+async def find_supplier(req: FindSupplierRequest, request: Request):
     """API endpoint to find suppliers for a part number."""
     try:
-        return helpers.find_supplier(req.partNumber)
+        return await until_disconnect(request, helpers.find_supplier_async(req.partNumber))
     except Exception as e:
         return {"error": str(e)}
 
 @app.post("/api/disruption-analysis")
-def disruption_analysis(req: DisruptionAnalysisRequest):
+async def disruption_analysis(req: DisruptionAnalysisRequest, request: Request):
     """API endpoint for disruption analysis."""
     try:
-        return helpers.disruption_analysis(req.bom, req.kpi, req.openText, req.mode)
+        return await until_disconnect(request, helpers.disruption_analysis_async(req.bom, req.kpi, req.openText, req.mode))
     except Exception as e:
         return {"error": str(e)}
 
 @app.post("/api/disruption-explain")
-def disruption_explain(req: DisruptionExplainRequest):
+async def disruption_explain(req: DisruptionExplainRequest, request: Request):
     """API endpoint for detailed disruption scenario explanation."""
     try:
-        return helpers.disruption_explain(
+        return await until_disconnect(request, helpers.disruption_explain_async(
             req.scenarioId, 
             req.bom, 
             req.kpi, 
@@ -135,15 +248,29 @@ def disruption_explain(req: DisruptionExplainRequest):
             req.probability,
             req.explainableDetails,
             req.mode
-        )
+        ))
+    except Exception as e:
+        return {"error": str(e)}
+
+@app.post("/api/disruption-explain/batch")
+async def disruption_explain_batch(req: DisruptionExplainBatchRequest, request: Request):
+    """Explain all scenarios of one analysis with shared context and one article validation call."""
+    try:
+        return await until_disconnect(request, helpers.disruption_explain_batch_async(
+            [scenario.model_dump() for scenario in req.scenarios],
+            req.bom,
+            req.kpi,
+            req.openText,
+            req.mode
+        ))
     except Exception as e:
         return {"error": str(e)}
 
 @app.post("/api/mitigation-plan")
-def mitigation_plan(req: MitigationPlanRequest):
+async def mitigation_plan(req: MitigationPlanRequest, request: Request):
     """API endpoint for detailed mitigation action plan."""
     try:
-        return helpers.mitigation_plan(
+        return await until_disconnect(request, helpers.mitigation_plan_async(
             req.scenarioId, 
             req.recommendation, 
             req.bom, 
@@ -157,10 +284,169 @@ def mitigation_plan(req: MitigationPlanRequest):
             req.scenarioExplanation,
             req.userInput,
             req.mode
-        )
+        ))
     except Exception as e:
         return {"error": str(e)}
 
+def sse_response(events):
+    """Wrap an async (event, data) generator from helpers as a Server-Sent Events response."""
+    async def body():
+        # Starlette stops iterating when the client disconnects; the token then stops worker threads too
+        token = helpers.bind_cancel_token()
+        finished = False
+        try:
+            async for event, data in events:
+                yield helpers.format_sse_event(event, data)
+            finished = True
+        finally:
+            if not finished:
+                token.cancel("Client disconnected")
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/disruption-analysis/stream")
+async def disruption_analysis_stream(req: DisruptionAnalysisRequest):
+    """Streaming (SSE) variant of /api/disruption-analysis."""
+    return sse_response(helpers.disruption_analysis_stream(req.bom, req.kpi, req.openText, req.mode))
+
+@app.post("/api/disruption-explain/stream")
+async def disruption_explain_stream(req: DisruptionExplainRequest):
+    """Streaming (SSE) variant of /api/disruption-explain."""
+    return sse_response(helpers.disruption_explain_stream(
+        req.scenarioId, 
+        req.bom, 
+        req.kpi, 
+        req.openText, 
+        req.scenarioDescription,
+        req.affectedComponents,
+        req.possibleDelay,
+        req.probability,
+        req.explainableDetails,
+        req.mode
+    ))
+
+@app.post("/api/mitigation-plan/stream")
+async def mitigation_plan_stream(req: MitigationPlanRequest):
+    """Streaming (SSE) variant of /api/mitigation-plan."""
+    return sse_response(helpers.mitigation_plan_stream(
+        req.scenarioId, 
+        req.recommendation, 
+        req.bom, 
+        req.kpi, 
+        req.openText, 
+        req.scenarioDescription, 
+        req.affectedComponents,
+        req.possibleDelay,
+        req.probability,
+        req.explainableDetails,
+        req.scenarioExplanation,
+        req.userInput,
+        req.mode
+    ))
+
+def job_user(request: Request) -> str:
+    """Who a job belongs to for the per-user cap: the X-User-ID header, else the client address."""
+    user = request.headers.get("x-user-id")
+    if user:
+        return user[:128]
+    return request.client.host if request.client else "anonymous"
+
+async def submit_job(request: Request, kind: str, params: dict):
+    try:
+        job, created = await helpers.job_queue.submit(kind, params, job_user(request))
+    except helpers.JobLimitError as e:
+        return JSONResponse({"error": str(e)}, status_code=429)
+    except Exception as e:
+        return {"error": str(e)}
+    base = f"/api/jobs/{job.job_id}"
+    return JSONResponse(
+        {**job.to_dict(), "created": created, "statusUrl": base, "resultUrl": f"{base}/result", "eventsUrl": f"{base}/events"},
+        status_code=202 if created else 200
+    )
+
+@app.post("/api/jobs/disruption-analysis")
+async def submit_disruption_analysis_job(req: DisruptionAnalysisRequest, request: Request):
+    """Queue a disruption analysis as a background job."""
+    return await submit_job(request, "disruption_analysis", {
+        "bom": req.bom, "kpi": req.kpi, "open_text": req.openText, "mode": req.mode
+    })
+
+@app.post("/api/jobs/disruption-explain")
+async def submit_disruption_explain_job(req: DisruptionExplainRequest, request: Request):
+    """Queue a disruption scenario explanation as a background job."""
+    return await submit_job(request, "disruption_explain", {
+        "scenario_id": req.scenarioId,
+        "bom": req.bom,
+        "kpi": req.kpi,
+        "open_text": req.openText,
+        "scenario_description": req.scenarioDescription,
+        "affected_components": req.affectedComponents,
+        "possible_delay": req.possibleDelay,
+        "probability": req.probability,
+        "explainable_details": req.explainableDetails,
+        "mode": req.mode
+    })
+
+@app.post("/api/jobs/mitigation-plan")
+async def submit_mitigation_plan_job(req: MitigationPlanRequest, request: Request):
+    """Queue a mitigation action plan as a background job."""
+    return await submit_job(request, "mitigation_plan", {
+        "scenario_id": req.scenarioId,
+        "recommendation": req.recommendation,
+        "bom": req.bom,
+        "kpi": req.kpi,
+        "open_text": req.openText,
+        "scenario_description": req.scenarioDescription,
+        "affected_components": req.affectedComponents,
+        "possible_delay": req.possibleDelay,
+        "probability": req.probability,
+        "explainable_details": req.explainableDetails,
+        "scenario_explanation": req.scenarioExplanation,
+        "user_input": req.userInput,
+        "mode": req.mode
+    })
+
+@app.get("/api/jobs/stats")
+def job_queue_stats():
+    """Worker, queue and outcome counters of the analysis job queue."""
+    return helpers.job_queue.snapshot()
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str):
+    """Status of a job, with its result once it has finished."""
+    job = helpers.job_queue.get(job_id)
+    if job is None:
+        return JSONResponse({"error": f"Unknown or expired job {job_id}"}, status_code=404)
+    return job.to_dict(include_result=job.finished)
+
+@app.get("/api/jobs/{job_id}/result")
+def get_job_result(job_id: str):
+    """The finished job's result; 202 with the status while it is still queued or running."""
+    job = helpers.job_queue.get(job_id)
+    if job is None:
+        return JSONResponse({"error": f"Unknown or expired job {job_id}"}, status_code=404)
+    if not job.finished:
+        return JSONResponse(job.to_dict(), status_code=202)
+    if job.status != "succeeded":
+        return {"error": job.error or "Job did not complete", "status": job.status}
+    return job.result
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-Sent Events for a job: periodic status events, then the result. Safe to reconnect."""
+    return sse_response(helpers.job_queue.events(job_id))
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job (async so it runs on the event loop that owns the job tasks)."""
+    job = helpers.job_queue.cancel(job_id)
+    if job is None:
+        return JSONResponse({"error": f"Unknown or expired job {job_id}"}, status_code=404)
+    return job.to_dict()
+
 @app.post("/api/generate-supply-chain-news")
 def generate_supply_chain_news(req: NewsGenerationRequest):
     """API endpoint for generating AI-powered supply chain news headlines."""
@@ -170,26 +456,26 @@ def generate_supply_chain_news(req: NewsGenerationRequest):
         return {"error": str(e)}
 
 @app.post("/api/evaluate-suppliers")
-def evaluate_suppliers(req: SupplierEvaluationRequest):
+async def evaluate_suppliers(req: SupplierEvaluationRequest, request: Request):
     """API endpoint for evaluating and comparing suppliers."""
     try:
-        return helpers.evaluate_suppliers(req.partNumber, req.supplierData, req.selectedSuppliers, req.mode)
+        return await until_disconnect(request, helpers.evaluate_suppliers_async(req.partNumber, req.supplierData, req.selectedSuppliers, req.mode))
     except Exception as e:
         return {"error": str(e)}
 
 @app.post("/api/component-info")
-def component_info(req: ComponentInfoRequest):
+async def component_info(req: ComponentInfoRequest, request: Request):
     """API endpoint for getting detailed component information and image."""
     try:
-        return helpers.get_component_info(req.partNumber)
+        return await until_disconnect(request, helpers.get_component_info_async(req.partNumber))
     except Exception as e:
         return {"error": str(e)}
 
 @app.post("/api/ai-action")
-def ai_action(req: AIActionRequest):
+async def ai_action(req: AIActionRequest, request: Request):
     """API endpoint for generating AI-assisted action content."""
     try:
-        return helpers.generate_ai_action(
+        return await until_disconnect(request, helpers.generate_ai_action_async(
             req.actionType,
             req.actionDescription,
             req.scenarioId,
@@ -198,7 +484,7 @@ def ai_action(req: AIActionRequest):
             req.bomData,
             req.userContext,
             req.mode
-        )
+        ))
     except Exception as e:
         return {"error": str(e)}
 
@@ -218,11 +504,11 @@ def contact_form(req: ContactRequest):
         return {"error": str(e)}
 
 @app.get("/api/test-openai")
-def test_openai():
+async def test_openai():
     """Test endpoint to check OpenAI API connectivity."""
     try:
         # Test the OpenAI API directly
-        result = helpers.make_openai_request("Say 'API test successful'", 50)
+        result = await helpers.make_openai_request_async("Say 'API test successful'", 50)
         return {
             "success": True,
             "message": "OpenAI API is working",
@@ -0,0 +1,168 @@
+"""
+Supplier directory shared by the helpers and the application settings.
+
+SUPPLIER_LEAD_TIMES and SUPPLIER_URL_PATTERNS are the single copy of the supplier tables;
+config.Settings exposes these same objects. SupplierResolver matches a free-form supplier
+name against them once per distinct name and memoizes the result.
+"""
+
+import re
+import threading
+import urllib.parse
+from typing import Callable, Dict, FrozenSet, Optional
+
+DEFAULT_SUPPLIER_LEAD_TIME = 7  # days, when the supplier is not in the table
+
+# Supplier lead time estimates (in days)
+SUPPLIER_LEAD_TIMES = {
+    'tme': 5,
+    'digi-key': 3, 'digikey': 3, 'mouser': 5, 'jlcpcb': 7, 'pcbway': 7,
+    'oshpark': 10, 'adafruit': 5, 'sparkfun': 5, 'arrow': 7, 'avnet': 7,
+    'newark': 5, 'farnell': 5, 'element14': 5, 'rs-components': 5, 'allied': 5,
+    'mcmaster': 2, 'mcmaster-carr': 2, 'stockwell': 7, 'essentra': 5, 'richco': 7,
+    'hammond': 10, 'te connectivity': 7, 'microchip': 14, 'vishay': 10,
+    'samsung': 14, 'lite-on': 10, 'rutronik': 7
+}
+
+# Supplier search URL builders, tried in order; the first key found in the supplier name wins
+SUPPLIER_URL_PATTERNS = {
+    'tme': lambda manufacturer, partNumber: f"https://www.tme.com/en/katalog/?search={partNumber}",
+    'digi-key': lambda manufacturer, partNumber: f"https://www.digikey.com/en/products/search?keywords={partNumber}",
+    'digikey': lambda manufacturer, partNumber: f"https://www.digikey.com/en/products/search?keywords={partNumber}",
+    'mouser': lambda manufacturer, partNumber: f"https://www.mouser.com/c/?q={partNumber}",
+    'arrow': lambda manufacturer, partNumber: f"https://www.arrow.com/en/products/search?q={partNumber}",
+    'avnet': lambda manufacturer, partNumber: f"https://www.avnet.com/shop/us/search/{partNumber}",
+    'newark': lambda manufacturer, partNumber: f"https://www.newark.com/search?st={partNumber}",
+    'farnell': lambda manufacturer, partNumber: f"https://uk.farnell.com/search?st={partNumber}",
+    'rs': lambda manufacturer, partNumber: f"https://uk.rs-online.com/web/c/search?searchTerm={partNumber}",
+    'rs-components': lambda manufacturer, partNumber: f"https://uk.rs-online.com/web/c/search?searchTerm={partNumber}",
+    'allied': lambda manufacturer, partNumber: f"https://www.alliedelec.com/search/products/?keyword={partNumber}",
+    'mcmaster': lambda manufacturer, partNumber: f"https://www.mcmaster.com/search?query={partNumber}",
+    'mcmaster-carr': lambda manufacturer, partNumber: f"https://www.mcmaster.com/search?query={partNumber}",
+    'element14': lambda manufacturer, partNumber: f"https://www.element14.com/community/search?q={partNumber}",
+    'future': lambda manufacturer, partNumber: f"https://www.futureelectronics.com/search?text={partNumber}",
+    'verical': lambda manufacturer, partNumber: f"https://www.verical.com/search?q={partNumber}",
+    'quest': lambda manufacturer, partNumber: f"https://www.questcomp.com/search?query={partNumber}",
+    'utmel': lambda manufacturer, partNumber: f"https://www.utmel.com/search?keyword={partNumber}",
+    'lcsc': lambda manufacturer, partNumber: f"https://www.lcsc.com/search?q={partNumber}",
+    'chip1stop': lambda manufacturer, partNumber: f"https://www.chip1stop.com/search?keyword={partNumber}",
+    'onlinecomponents': lambda manufacturer, partNumber: f"https://www.onlinecomponents.com/search?keyword={partNumber}",
+    'rutronik': lambda manufacturer, partNumber: f"https://www.rutronik.com/search/?q={partNumber}"
+}
+
+FALLBACK_URL_PATTERN = lambda manufacturer, partNumber: f"https://www.digikey.com/en/products/search?keywords={partNumber}"
+
+
+def compact_supplier_name(name: str) -> str:
+    """Lowercase a supplier name and drop everything but letters and digits ("Digi-Key" -> "digikey")."""
+    return re.sub(r'[^a-z0-9]', '', (name or '').lower())
+
+
+def compact_supplier_runs(name: str) -> FrozenSet[str]:
+    """Every run of consecutive words in a supplier name, compacted ("Digi Key Inc" -> "digikey", "keyinc", ...).
+
+    Matching against these instead of the whole compacted name keeps matches on word
+    boundaries, so "Smart Meters" does not contain "tme".
+    """
+    words = re.findall(r'[a-z0-9]+', (name or '').lower())
+    return frozenset(''.join(words[start:end]) for start in range(len(words)) for end in range(start + 1, len(words) + 1))
+
+
+class SupplierMatch:
+    """Resolved table entries for one supplier name."""
+
+    __slots__ = ('name', 'lead_time', 'lead_time_key', 'url_key', 'url_builder')
+
+    def __init__(self, name: str, lead_time: int, lead_time_key: Optional[str],
+                 url_key: Optional[str], url_builder: Callable[[str, str], str]):
+        self.name = name
+        self.lead_time = lead_time
+        self.lead_time_key = lead_time_key
+        self.url_key = url_key
+        self.url_builder = url_builder
+
+    def build_url(self, manufacturer: str, part_number: str) -> str:
+        """Search URL for a part, URL-encoding the part number."""
+        return self.url_builder(manufacturer, urllib.parse.quote(part_number, safe=''))
+
+
+class SupplierResolver:
+    """Memoized supplier-name lookup over the lead-time and URL tables.
+
+    The first lookup of a name applies the original matching rules: a lead-time key
+    matches when either string contains the other, a URL key when the name contains it,
+    and the first match in table order wins. Names that match nothing are retried with
+    punctuation and spaces removed between whole words, so "Digi Key" and "DIGI-KEY
+    Electronics" resolve to the same entries as "digikey". Later lookups are a dictionary hit.
+    """
+
+    def __init__(self, lead_times: Dict[str, int], url_patterns: Dict[str, Callable[[str, str], str]],
+                 default_lead_time: int = DEFAULT_SUPPLIER_LEAD_TIME, max_entries: int = 4096):
+        self.lead_times = lead_times
+        self.url_patterns = url_patterns
+        self.default_lead_time = default_lead_time
+        self.max_entries = max_entries
+        self._lead_time_keys = [
+            (key, compact_supplier_name(key), compact_supplier_runs(key), value) for key, value in lead_times.items()
+        ]
+        self._url_keys = [(key, compact_supplier_name(key), builder) for key, builder in url_patterns.items()]
+        self._matches: Dict[str, SupplierMatch] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, supplier: str) -> SupplierMatch:
+        supplier_lower = (supplier or '').lower()
+        match = self._matches.get(supplier_lower)
+        if match is None:
+            match = self._match(supplier_lower)
+            with self._lock:
+                if len(self._matches) >= self.max_entries:
+                    self._matches.clear()
+                self._matches[supplier_lower] = match
+        return match
+
+    def lead_time(self, supplier: Optional[str]) -> int:
+        if not supplier:
+            return self.default_lead_time
+        return self.resolve(supplier).lead_time
+
+    def build_url(self, supplier: str, manufacturer: str, part_number: str) -> str:
+        return self.resolve(supplier).build_url(manufacturer, part_number)
+
+    def _match(self, supplier_lower: str) -> SupplierMatch:
+        compact = compact_supplier_name(supplier_lower)
+        runs = compact_supplier_runs(supplier_lower)
+
+        lead_time_key, lead_time = None, self.default_lead_time
+        if supplier_lower:
+            for key, _, _, value in self._lead_time_keys:
+                if key in supplier_lower or supplier_lower in key:
+                    lead_time_key, lead_time = key, value
+                    break
+            else:
+                for key, compact_key, key_runs, value in self._lead_time_keys:
+                    if compact and (compact_key in runs or compact in key_runs):
+                        lead_time_key, lead_time = key, value
+                        break
+
+        url_key, url_builder = None, FALLBACK_URL_PATTERN
+        for key, _, builder in self._url_keys:
+            if key in supplier_lower:
+                url_key, url_builder = key, builder
+                break
+        else:
+            for key, compact_key, builder in self._url_keys:
+                if compact and compact_key in runs:
+                    url_key, url_builder = key, builder
+                    break
+
+        if url_key:
+            print(f"Supplier '{supplier_lower}' resolved to URL pattern '{url_key}', lead time {lead_time} days")
+        else:
+            print(f"No URL pattern matched for supplier '{supplier_lower}', using fallback search URL")
+        return SupplierMatch(supplier_lower, lead_time, lead_time_key, url_key, url_builder)
+
+    def cache_info(self) -> Dict[str, int]:
+        return {'entries': len(self._matches), 'max_entries': self.max_entries}
+
+
+supplier_resolver = SupplierResolver(SUPPLIER_LEAD_TIMES, SUPPLIER_URL_PATTERNS)